@@ -1,23 +1,25 @@
-import requests
 import pandas as pd
 import os
 import yaml
 import string
-import html
 import time
-from io import StringIO
 from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
-from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from datetime import datetime, date
 from playwright.sync_api import sync_playwright
 
+# Parser das tabelas de fila e cliente HTTP (pool de conexões) do pacote workers.
+# Rodar da raiz do projeto: python -m Enpoints.feegow.api_client (ou com a raiz no PYTHONPATH)
+from workers.parser_fila import fila_texto
+from workers.cliente_http import cliente_http, nova_sessao, timeout_http
+
 # Carrega variáveis de ambiente locais (.env)
 load_dotenv()
 
-API_CONFIG_FILE = "api_config.yaml"
+# Ao lado deste arquivo, de qualquer pasta de onde ele for rodado
+API_CONFIG_FILE = str(Path(__file__).with_name("api_config.yaml"))
 
 # ==========================================================
 # CARREGA CONFIGURAÇÃO DA API
@@ -48,17 +50,14 @@ ENDPOINTS = {ep["name"]: ep for ep in endpoints_list}
 # SESSÃO REQUESTS (SEM CACHE DO STREAMLIT)
 # ==========================================================
 def get_session():
-    session = requests.Session()
+    # Sessão do cliente HTTP dos workers (pool keep-alive, gzip), com a retentativa do api_config.yaml
     retry_strategy = Retry(
         total=globals_cfg.get("retries", 3),
         backoff_factor=globals_cfg.get("backoff_factor", 1),
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=["GET", "POST", "PUT", "DELETE", "HEAD"]
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("https://", adapter)
-    session.mount("http://", adapter)
-    return session
+    return nova_sessao(retry=retry_strategy)
 
 session = get_session()
 
@@ -271,8 +270,8 @@ def fetch_fila_espera(unidade_id=None, profissional_id="", especialidade_id="",
     url = "https://franchising.feegow.com/v8.1/ListaEsperaCont.asp"
     
     try:
-        import requests # Garantindo import local caso falte
-        resp = requests.get(url, headers=headers, params=params, timeout=15)
+        # Pool de conexões dos workers: a fila é consultada a cada poucos segundos no mesmo host
+        resp = cliente_http().get(url, headers=headers, params=params, timeout=timeout_http(15))
         resp.raise_for_status()
         
         # Decode manual para corrigir acentos
@@ -283,44 +282,18 @@ def fetch_fila_espera(unidade_id=None, profissional_id="", especialidade_id="",
         return None
     
 def parse_fila_html(html_content):
+    # 1. Decodifica corrigindo erros de caracteres latinos
+    # Tenta latin-1 e ignora erros residuais para não quebrar o código
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode('iso-8859-1', errors='replace')
+
     if not html_content or "<table" not in html_content:
         return pd.DataFrame()
 
     try:
-        # 1. Decodifica corrigindo erros de caracteres latinos
-        # Tenta latin-1 e ignora erros residuais para não quebrar o código
-        if isinstance(html_content, bytes):
-            html_content = html_content.decode('iso-8859-1', errors='replace')
-        
-        # 2. Converte entidades HTML (ex: &nbsp; para espaço)
-        html_content = html.unescape(html_content)
-
-        # 3. Lê a tabela
-        dfs = pd.read_html(StringIO(html_content))
-        df = dfs[0].iloc[:, :7]
-        df.columns = ['HORA', 'CHEGADA', 'PACIENTE', 'IDADE', 'PROFISSIONAL', 'COMPROMISSO', 'TEMPO_ESPERA']
-
-        # 4. Dicionário de Correções Específicas (Padrões Feegow)
-        correcoes = {
-            'Ã': 'Í', 'Ã': 'Á', 'Ã‰': 'É', 'Ã“': 'Ó', 'Ãš': 'Ú',
-            'Ã¢': 'â', 'Ãª': 'ê', 'Ã®': 'î', 'Ã´': 'ô', 'Ã»': 'û',
-            'Ã£': 'ã', 'Ãµ': 'õ', 'Ã§': 'ç', 'Ã‡': 'Ç',
-            'Ã€': 'À', 'Âº': 'º', 'Âª': 'ª', 'hÃ¡': 'há'
-        }
-
-        for col in df.columns:
-            df[col] = df[col].astype(str)
-            # Aplica as correções de caracteres
-            for errado, correto in correcoes.items():
-                df[col] = df[col].str.replace(errado, correto, regex=False)
-            
-            # Limpa espaços duplos e resíduos de tags
-            df[col] = df[col].str.replace(r'\s+', ' ', regex=True).str.strip()
-            # Remove o selo "Primeira vez" do nome do paciente
-            if col == 'PACIENTE':
-                df[col] = df[col].str.replace('Primeira vez ', '', case=False)
-
-        return df
+        # 2. Entidades HTML, mojibake, espaços e selo "Primeira vez" (workers/parser_fila.fila_texto)
+        return pd.DataFrame(fila_texto(html_content),
+                            columns=['HORA', 'CHEGADA', 'PACIENTE', 'IDADE', 'PROFISSIONAL', 'COMPROMISSO', 'TEMPO_ESPERA'])
 
     except Exception as e:
         print(f"Erro no parse aprimorado: {e}")
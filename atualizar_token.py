@@ -1,6 +1,5 @@
 import os
 import sys
-import requests
 import json
 
 # Garante acesso aos workers
@@ -8,10 +7,12 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'workers'))
 
 try:
     from workers.database_manager import DatabaseManager
+    from workers.cliente_http import cliente_http, timeout_http
 except ImportError:
     # Fallback se a estrutura de pastas for diferente
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
     from workers.database_manager import DatabaseManager
+    from workers.cliente_http import cliente_http, timeout_http
 
 def validar_cookie(cookie_str):
     """Testa se o cookie realmente abre a porta da API"""
@@ -26,7 +27,8 @@ def validar_cookie(cookie_str):
     }
 
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
+        # Cliente HTTP dos workers: o cookie vai só no header (a sessão não guarda Set-Cookie)
+        resp = cliente_http().get(url, headers=headers, timeout=timeout_http(10))
         
         if resp.status_code == 200:
             # Verifica se retornou JSON válido (mesmo que lista vazia)
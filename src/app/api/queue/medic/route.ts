@@ -12,9 +12,15 @@ interface DbRow {
   dt_chegada: string;
   dt_atendimento: string | null;
   idade?: string;
+  // Campos materializados pelo DatabaseManager na escrita
+  dt_chegada_ts: number | null;
+  prioridade_idoso: number;
+  prioridade_cadeirante: number;
+  prioridade_gestante: number;
 }
 
-function calculateWaitTime(dt_chegada: string): number {
+function calculateWaitTime(dt_chegada: string, dt_chegada_ts: number | null): number {
+  if (dt_chegada_ts) return Math.max(0, Math.floor((Date.now() / 1000 - dt_chegada_ts) / 60));
   if (!dt_chegada) return 0;
   try {
     const arrival = new Date(dt_chegada);
@@ -81,12 +87,12 @@ export async function GET() {
         service: row.especialidade || '',
         professional: row.profissional || '',
         arrival: formatTime(row.dt_chegada),
-        waitTime: calculateWaitTime(row.dt_chegada),
+        waitTime: calculateWaitTime(row.dt_chegada, row.dt_chegada_ts),
         status: statusFront,
         priority: {
-            isElderly: (row.paciente?.toLowerCase().includes('idoso')) || (row.idade && parseInt(row.idade) >= 60),
-            isWheelchair: row.paciente?.toLowerCase().includes('cadeirante'),
-            isPregnant: row.paciente?.toLowerCase().includes('gestante')
+            isElderly: row.prioridade_idoso === 1,
+            isWheelchair: row.prioridade_cadeirante === 1,
+            isPregnant: row.prioridade_gestante === 1
         }
       });
     });
@@ -96,7 +102,7 @@ export async function GET() {
       SELECT 
         unidade_nome, 
         COUNT(*) as total,
-        AVG((strftime('%s', dt_atendimento) - strftime('%s', dt_chegada)) / 60) as media_minutos
+        AVG(espera_real_min) as media_minutos
       FROM espera_medica_historico 
       WHERE status IN ('Atendido_Inferido', 'Finalizado')
       AND dia_referencia = ?
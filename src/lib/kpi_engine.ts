@@ -10,6 +10,7 @@ const COL_DATA_ANALITICO = 'data_do_pagamento';
 const SQL_DATE_ANALITICO = `substr(${COL_DATA_ANALITICO}, 7, 4) || '-' || substr(${COL_DATA_ANALITICO}, 4, 2) || '-' || substr(${COL_DATA_ANALITICO}, 1, 2)`;
 
 // Worker Feegow: date (YYYY-MM-DD) -> Já está pronto no banco
+// procedure_group_key = UPPER(TRIM(procedure_group)) gravado pelo worker (coberto por índice)
 const SQL_DATE_AGENDA = 'date'; 
 
 export async function calculateKpi(kpiId: string, startDate: string, endDate: string, options?: KpiOptions): Promise<KpiResult> {
@@ -22,7 +23,7 @@ export async function calculateKpi(kpiId: string, startDate: string, endDate: st
     ? `AND UPPER(TRIM(grupo)) = UPPER(TRIM('${filterVal}'))` : '';
     
   const groupClauseAgenda = (filterVal && filterVal !== 'all') 
-    ? `AND UPPER(TRIM(procedure_group)) = UPPER(TRIM('${filterVal}'))` : '';
+    ? `AND procedure_group_key = UPPER(TRIM('${filterVal}'))` : '';
 
   try {
     let value = 0;
@@ -141,7 +142,7 @@ export async function getKpiHistory(kpiId: string, startDate: string, endDate: s
   const groupClauseAnalitico = (filterVal && filterVal !== 'all') 
     ? `AND UPPER(TRIM(grupo)) = UPPER(TRIM('${filterVal}'))` : '';
   const groupClauseAgenda = (filterVal && filterVal !== 'all') 
-    ? `AND UPPER(TRIM(procedure_group)) = UPPER(TRIM('${filterVal}'))` : '';
+    ? `AND procedure_group_key = UPPER(TRIM('${filterVal}'))` : '';
 
   try {
     let query = '';
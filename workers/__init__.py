@@ -0,0 +1,2 @@
+# Pacote dos workers: os módulos compartilhados (parser_fila, cliente_http...) podem ser importados
+# de fora da pasta como workers.<módulo>; dentro dela os workers continuam rodando como scripts.
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+from datetime import datetime
+
+# Intervalo de polling por unidade, no lugar do time.sleep(15) fixo:
+#   - fila se mexendo (alguém chegou, mudou de status ou saiu): volta para POLL_INTERVALO_MIN
+#   - sem movimento: o intervalo dobra a cada ciclo, até o teto (menor se ainda há gente na fila)
+#   - fora do horário de funcionamento: a unidade não é consultada
+POLL_INTERVALO_MIN = float(os.getenv("POLL_INTERVALO_MIN", "15"))
+POLL_MAX_COM_FILA = float(os.getenv("POLL_MAX_COM_FILA", "60"))
+POLL_MAX_VAZIA = float(os.getenv("POLL_MAX_VAZIA", "240"))
+POLL_FATOR_BACKOFF = float(os.getenv("POLL_FATOR_BACKOFF", "2"))
+# Com tudo fechado o processo ainda acorda de tempos em tempos (feriado, mudança de config...)
+POLL_ESPERA_FECHADO = float(os.getenv("POLL_ESPERA_FECHADO", "300"))
+
+HORARIO_FUNCIONAMENTO = os.getenv("HORARIO_FUNCIONAMENTO", "06:00-20:00")
+DIAS_FUNCIONAMENTO = os.getenv("DIAS_FUNCIONAMENTO", "0-5")   # 0 = segunda ... 6 = domingo
+# Exceções por unidade (nome ou id), ex: {"Campinas Shopping": "10:00-22:00", "12": "10:00-22:00"}
+HORARIOS_UNIDADES = json.loads(os.getenv("HORARIOS_UNIDADES", "{}") or "{}")
+
+def _ler_horario(texto):
+    inicio, fim = texto.split('-')
+    h1, m1 = inicio.strip().split(':')
+    h2, m2 = fim.strip().split(':')
+    return int(h1) * 60 + int(m1), int(h2) * 60 + int(m2)
+
+def _ler_dias(texto):
+    dias = set()
+    for parte in texto.split(','):
+        if '-' in parte:
+            a, b = parte.split('-')
+            dias.update(range(int(a), int(b) + 1))
+        elif parte.strip():
+            dias.add(int(parte))
+    return dias
+
+class PollScheduler:
+    """Decide quais unidades consultar agora e quanto tempo dormir até o próximo ciclo"""
+
+    def __init__(self, unidades, horario=HORARIO_FUNCIONAMENTO, dias=DIAS_FUNCIONAMENTO,
+                 horarios_unidades=HORARIOS_UNIDADES, intervalo_min=POLL_INTERVALO_MIN,
+                 max_com_fila=POLL_MAX_COM_FILA, max_vazia=POLL_MAX_VAZIA, fator=POLL_FATOR_BACKOFF):
+        self.unidades = list(unidades)
+        self.dias = _ler_dias(dias)
+        self.intervalo_min = intervalo_min
+        self.max_com_fila = max_com_fila
+        self.max_vazia = max_vazia
+        self.fator = fator
+
+        padrao = _ler_horario(horario)
+        self._horarios = {
+            u: _ler_horario(horarios_unidades[str(u)]) if str(u) in horarios_unidades else padrao
+            for u in self.unidades
+        }
+        self._intervalo = {u: intervalo_min for u in self.unidades}
+        self._proxima = {u: 0.0 for u in self.unidades}
+        self._aberta = {u: None for u in self.unidades}
+        self.consultas = 0
+
+    def aberta(self, unidade, agora=None):
+        agora = agora or datetime.now()
+        if agora.weekday() not in self.dias:
+            return False
+        inicio, fim = self._horarios[unidade]
+        minuto = agora.hour * 60 + agora.minute
+        return inicio <= minuto < fim
+
+    def vencidas(self, unidades=None):
+        """Unidades abertas cujo próximo poll já chegou (só entre `unidades`, se informado)"""
+        agora = datetime.now()
+        mono = time.monotonic()
+        prontas = []
+        for u in self.unidades:
+            if unidades is not None and u not in unidades:
+                continue
+            aberta = self.aberta(u, agora)
+            if aberta and self._aberta[u] is False:
+                # Acabou de abrir: começa no ritmo rápido
+                self._intervalo[u] = self.intervalo_min
+                self._proxima[u] = 0.0
+            self._aberta[u] = aberta
+            if not aberta:
+                continue
+            if self._proxima[u] <= mono:
+                prontas.append(u)
+        self.consultas += len(prontas)
+        return prontas
+
+    def registrar(self, unidade, movimento, qtd=0):
+        """Resultado do poll da unidade: movimento na fila acelera, silêncio (ou erro) desacelera"""
+        if movimento:
+            intervalo = self.intervalo_min
+        else:
+            teto = self.max_com_fila if qtd else self.max_vazia
+            intervalo = min(max(self._intervalo[unidade] * self.fator, self.intervalo_min), teto)
+        self._intervalo[unidade] = intervalo
+        self._proxima[unidade] = time.monotonic() + intervalo
+
+    def _segundos_ate_abrir(self, unidade, agora):
+        inicio, _ = self._horarios[unidade]
+        abertura = agora.replace(hour=inicio // 60, minute=inicio % 60, second=0, microsecond=0)
+        if agora.weekday() in self.dias and abertura > agora:
+            return (abertura - agora).total_seconds()
+        return POLL_ESPERA_FECHADO
+
+    def espera(self, unidades=None):
+        """Segundos até a próxima unidade vencer (ou até alguma abrir), só entre `unidades` se informado"""
+        agora = datetime.now()
+        mono = time.monotonic()
+        esperas = []
+        for u in self.unidades:
+            if unidades is not None and u not in unidades:
+                continue
+            if self.aberta(u, agora):
+                esperas.append(self._proxima[u] - mono)
+            else:
+                esperas.append(self._segundos_ate_abrir(u, agora))
+        # Piso de 1s: nunca gira em falso mesmo se algo vencer no meio do cálculo
+        return max(1.0, min(min(esperas, default=POLL_ESPERA_FECHADO), POLL_ESPERA_FECHADO))
+
+    def resumo(self):
+        return ", ".join(f"{u}: {self._intervalo[u]:g}s" for u in self.unidades)
@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime
+import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from feegow_core import FeegowSystem
+    from database_manager import DatabaseManager
+    from resiliencia import requisitar
+except ImportError:
+    from .feegow_core import FeegowSystem
+    from .database_manager import DatabaseManager
+    from .resiliencia import requisitar
+
+# Sessões de login centralizadas. Os cookies ficam no banco (auth_sessoes) com validade, então:
+#   - um restart (ou outro processo) reaproveita a sessão salva em vez de logar de novo
+#   - uma thread renova as sessões antes de vencerem, sem o monitor ficar esperando o login
+#   - cookie rejeitado (403 / volta para o login) é trocado na hora pelo próximo válido
+#
+# Serviços:
+#   feegow       sessão do franchising.feegow.com por unidade (login + MudaLocal), fila médica
+#   feegow_core  cookie do core.feegow.com (recepção): auth_sessoes > Painel Admin > .env,
+#                e em último caso o login do app com ponte de cookies para o Core
+AUTH_FEEGOW_TTL_S = float(os.getenv("AUTH_FEEGOW_TTL_S", "7200"))
+AUTH_MARGEM_S = float(os.getenv("AUTH_MARGEM_S", "600"))              # renova quando faltar menos que isso
+AUTH_VERIFICAR_S = float(os.getenv("AUTH_VERIFICAR_S", "60"))         # intervalo da thread de renovação
+AUTH_VALIDAR_CORE_S = float(os.getenv("AUTH_VALIDAR_CORE_S", "600"))  # teste do cookie do Core em segundo plano
+AUTH_RETENTAR_LOGIN_S = float(os.getenv("AUTH_RETENTAR_LOGIN_S", "300"))
+AUTH_ALERTA_S = float(os.getenv("AUTH_ALERTA_S", "900"))
+
+SERVICO_FEEGOW = 'feegow'
+SERVICO_CORE = 'feegow_core'
+URL_VALIDACAO_CORE = "https://core.feegow.com/totem-queue/admin/get-queue-by-filter?filter=&unit_id=2"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+def exportar_cookies(session):
+    """Cookies da sessão requests em JSON (mantém domínio e path)"""
+    return json.dumps([
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path}
+        for c in session.cookies
+    ])
+
+def importar_cookies(session, texto):
+    for c in json.loads(texto):
+        session.cookies.set(c["name"], c["value"], domain=c.get("domain") or "", path=c.get("path") or "/")
+
+def validar_cookie_core(cookie, timeout=10):
+    """True se o Core aceitou o cookie, False se rejeitou, None se não deu para saber (rede)"""
+    headers = {"User-Agent": USER_AGENT, "Cookie": cookie, "X-Requested-With": "XMLHttpRequest"}
+    try:
+        resp = requisitar("GET", URL_VALIDACAO_CORE, headers=headers, timeout=timeout, allow_redirects=False)
+    except requests.RequestException:
+        return None
+    if resp.status_code >= 500:
+        return None
+    if resp.status_code != 200:
+        return False
+    try:
+        return isinstance(resp.json(), (list, dict))
+    except ValueError:
+        return False
+
+class AuthBroker:
+    """
+    Entrega sessões prontas para os workers.
+    sessao(uid)/invalidar(uid) têm a mesma interface do antigo pool de sessões do monitor médico;
+    cookie_core()/invalidar_core(cookie) servem a recepção.
+    """
+
+    def __init__(self, db=None, fabrica=FeegowSystem, ttl=AUTH_FEEGOW_TTL_S, margem=AUTH_MARGEM_S,
+                 validar_core=validar_cookie_core):
+        self.db = db or DatabaseManager(fonte="auth_broker")
+        self._fabrica = fabrica
+        self.ttl = ttl
+        self.margem = margem
+        self._validar_core = validar_core
+        self._sessoes = {}          # uid -> (sistema, expira_em, cookies)
+        self._locks = {}            # um login por unidade por vez
+        self._lock = threading.Lock()
+        self._core = None
+        self._core_invalidos = set()
+        self._core_lock = threading.Lock()
+        self._proximo_login_core = 0.0
+        self._alerta_em = 0.0
+        self._thread = None
+        self._parar = threading.Event()
+        self._metricas = {"logins": 0, "do_banco": 0, "renovadas": 0, "invalidadas": 0,
+                          "falhas_login": 0, "core_trocas": 0, "core_logins": 0}
+
+    def _contar(self, chave, n=1):
+        with self._lock:
+            self._metricas[chave] += n
+
+    # --- FEEGOW: SESSÃO POR UNIDADE ---
+    def _lock_unidade(self, uid):
+        with self._lock:
+            return self._locks.setdefault(uid, threading.Lock())
+
+    def _valida(self, item):
+        return item is not None and item[1] > time.time()
+
+    def sessao(self, uid):
+        """Sessão logada na unidade: memória > banco (restart/outro processo) > login novo. None se falhar"""
+        with self._lock:
+            item = self._sessoes.get(uid)
+        if self._valida(item):
+            return item[0]
+
+        with self._lock_unidade(uid):
+            with self._lock:
+                item = self._sessoes.get(uid)
+            if not self._valida(item):
+                item = self._sessao_do_banco(uid) or self._login(uid)
+                if item is None:
+                    return None
+                with self._lock:
+                    self._sessoes[uid] = item
+        return item[0]
+
+    def _sessao_do_banco(self, uid):
+        salvo = self.db.carregar_sessoes_auth(SERVICO_FEEGOW).get(str(uid))
+        if not salvo:
+            return None
+        cookies, expira_em, _ = salvo
+        if not expira_em or expira_em <= time.time():
+            return None
+        sistema = self._fabrica()
+        importar_cookies(sistema.session, cookies)
+        self._contar("do_banco")
+        return sistema, expira_em, cookies
+
+    def _login(self, uid):
+        sistema = self._fabrica()
+        if not sistema.login() or not sistema.trocar_unidade(uid):
+            self._contar("falhas_login")
+            return None
+        # Pequeno delay para o servidor processar a troca de sessão (só no login)
+        time.sleep(1.0)
+        expira_em = time.time() + self.ttl
+        cookies = exportar_cookies(sistema.session)
+        self.db.salvar_sessao_auth(SERVICO_FEEGOW, uid, cookies, expira_em, 'login')
+        self._contar("logins")
+        return sistema, expira_em, cookies
+
+    def invalidar(self, uid):
+        """Sessão da unidade caiu: descarta da memória e do banco; o próximo pedido faz login"""
+        with self._lock:
+            item = self._sessoes.pop(uid, None)
+        self._contar("invalidadas")
+        # Só apaga do banco se ainda for a mesma sessão (outro processo pode já ter renovado)
+        self.db.remover_sessao_auth(SERVICO_FEEGOW, uid, item[2] if item else None)
+
+    def renovar_vencendo(self):
+        """Loga de novo as unidades cuja sessão vence em menos de `margem` segundos; troca sem derrubar ninguém"""
+        limite = time.time() + self.margem
+        with self._lock:
+            vencendo = [uid for uid, item in self._sessoes.items() if item[1] <= limite]
+        for uid in vencendo:
+            with self._lock_unidade(uid):
+                novo = self._login(uid)
+                if novo is not None:
+                    with self._lock:
+                        self._sessoes[uid] = novo
+                    self._contar("renovadas")
+        return vencendo
+
+    # --- FEEGOW CORE: COOKIE DA RECEPÇÃO ---
+    def _candidatos_core(self):
+        """Cookies conhecidos, do mais provável ao menos: auth_sessoes, Painel Admin, .env"""
+        candidatos = []
+        salvo = self.db.carregar_sessoes_auth(SERVICO_CORE).get('')
+        if salvo:
+            candidatos.append(salvo[0])
+        config = self.db.get_integration_config('feegow')
+        if config and config.get('token'):
+            candidatos.append(config['token'])
+        if os.getenv("FEEGOW_CORE_COOKIE_FULL"):
+            candidatos.append(os.getenv("FEEGOW_CORE_COOKIE_FULL"))
+        return [c for i, c in enumerate(candidatos) if c not in candidatos[:i] and c not in self._core_invalidos]
+
+    def cookie_core(self):
+        """Cookie atual do Core (sem ida à rede no caminho comum); None se nenhum disponível"""
+        with self._core_lock:
+            if self._core is None:
+                candidatos = self._candidatos_core()
+                self._core = candidatos[0] if candidatos else None
+            return self._core
+
+    def invalidar_core(self, cookie):
+        """O Core rejeitou `cookie`: procura o próximo válido (ou faz login). Devolve o novo cookie ou None"""
+        with self._core_lock:
+            if cookie is not None:
+                self._core_invalidos.add(cookie)
+                self.db.remover_sessao_auth(SERVICO_CORE, '', cookie)
+            if self._core is not None and self._core != cookie:
+                # Outra thread já trocou
+                return self._core
+            self._core = None
+
+            for candidato in self._candidatos_core():
+                valido = self._validar_core(candidato)
+                if valido is False:
+                    self._core_invalidos.add(candidato)
+                    continue
+                # Aceito (ou sem rede para confirmar: usa e o próximo ciclo diz)
+                return self._trocar_core(candidato, 'painel')
+
+            novo = self._login_core()
+            if novo:
+                self._contar("core_logins")
+                return self._trocar_core(novo, 'login')
+
+            self._alertar()
+            return None
+
+    def _trocar_core(self, cookie, origem):
+        self._core = cookie
+        self.db.salvar_sessao_auth(SERVICO_CORE, '', cookie, None, origem)
+        self._contar("core_trocas")
+        print(f"   [AUTH] Cookie do Core renovado ({origem}).")
+        return cookie
+
+    def _login_core(self):
+        """Login no app.feegow.com com ponte de cookies para o Core (no máximo a cada AUTH_RETENTAR_LOGIN_S)"""
+        if time.time() < self._proximo_login_core:
+            return None
+        self._proximo_login_core = time.time() + AUTH_RETENTAR_LOGIN_S
+        sistema = self._fabrica()
+        try:
+            if not sistema._login_app_specific():
+                return None
+        except Exception as e:
+            print(f"   [AUTH] Erro no login do Core: {e}")
+            return None
+        cookies = {c.name: c.value for c in sistema.session.cookies if 'feegow.com' in (c.domain or '')}
+        cookie = "; ".join(f"{nome}={valor}" for nome, valor in cookies.items())
+        if cookie and self._validar_core(cookie):
+            return cookie
+        return None
+
+    def _alertar(self):
+        """Nenhum cookie válido e o login automático falhou: avisa (sem repetir a cada ciclo)"""
+        if time.time() - self._alerta_em < AUTH_ALERTA_S:
+            return
+        self._alerta_em = time.time()
+        print(f"\n[{datetime.now().strftime('%H:%M:%S')}] 🚨 ALERTA: O TOKEN DA RECEPÇÃO EXPIROU!")
+        print("   Ação Necessária: Rode 'python atualizar_token.py' e cole um novo cookie.")
+        print("   (O monitor continuará tentando até você atualizar)\n")
+
+    def verificar_core(self):
+        """Testa o cookie atual em segundo plano; se foi rejeitado já troca antes do próximo ciclo da recepção"""
+        cookie = self.cookie_core()
+        if cookie is None or self._validar_core(cookie) is False:
+            return self.invalidar_core(cookie)
+        return cookie
+
+    # --- RENOVAÇÃO EM SEGUNDO PLANO ---
+    def iniciar(self, intervalo=AUTH_VERIFICAR_S, validar_core_s=AUTH_VALIDAR_CORE_S):
+        """Sobe a thread de renovação (idempotente). Devolve o próprio broker"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return self
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._loop, args=(intervalo, validar_core_s),
+                                            name="auth-broker", daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+
+    def _loop(self, intervalo, validar_core_s):
+        proxima_validacao = time.monotonic() + validar_core_s
+        while not self._parar.wait(intervalo):
+            try:
+                self.renovar_vencendo()
+                if self._core is not None and time.monotonic() >= proxima_validacao:
+                    proxima_validacao = time.monotonic() + validar_core_s
+                    self.verificar_core()
+            except Exception as e:
+                print(f"   [AUTH] Erro na renovação: {e}")
+
+    def metricas(self):
+        with self._lock:
+            m = dict(self._metricas)
+            agora = time.time()
+            m["sessoes"] = {str(uid): round(item[1] - agora) for uid, item in self._sessoes.items()}
+        m["core"] = self._core is not None
+        return m
+
+_broker = None
+_broker_lock = threading.Lock()
+
+def auth_broker():
+    """Um broker por processo: todos os workers do supervisor recebem as mesmas sessões"""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = AuthBroker()
+        return _broker
@@ -0,0 +1,115 @@
+import os
+import sys
+import ssl
+import gzip
+import time
+import shutil
+import tempfile
+import threading
+import statistics
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+import urllib3
+
+# Ciclo de polling com e sem o cliente HTTP compartilhado (cliente_http.py), contra um servidor local
+# que devolve a fila médica de tests/fixtures (gzip quando pedido) e conta as conexões abertas.
+# Ciclo = 7 GETs em série (3 unidades da fila médica + 3 da recepção + Clinia), via requisitar.
+# HTTPS usa um certificado autoassinado gerado com o openssl (pulado se ele não existir).
+#   python workers/bench_cliente_http.py [ciclos]
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import cliente_http
+from resiliencia import requisitar
+
+urllib3.disable_warnings()
+
+CORPO = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", "fila_30.html"), "rb").read()
+CHAMADAS_POR_CICLO = 7
+
+class Contagem:
+    conexoes = 0
+    gzip = 0
+
+class Servidor(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        Contagem.conexoes += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(0.002)  # processamento do servidor
+        corpo, extra = CORPO, b""
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            corpo, extra = gzip.compress(CORPO), b"Content-Encoding: gzip\r\n"
+            Contagem.gzip += 1
+        # Cabeçalho e corpo num write só (sem esperar o ACK atrasado do Nagle)
+        self.wfile.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n" + extra +
+                         f"Content-Length: {len(corpo)}\r\n\r\n".encode() + corpo)
+
+def certificado(pasta):
+    if shutil.which("openssl") is None:
+        return None
+    cert, chave = os.path.join(pasta, "cert.pem"), os.path.join(pasta, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+                    "-keyout", chave, "-out", cert], check=True, capture_output=True)
+    return cert, chave
+
+def subir_servidor(tls=None):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Servidor)
+    srv.daemon_threads = True
+    if tls:
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(*tls)
+        srv.socket = ctx.wrap_socket(srv.socket, server_side=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return f"{'https' if tls else 'http'}://127.0.0.1:{srv.server_address[1]}"
+
+def ciclo(base, cliente):
+    for i in range(CHAMADAS_POR_CICLO):
+        resp = requisitar("GET", f"{base}/fila?u={i}", cliente=cliente, timeout=10, verify=False)
+        assert resp.status_code == 200 and resp.content == CORPO
+
+def medir(base, cliente, ciclos):
+    Contagem.conexoes = Contagem.gzip = 0
+    ciclo(base, cliente)
+    tempos = []
+    for _ in range(ciclos):
+        inicio = time.perf_counter()
+        ciclo(base, cliente)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return statistics.median(tempos), tempos[int(len(tempos) * 0.95) - 1], Contagem.conexoes, Contagem.gzip
+
+def main(ciclos=40):
+    servidores = [("http ", subir_servidor())]
+    tls = certificado(tempfile.mkdtemp())
+    if tls:
+        servidores.append(("https", subir_servidor(tls)))
+    else:
+        print("openssl não encontrado: só HTTP")
+
+    chamadas = (ciclos + 1) * CHAMADAS_POR_CICLO
+    print(f"{ciclos} ciclos de {CHAMADAS_POR_CICLO} GETs ({len(CORPO)} bytes cada)")
+    # requests.request abre uma conexão (e um handshake TLS) por chamada; o cliente_http reaproveita o pool
+    for protocolo, base in servidores:
+        for nome, cliente in (("sem pool (requests.request)", requests), ("cliente_http (pool)", None)):
+            mediana, p95, conexoes, comprimidas = medir(base, cliente, ciclos)
+            print(f"  {protocolo} {nome:28s} mediana {mediana:6.1f} ms/ciclo, p95 {p95:6.1f} ms, "
+                  f"{conexoes} conexões, gzip {comprimidas}/{chamadas}")
+
+    # Retentativa só de conexão: porta fechada = 1 + HTTP_RETENTATIVAS tentativas com backoff
+    inicio = time.perf_counter()
+    try:
+        requisitar("GET", "http://127.0.0.1:9/", timeout=5)
+    except requests.ConnectionError:
+        print(f"  porta fechada: ConnectionError em {(time.perf_counter() - inicio) * 1000:.0f} ms "
+              f"({cliente_http.HTTP_RETENTATIVAS} retentativas)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import datetime
+
+# Tempo das queries do dashboard em feegow_appointments antes e depois da migração 6
+# (procedure_group_key + índices de cobertura), num banco temporário com um ano de agenda.
+# As queries são as de src/app/api/admin/produtividade/route.ts e src/lib/kpi_engine.ts.
+#   python workers/bench_indices_agenda.py [agendamentos_por_dia]
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import database_manager
+
+GRUPOS = ['Consultas', ' Exames ', 'vacina', 'Odontologia', 'Laboratório']
+USUARIOS = [f'user{i}' for i in range(40)] + ['Sistema']
+UNIDADES = ['Ouro Verde', 'Centro Cambui', 'Campinas Shopping']
+REPETICOES = 10
+
+# (nome, sql, params); {grupo} é o filtro do grupo de procedimento antes/depois da migração
+QUERIES = [
+    ("ranking por usuário (1 mês)",
+     "SELECT scheduled_by, status_id, COUNT(*), SUM(value) FROM feegow_appointments "
+     "WHERE date BETWEEN ? AND ? AND scheduled_by IS NOT NULL AND scheduled_by != '' AND scheduled_by != 'Sistema' "
+     "GROUP BY scheduled_by, status_id ORDER BY 3 DESC", ('2026-03-01', '2026-03-31')),
+    ("confirmação por unidade (1 mês)",
+     "SELECT unit_name, COUNT(*), SUM(CASE WHEN status_id = 7 THEN 1 ELSE 0 END) FROM feegow_appointments "
+     "WHERE date BETWEEN ? AND ? AND unit_name IS NOT NULL GROUP BY unit_name", ('2026-03-01', '2026-03-31')),
+    ("kpi contagem + grupo (6 meses)",
+     "SELECT COUNT(*) FROM feegow_appointments WHERE date BETWEEN ? AND ? AND status_id IN (1,2,3,4,7) AND {grupo}",
+     ('2026-01-01', '2026-06-30')),
+    ("histórico absenteísmo (6 meses)",
+     "SELECT date as iso_date, (CAST(SUM(CASE WHEN status_id = 6 THEN 1 ELSE 0 END) AS REAL)/COUNT(*))*100 "
+     "FROM feegow_appointments WHERE iso_date >= ? AND iso_date <= ? AND status_id IN (1,2,3,4,6,7) AND {grupo} "
+     "GROUP BY iso_date", ('2026-01-01', '2026-06-30')),
+]
+GRUPO_ANTES = "UPPER(TRIM(procedure_group)) = UPPER(TRIM('vacina'))"
+GRUPO_DEPOIS = "procedure_group_key = UPPER(TRIM('vacina'))"
+
+def agenda(por_dia):
+    random.seed(1)
+    inicio = datetime.date(2025, 10, 1)
+    for i in range(365 * por_dia):
+        dia = (inicio + datetime.timedelta(days=i % 365)).isoformat()
+        yield (i + 1, dia, random.choice([1, 2, 3, 4, 6, 7, 11, 15, 16, 22]), random.random() * 300, 'Geral', 'Dr',
+               random.choice(GRUPOS), random.choice(USUARIOS), random.choice(UNIDADES))
+
+def medir(conn, grupo):
+    tempos = {}
+    for nome, sql, params in QUERIES:
+        sql = sql.format(grupo=grupo)
+        conn.execute(sql, params).fetchall()
+        inicio = time.perf_counter()
+        for _ in range(REPETICOES):
+            conn.execute(sql, params).fetchall()
+        tempos[nome] = (time.perf_counter() - inicio) / REPETICOES * 1000
+    return tempos
+
+def main(por_dia=600):
+    conn = sqlite3.connect(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    # Schema de antes: migrações 1 a 5
+    for versao, _, migracao in database_manager.MIGRACOES:
+        if versao < 6:
+            migracao(conn)
+    conn.executemany("INSERT INTO feegow_appointments (appointment_id, date, status_id, value, specialty, "
+                     "professional_name, procedure_group, scheduled_by, unit_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     agenda(por_dia))
+    conn.commit()
+    conn.execute("ANALYZE")
+    antes = medir(conn, GRUPO_ANTES)
+
+    [migracao_6] = [m for versao, _, m in database_manager.MIGRACOES if versao == 6]
+    migracao_6(conn)
+    conn.commit()
+    conn.execute("ANALYZE")
+    depois = medir(conn, GRUPO_DEPOIS)
+
+    total = conn.execute("SELECT COUNT(*) FROM feegow_appointments").fetchone()[0]
+    print(f"{total} agendamentos, média de {REPETICOES} execuções")
+    for nome, _, _ in QUERIES:
+        print(f"  {nome:34s} {antes[nome]:8.1f} ms -> {depois[nome]:7.1f} ms")
+    conn.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 600)
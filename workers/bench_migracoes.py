@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+# Custo da checagem de schema a cada DatabaseManager(): o _init_db antigo rodava todo o DDL
+# (CREATE TABLE/INDEX IF NOT EXISTS + ALTER TABLE com try/except) em toda instância;
+# com as migrações (PRAGMA user_version) um banco já atualizado custa uma leitura de pragma,
+# e nenhuma depois da primeira checagem no processo.
+#   python workers/bench_migracoes.py [repeticoes]
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import database_manager
+from database_manager import DatabaseManager
+
+def init_db_antigo(db_path):
+    """Equivalente ao _init_db de antes das migrações"""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL;")
+        database_manager._migracao_schema_base(conn)
+        try:
+            conn.execute("ALTER TABLE espera_medica_historico ADD COLUMN espera_min INTEGER")
+        except sqlite3.OperationalError:
+            pass
+
+def medir_us(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+def main(repeticoes=200):
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    database_manager.DB_PATH = db_path
+
+    inicio = time.perf_counter()
+    DatabaseManager(writer=False)
+    print(f"migração completa (banco novo): {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    antigo = medir_us(lambda: init_db_antigo(db_path), repeticoes)
+
+    # A frio: processo "novo" (sem cache do schema) com o banco já na última versão
+    frio = []
+    for _ in range(repeticoes):
+        database_manager._schema_ok.clear()
+        conn = database_manager.get_connection(db_path)
+        inicio = time.perf_counter()
+        database_manager.aplicar_migracoes(conn, db_path)
+        frio.append((time.perf_counter() - inicio) * 1e6)
+    conn = database_manager.get_connection(db_path)
+    repetida = medir_us(lambda: database_manager.aplicar_migracoes(conn, db_path), repeticoes)
+    database_manager.fechar_conexoes()
+
+    print(f"_init_db antigo por instância:         {antigo:8.1f} us")
+    print(f"checagem a frio (schema atual):        {sorted(frio)[len(frio) // 2]:8.1f} us")
+    print(f"checagem repetida no mesmo processo:   {repetida:8.1f} us")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,114 @@
+import os
+import re
+import sys
+import html
+import time
+import hashlib
+import statistics
+from io import StringIO
+import pandas as pd
+
+# Leitura da fila médica do Feegow: pd.read_html (o parse_html antigo do feegow_core, com as colunas
+# derivadas em pandas e o hash do monitor) contra o parser_fila (lxml), nas filas de tests/fixtures
+# e numa fila grande montada repetindo as linhas da fila_30. Antes de medir, confere que as duas
+# versões dão as mesmas entradas (hash, status, minutos e prioridades).
+# Também mede o parse_fila_html do Enpoints/feegow/api_client.py (read_html + um replace por
+# correção de mojibake e por coluna) contra o fila_texto, com o HTML lido como latin-1 (como chega).
+#   python workers/bench_parser_fila.py [repeticoes]
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from parser_fila import ler_tabela, entradas_fila, status_tempo, fila_texto, CORRECOES_TEXTO, COLUNAS_FILA
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures")
+UNIDADE, DIA = "Ouro Verde", "2026-01-02"
+
+def fixture(nome):
+    with open(os.path.join(FIXTURES, nome), encoding="utf-8") as f:
+        return f.read()
+
+def fila_grande(vezes=3):
+    """fila_30 com as linhas do <tbody> repetidas"""
+    conteudo = fixture("fila_30.html")
+    inicio, fim = conteudo.index("<tbody>") + len("<tbody>"), conteudo.index("</tbody>")
+    return conteudo[:inicio] + conteudo[inicio:fim] * vezes + conteudo[fim:]
+
+def entradas_pandas(conteudo, unidade, dia):
+    """Como era antes do parser_fila: read_html, colunas derivadas no DataFrame e hash linha a linha"""
+    df = pd.read_html(StringIO(html.unescape(conteudo)))[0].iloc[:, :7].copy()
+    df.columns = COLUNAS_FILA
+    dados_processados = df['TEMPO_TEXTO'].apply(status_tempo)
+    df['STATUS_DETECTADO'] = [x[0] for x in dados_processados]
+    df['ESPERA_MINUTOS'] = [x[1] for x in dados_processados]
+    pacientes = df['PACIENTE'].astype(str).str.lower()
+    idades = pd.to_numeric(df['IDADE'].astype(str).str.extract(r'^\s*(\d+)')[0], errors='coerce')
+    df['PRIORIDADE_IDOSO'] = (pacientes.str.contains('idoso') | (idades >= 60)).astype(int)
+    df['PRIORIDADE_CADEIRANTE'] = pacientes.str.contains('cadeirante').astype(int)
+    df['PRIORIDADE_GESTANTE'] = pacientes.str.contains('gestante').astype(int)
+    return [
+        (hashlib.md5(f"{unidade}-{row['PACIENTE']}-{row['CHEGADA']}-{dia}".encode()).hexdigest(),
+         row['STATUS_DETECTADO'], row['ESPERA_MINUTOS'],
+         row['PRIORIDADE_IDOSO'], row['PRIORIDADE_CADEIRANTE'], row['PRIORIDADE_GESTANTE'])
+        for _, row in df.iterrows()
+    ]
+
+def entradas_parser(conteudo, unidade, dia):
+    return [(e.hash_id, e.status, e.espera_min, e.prioridade_idoso, e.prioridade_cadeirante, e.prioridade_gestante)
+            for e in entradas_fila(html.unescape(conteudo), unidade, dia)]
+
+COLUNAS_API = ['HORA', 'CHEGADA', 'PACIENTE', 'IDADE', 'PROFISSIONAL', 'COMPROMISSO', 'TEMPO_ESPERA']
+
+def parse_fila_html_antigo(html_content):
+    """parse_fila_html do api_client antes do fila_texto: read_html e um replace por correção e coluna"""
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode('iso-8859-1', errors='replace')
+    df = pd.read_html(StringIO(html.unescape(html_content)))[0].iloc[:, :7]
+    df.columns = COLUNAS_API
+    for col in df.columns:
+        df[col] = df[col].astype(str)
+        for errado, correto in CORRECOES_TEXTO.items():
+            df[col] = df[col].str.replace(errado, correto, regex=False)
+        df[col] = df[col].str.replace(r'\s+', ' ', regex=True).str.strip()
+        if col == 'PACIENTE':
+            df[col] = df[col].str.replace('Primeira vez ', '', case=False)
+    return df.fillna("nan")
+
+def medir(funcao, repeticoes):
+    """Mediana em ms por chamada"""
+    funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+def linha(nome, antes, depois):
+    print(f"  {nome:40s} {antes:7.2f} ms -> {depois:7.2f} ms ({antes / depois:.1f}x)")
+
+def main(repeticoes=200):
+    filas = {nome: fixture(nome) for nome in ("fila_5.html", "fila_30.html", "fila_moji.html")}
+    filas["fila_30.html x3"] = fila_grande()
+
+    print(f"pandas {pd.__version__}, mediana de {repeticoes} chamadas")
+    for nome, conteudo in filas.items():
+        pacientes = len(re.findall(r"<tr><td", conteudo))
+        assert entradas_pandas(conteudo, UNIDADE, DIA) == entradas_parser(conteudo, UNIDADE, DIA), nome
+        print(f"{nome} ({pacientes} pacientes)")
+        linha("tabela: read_html -> ler_tabela",
+              medir(lambda: pd.read_html(StringIO(conteudo)), repeticoes),
+              medir(lambda: ler_tabela(conteudo), repeticoes))
+        linha("entradas: pandas -> entradas_fila",
+              medir(lambda: entradas_pandas(conteudo, UNIDADE, DIA), repeticoes),
+              medir(lambda: entradas_parser(conteudo, UNIDADE, DIA), repeticoes))
+
+        # api_client: a resposta do Feegow (UTF-8) decodificada como latin-1, com mojibake
+        latin1 = conteudo.encode("utf-8").decode("iso-8859-1")
+        antigo = parse_fila_html_antigo(latin1)
+        assert [tuple(l) for l in fila_texto(latin1)] == list(antigo.itertuples(index=False, name=None)), nome
+        linha("api_client: parse antigo -> fila_texto",
+              medir(lambda: parse_fila_html_antigo(latin1), repeticoes),
+              medir(lambda: fila_texto(latin1), repeticoes))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
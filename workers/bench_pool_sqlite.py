@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import datetime
+
+# Medição do pool de conexões do DatabaseManager (get_connection) contra o padrão antigo,
+# que abria um sqlite3.connect por método e gravava linha a linha.
+# Ciclo = 3 unidades x 30 senhas da recepção: salvar + dar baixa nos ausentes.
+#   python workers/bench_pool_sqlite.py [ciclos]
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import database_manager
+from database_manager import DatabaseManager
+
+UNIDADES = (2, 3, 12)
+LINHAS = 30
+
+def itens_recepcao(uid):
+    return [{'id': uid * 1000 + i, 'UnidadeID': uid, 'Senha': f'A{i}', 'Sta': 'Espera',
+             'DataHoraChegada': '2026-01-01 10:00:00', 'NomeTipo': 'Normal'} for i in range(LINHAS)]
+
+def ciclo_conexao_por_chamada(db_path, hoje):
+    """Como era antes do pool: uma conexão nova por chamada, um execute por linha"""
+    for uid in UNIDADES:
+        itens = itens_recepcao(uid)
+        with sqlite3.connect(db_path) as conn:
+            for it in itens:
+                conn.execute("""
+                    INSERT INTO recepcao_historico (id, unidade_id, senha, status, dt_chegada, dt_atendimento, tipo_senha, dia_referencia)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET status=excluded.status
+                """, (it['id'], uid, it['Senha'], it['Sta'], it['DataHoraChegada'], None, it['NomeTipo'], hoje))
+        presentes = ",".join(str(it['id']) for it in itens)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(f"""
+                UPDATE recepcao_historico SET status = 'Atendido_Inferido'
+                WHERE unidade_id = ? AND dia_referencia = ? AND status = 'Espera' AND id NOT IN ({presentes})
+            """, (uid, hoje))
+
+def ciclo_pool(db):
+    for uid in UNIDADES:
+        itens = itens_recepcao(uid)
+        db.salvar_dados_recepcao(itens)
+        db.finalizar_ausentes_recepcao(uid, [it['id'] for it in itens])
+
+def medir(funcao, ciclos):
+    funcao()
+    inicio = time.perf_counter()
+    for _ in range(ciclos):
+        funcao()
+    return (time.perf_counter() - inicio) / ciclos * 1000
+
+def main(ciclos=200):
+    database_manager.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db = DatabaseManager(writer=False)
+    hoje = datetime.date.today().isoformat()
+
+    antes = medir(lambda: ciclo_conexao_por_chamada(db.db_path, hoje), ciclos)
+    depois = medir(lambda: ciclo_pool(db), ciclos)
+    database_manager.fechar_conexoes()
+
+    print(f"{len(UNIDADES)} unidades x {LINHAS} linhas, {ciclos} ciclos ({db.db_path})")
+    print(f"  conexão por chamada: {antes:6.2f} ms/ciclo")
+    print(f"  pool:                {depois:6.2f} ms/ciclo")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from database_manager import DB_PATH, get_connection
+except ImportError:
+    from .database_manager import DB_PATH, get_connection
+
+# O auto-checkpoint do SQLite só consegue esvaziar o WAL quando nenhum leitor está preso
+# a um snapshot antigo. Com o dashboard lendo o tempo todo isso quase nunca acontece e o
+# -wal cresce sem parar. Aqui os workers forçam checkpoints nos momentos certos:
+#   - PASSIVE quando o WAL passa de WAL_PASSIVO_MB e o processo está ocioso (não bloqueia ninguém)
+#   - TRUNCATE fora do expediente, ou a qualquer hora se o WAL passar de WAL_LIMITE_MB
+WAL_PASSIVO_MB = float(os.getenv("WAL_PASSIVO_MB", "4"))
+WAL_LIMITE_MB = float(os.getenv("WAL_LIMITE_MB", "64"))
+WAL_HORARIO_TRUNCATE = os.getenv("WAL_HORARIO_TRUNCATE", "22-6")   # início-fim (horas), pode virar a meia-noite
+WAL_INTERVALO_S = float(os.getenv("WAL_INTERVALO_S", "30"))        # intervalo mínimo entre verificações
+
+class CheckpointManager:
+    """Vigia o tamanho do -wal e decide quando (e como) fazer checkpoint"""
+
+    def __init__(self, db_path=DB_PATH, passivo_mb=WAL_PASSIVO_MB, limite_mb=WAL_LIMITE_MB,
+                 horario_truncate=WAL_HORARIO_TRUNCATE, intervalo=WAL_INTERVALO_S):
+        self.db_path = db_path
+        self.passivo_bytes = int(passivo_mb * 1024 * 1024)
+        self.limite_bytes = int(limite_mb * 1024 * 1024)
+        inicio, fim = horario_truncate.split('-')
+        self.truncate_inicio, self.truncate_fim = int(inicio), int(fim)
+        self.intervalo = intervalo
+        self._ultima_verificacao = 0.0
+        self._lock = threading.Lock()
+        self._metricas = {
+            "wal_bytes": 0, "wal_max_bytes": 0,
+            "checkpoints": {"PASSIVE": 0, "TRUNCATE": 0}, "incompletos": 0, "erros": 0,
+            "ultimo_modo": None, "ultimo_ms": 0.0, "max_ms": 0.0, "ultimo_em": None,
+            "paginas_wal": 0, "paginas_copiadas": 0,
+        }
+
+    def tamanho_wal(self):
+        try:
+            return os.path.getsize(self.db_path + "-wal")
+        except OSError:
+            return 0
+
+    def fora_do_expediente(self, agora=None):
+        hora = (agora or datetime.now()).hour
+        if self.truncate_inicio <= self.truncate_fim:
+            return self.truncate_inicio <= hora < self.truncate_fim
+        return hora >= self.truncate_inicio or hora < self.truncate_fim
+
+    def verificar(self, forcar=False):
+        """
+        Chamado nos momentos ociosos (fim de ciclo do monitor, fila vazia do writer).
+        Só custa um stat() do -wal; devolve o resultado do checkpoint ou None se não precisou.
+        """
+        agora = time.monotonic()
+        if not forcar and agora - self._ultima_verificacao < self.intervalo:
+            return None
+        self._ultima_verificacao = agora
+
+        wal = self.tamanho_wal()
+        with self._lock:
+            self._metricas["wal_bytes"] = wal
+            self._metricas["wal_max_bytes"] = max(self._metricas["wal_max_bytes"], wal)
+
+        if wal == 0:
+            return None
+        if wal >= self.limite_bytes or self.fora_do_expediente():
+            return self.checkpoint("TRUNCATE")
+        if wal >= self.passivo_bytes:
+            return self.checkpoint("PASSIVE")
+        return None
+
+    def checkpoint(self, modo="PASSIVE"):
+        """Roda PRAGMA wal_checkpoint(modo) e devolve (ocupado, paginas_wal, paginas_copiadas)"""
+        conn = get_connection(self.db_path)
+        if conn.in_transaction:
+            conn.commit()
+
+        inicio = time.perf_counter()
+        try:
+            ocupado, paginas_wal, copiadas = conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+        except sqlite3.OperationalError as e:
+            with self._lock:
+                self._metricas["erros"] += 1
+            print(f"   [WAL] Checkpoint {modo} falhou: {e}")
+            return None
+        duracao_ms = round((time.perf_counter() - inicio) * 1000, 3)
+        # Leitor preso a um snapshot antigo: o checkpoint não consegue copiar o WAL inteiro
+        incompleto = bool(ocupado) or copiadas < paginas_wal
+
+        with self._lock:
+            m = self._metricas
+            m["checkpoints"][modo] = m["checkpoints"].get(modo, 0) + 1
+            m["incompletos"] += incompleto
+            m["ultimo_modo"] = modo
+            m["ultimo_ms"] = duracao_ms
+            m["max_ms"] = max(m["max_ms"], duracao_ms)
+            m["ultimo_em"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            m["paginas_wal"] = paginas_wal
+            m["paginas_copiadas"] = copiadas
+            m["wal_bytes"] = self.tamanho_wal()
+
+        if modo == "TRUNCATE" or incompleto:
+            print(f"   [WAL] Checkpoint {modo}: {copiadas}/{paginas_wal} páginas em {duracao_ms}ms"
+                  f"{' (leitores ativos)' if incompleto else ''}")
+        return ocupado, paginas_wal, copiadas
+
+    def metricas(self):
+        with self._lock:
+            m = dict(self._metricas)
+            m["checkpoints"] = dict(m["checkpoints"])
+        m["wal_bytes"] = self.tamanho_wal()
+        return m
+
+_gerenciadores = {}
+
+def checkpoint_manager(db_path=DB_PATH):
+    """Um gerenciador por banco por processo (o intervalo mínimo vale para o processo inteiro)"""
+    gerenciador = _gerenciadores.get(db_path)
+    if gerenciador is None:
+        gerenciador = _gerenciadores.setdefault(db_path, CheckpointManager(db_path))
+    return gerenciador
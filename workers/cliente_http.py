@@ -0,0 +1,79 @@
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Cliente HTTP único dos workers. Todas as sessões do processo montam o mesmo HTTPAdapter,
+# então as conexões ficam num pool por host (keep-alive) compartilhado entre módulos e threads:
+# a fila médica, a recepção, o Core, a API do Feegow e a Clinia deixam de abrir um TCP+TLS
+# novo a cada chamada. Política igual para todos:
+#   - retentativa só de falha de conexão (a requisição nem saiu), com backoff curto;
+#     erro de leitura e 5xx/429 não são repetidos aqui (breaker e limitador cuidam, resiliencia.py)
+#   - timeout de conexão curto (HTTP_CONECTAR_S) e de leitura o da chamada (HTTP_TIMEOUT_S por padrão)
+#   - resposta comprimida (gzip/deflate) pedida em todas as sessões
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "16"))          # hosts com pool aberto ao mesmo tempo
+HTTP_POOL_CONEXOES = int(os.getenv("HTTP_POOL_CONEXOES", "10"))    # conexões guardadas por host
+HTTP_RETENTATIVAS = int(os.getenv("HTTP_RETENTATIVAS", "2"))
+HTTP_BACKOFF_S = float(os.getenv("HTTP_BACKOFF_S", "0.3"))
+HTTP_CONECTAR_S = float(os.getenv("HTTP_CONECTAR_S", "5"))
+HTTP_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "20"))
+
+_adaptador = None
+_cliente = None
+_lock = threading.Lock()
+
+def adaptador_http():
+    """HTTPAdapter do processo (pools por host + retentativa de conexão)"""
+    global _adaptador
+    with _lock:
+        if _adaptador is None:
+            retry = Retry(total=HTTP_RETENTATIVAS, connect=HTTP_RETENTATIVAS, read=0, status=0,
+                          backoff_factor=HTTP_BACKOFF_S, raise_on_status=False)
+            _adaptador = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_CONEXOES,
+                                     max_retries=retry)
+        return _adaptador
+
+def nova_sessao(guardar_cookies=True, headers=None, retry=None):
+    """
+    Sessão requests sobre o pool compartilhado. Cada sessão tem os próprios cookies e headers
+    (ex: login de uma unidade); guardar_cookies=False para quem manda o cookie pronto no header,
+    senão um Set-Cookie da resposta sobrescreveria o header na próxima chamada.
+    retry: política própria (urllib3 Retry) para quem não passa pelo breaker do resiliencia.py;
+    a sessão ganha um adaptador só dela, com o mesmo tamanho de pool.
+    """
+    sessao = requests.Session()
+    if retry is None:
+        adaptador = adaptador_http()
+    else:
+        adaptador = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_CONEXOES, max_retries=retry)
+    sessao.mount("https://", adaptador)
+    sessao.mount("http://", adaptador)
+    sessao.headers["Accept-Encoding"] = "gzip, deflate"
+    if not guardar_cookies:
+        sessao.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    if headers:
+        sessao.headers.update(headers)
+    return sessao
+
+def cliente_http():
+    """Sessão sem estado do processo (cookie só pelo header), usada por padrão no requisitar"""
+    global _cliente
+    if _cliente is None:
+        sessao = nova_sessao(guardar_cookies=False)
+        with _lock:
+            if _cliente is None:
+                _cliente = sessao
+    return _cliente
+
+def timeout_http(timeout=None, prazo=False):
+    """
+    (conexão, leitura) no formato do requests. Com prazo de ciclo, o timeout de conexão é dividido
+    entre as tentativas, para as retentativas não passarem do que sobra do ciclo.
+    """
+    leitura = HTTP_TIMEOUT_S if timeout is None else timeout
+    conectar = min(HTTP_CONECTAR_S, leitura)
+    if prazo:
+        conectar = min(conectar, leitura / (HTTP_RETENTATIVAS + 1))
+    return (conectar, leitura)
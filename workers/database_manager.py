@@ -1,16 +1,404 @@
 import sqlite3
 import datetime
 import os
+import sys
 import hashlib
-import pandas as pd
+import json
+import threading
+from contextlib import contextmanager
 
 # Define o caminho para a pasta /data na raiz de forma robusta
 # Isso garante que funcione tanto rodando da raiz quanto da pasta workers
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(BASE_DIR, 'data', 'dados_clinica.db')
 
+# Ajustes aplicados UMA vez, na abertura de cada conexão do pool
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_PRAGMAS = (
+    # Só tem efeito em banco novo (antes do WAL e da primeira tabela); banco antigo: retencao.py vacuum
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",               # Seguro com WAL e evita fsync a cada commit
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    "PRAGMA cache_size=-16000",                # ~16 MB de page cache por conexão
+    "PRAGMA mmap_size=134217728",              # 128 MB mapeados em memória
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA journal_size_limit=67108864",      # Após cada reset, o -wal volta a no máximo 64 MB
+)
+# Quantidade de statements preparados que o sqlite3 mantém em cache por conexão
+SQLITE_CACHED_STATEMENTS = 256
+
+# --- POOL DE CONEXÕES (uma por thread, reaproveitada pelo processo inteiro) ---
+_pool_local = threading.local()
+_pool_lock = threading.Lock()
+_pool_todas = []
+
+def _abrir_conexao(db_path):
+    conn = sqlite3.connect(
+        db_path,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=SQLITE_CACHED_STATEMENTS,
+    )
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_connection(db_path=DB_PATH):
+    """
+    Devolve a conexão persistente da thread atual para o banco informado.
+    A thread principal usa sempre a mesma conexão durante toda a vida do processo;
+    threads auxiliares ganham a sua própria (sqlite3 não compartilha conexões entre threads).
+    Após um fork o pool herdado é descartado e reaberto no processo filho.
+    """
+    if getattr(_pool_local, 'pid', None) != os.getpid():
+        _pool_local.pid = os.getpid()
+        _pool_local.conexoes = {}
+
+    conn = _pool_local.conexoes.get(db_path)
+    if conn is None:
+        conn = _abrir_conexao(db_path)
+        _pool_local.conexoes[db_path] = conn
+        with _pool_lock:
+            _pool_todas.append((os.getpid(), conn))
+    return conn
+
+def fechar_conexoes():
+    """Fecha todas as conexões abertas por este processo (uso no encerramento)"""
+    with _pool_lock:
+        for pid, conn in _pool_todas:
+            if pid != os.getpid():
+                continue
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _pool_todas.clear()
+    _pool_local.conexoes = {}
+
+# Data/hora local ('YYYY-MM-DD HH:MM:SS') -> epoch em segundos, calculado pelo próprio SQLite
+SQL_EPOCH = "CAST(strftime('%s', {}, 'utc') AS INTEGER)"
+# Espera real em minutos fracionários (epoch fim, epoch início): o AVG do painel sai igual à
+# média das diferenças, sem o arredondamento de cada linha para o minuto inteiro
+SQL_ESPERA_REAL = "MAX(0, ({} - {}) / 60.0)"
+
+def executar_passos(conn, passos):
+    """
+    Executa uma lista de passos (sql, params, many) na conexão, em ordem.
+    Retorna [(linhas, rowcount), ...]; linhas vem preenchido para SELECT e UPDATE ... RETURNING.
+    É o formato usado tanto na escrita direta quanto no DatabaseWriter (db_writer.py).
+    """
+    resultados = []
+    for sql, params, many in passos:
+        cur = conn.executemany(sql, params) if many else conn.execute(sql, params)
+        linhas = cur.fetchall() if cur.description else []
+        resultados.append((linhas, cur.rowcount))
+    return resultados
+
+# --- MIGRAÇÕES DE SCHEMA ---
+def _migracao_schema_base(conn):
+    """Tabelas originais do sistema (idempotente para bancos criados antes das migrações)"""
+    # 1. TABELA DE CONFIGURAÇÕES (INTEGRAÇÕES - FEEGOW/CLINIA)
+    # Essencial para o Painel de Admin > Configurações
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS integrations_config (
+        service TEXT PRIMARY KEY,
+        username TEXT,
+        password TEXT,
+        token TEXT,
+        unit_id TEXT,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+
+    # 2. TABELA DE METAS (GOALS)
+    # Atualizada com todos os campos que a página de Metas exige
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS goals_config (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sector TEXT,
+        name TEXT,
+        periodicity TEXT,    -- 'mensal', 'semanal', etc.
+        target_value REAL,
+        unit TEXT,
+        start_date TEXT,     -- Vigência Início
+        end_date TEXT,       -- Vigência Fim
+        linked_kpi_id TEXT,  -- ID técnico do indicador
+        filter_group TEXT,   -- Filtros avançados (JSON ou texto)
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+
+    # 3. RECEPÇÃO (Histórico de Senhas)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS recepcao_historico (
+        id INTEGER PRIMARY KEY,
+        unidade_id INTEGER,
+        senha TEXT,
+        status TEXT,
+        dt_chegada DATETIME,
+        dt_atendimento DATETIME,
+        tipo_senha TEXT,
+        dia_referencia DATE
+    )""")
+    
+    # 4. MÉDICO (Histórico de Espera)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS espera_medica_historico (
+        hash_id TEXT PRIMARY KEY,
+        unidade_nome TEXT,
+        paciente TEXT,
+        idade TEXT,
+        hora_agendada TEXT,
+        profissional TEXT,
+        especialidade TEXT,
+        dt_chegada DATETIME,
+        dt_atendimento DATETIME,
+        status TEXT,
+        espera_min INTEGER,
+        dia_referencia DATE
+    )""")
+
+    # 5. LEGADO (Tabela simples de chave-valor, mantida por segurança)
+    conn.execute("CREATE TABLE IF NOT EXISTS config (chave TEXT PRIMARY KEY, valor TEXT)")
+
+    # 6. FATURAMENTO (Scraping)
+    # Tabela para guardar os dados do relatório "Modo Franquia"
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS faturamento_scraping (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        unidade TEXT,
+        categoria TEXT, -- Ex: 'Total', 'Particular', 'Convênio' (depende da tabela)
+        valor REAL,
+        data_referencia DATE, -- Mês/Ano ou Dia da extração
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    
+    # Índices
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rec_dia ON recepcao_historico (dia_referencia)")
+
+def _migracao_espera_min(conn):
+    """Bancos antigos de espera_medica_historico não tinham a coluna espera_min"""
+    _adicionar_coluna(conn, 'espera_medica_historico', 'espera_min', 'INTEGER')
+
+def _migracao_feegow_appointments(conn):
+    """Tabela de produtividade do worker_feegow (antes criada/alterada a cada execução)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS feegow_appointments (
+            appointment_id INTEGER PRIMARY KEY,
+            date TEXT,
+            status_id INTEGER,
+            value REAL,
+            specialty TEXT,
+            professional_name TEXT,
+            procedure_group TEXT,
+            scheduled_by TEXT,
+            unit_name TEXT,
+            updated_at TEXT
+        )
+    ''')
+    # Bancos em que a tabela nasceu antes de scheduled_by/unit_name
+    _adicionar_coluna(conn, 'feegow_appointments', 'scheduled_by', 'TEXT')
+    _adicionar_coluna(conn, 'feegow_appointments', 'unit_name', 'TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_date ON feegow_appointments(date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user ON feegow_appointments(scheduled_by)')
+
+def _migracao_clinia(conn):
+    """Tabelas do worker_clinia (antes recriadas a cada ciclo de 30s)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS clinia_group_snapshots (
+            group_id TEXT PRIMARY KEY,
+            group_name TEXT,
+            queue_size INTEGER DEFAULT 0,
+            avg_wait_seconds INTEGER DEFAULT 0,
+            updated_at DATETIME
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS clinia_chat_stats (
+            date TEXT PRIMARY KEY,
+            total_conversations INTEGER DEFAULT 0,
+            total_without_response INTEGER DEFAULT 0,
+            avg_wait_seconds INTEGER DEFAULT 0,
+            updated_at DATETIME
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS clinia_appointment_stats (
+            date TEXT PRIMARY KEY,
+            total_appointments INTEGER DEFAULT 0,
+            bot_appointments INTEGER DEFAULT 0,
+            crc_appointments INTEGER DEFAULT 0,
+            updated_at DATETIME
+        )
+    ''')
+
+def _migracao_indices_filas(conn):
+    """
+    Índices das filas: todo finalizar_ausentes_* e todo poll do /api/queue/medic filtram
+    por dia + unidade + status.
+    """
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_med_dia_unidade_status
+        ON espera_medica_historico (dia_referencia, unidade_nome, status)""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_rec_unidade_dia_status
+        ON recepcao_historico (unidade_id, dia_referencia, status)""")
+
+def _migracao_sem_indices_parciais(conn):
+    """
+    Remove idx_med_ativos/idx_rec_ativos (criados pela versão 5 em bancos antigos): o planner sempre prefere os
+    compostos (dia + unidade + status), então os parciais só custavam escrita em todo upsert.
+    """
+    conn.execute("DROP INDEX IF EXISTS idx_med_ativos")
+    conn.execute("DROP INDEX IF EXISTS idx_rec_ativos")
+
+def _migracao_indices_agenda(conn):
+    """
+    Produtividade/metas filtram feegow_appointments por date BETWEEN + status_id IN (...)
+    + UPPER(TRIM(procedure_group)) e agrupam por scheduled_by ou unit_name.
+    procedure_group_key guarda o grupo já normalizado (mesma expressão do SQL, para o
+    UPPER do SQLite bater com o das queries) e os índices cobrem cada padrão sem ir à tabela.
+    """
+    _adicionar_coluna(conn, 'feegow_appointments', 'procedure_group_key', 'TEXT')
+    conn.execute("UPDATE feegow_appointments SET procedure_group_key = UPPER(TRIM(procedure_group))")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_appt_date_status_group
+        ON feegow_appointments (date, status_id, procedure_group_key)""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_appt_date_user_status
+        ON feegow_appointments (date, scheduled_by, status_id, value)""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_appt_date_unit
+        ON feegow_appointments (date, unit_name, status_id)""")
+    # idx_date virou prefixo de idx_appt_date_status_group
+    conn.execute("DROP INDEX IF EXISTS idx_date")
+
+def _migracao_campos_derivados(conn):
+    """
+    Campos calculados uma vez na escrita, para a leitura virar varredura simples de coluna:
+    epoch (segundos) de chegada/atendimento, espera real em minutos de quem já foi atendido
+    e as flags de prioridade da fila médica (antes detectadas por substring a cada poll).
+    """
+    for tabela in ('recepcao_historico', 'espera_medica_historico'):
+        _adicionar_coluna(conn, tabela, 'dt_chegada_ts', 'INTEGER')
+        _adicionar_coluna(conn, tabela, 'dt_atendimento_ts', 'INTEGER')
+        _adicionar_coluna(conn, tabela, 'espera_real_min', 'INTEGER')
+        conn.execute(f"""
+            UPDATE {tabela} SET
+                dt_chegada_ts = {SQL_EPOCH.format('dt_chegada')},
+                dt_atendimento_ts = {SQL_EPOCH.format('dt_atendimento')}
+        """)
+        conn.execute(f"""
+            UPDATE {tabela} SET espera_real_min = MAX(0, (dt_atendimento_ts - dt_chegada_ts) / 60)
+            WHERE dt_atendimento_ts IS NOT NULL AND dt_chegada_ts IS NOT NULL
+        """)
+
+    _adicionar_coluna(conn, 'espera_medica_historico', 'prioridade_idoso', 'INTEGER DEFAULT 0')
+    _adicionar_coluna(conn, 'espera_medica_historico', 'prioridade_cadeirante', 'INTEGER DEFAULT 0')
+    _adicionar_coluna(conn, 'espera_medica_historico', 'prioridade_gestante', 'INTEGER DEFAULT 0')
+    conn.execute("""
+        UPDATE espera_medica_historico SET
+            prioridade_idoso = (LOWER(paciente) LIKE '%idoso%' OR CAST(idade AS INTEGER) >= 60),
+            prioridade_cadeirante = (LOWER(paciente) LIKE '%cadeirante%'),
+            prioridade_gestante = (LOWER(paciente) LIKE '%gestante%')
+    """)
+
+def _migracao_espera_real_fracionada(conn):
+    """espera_real_min passa a guardar minutos fracionários: recalcula as linhas gravadas em minuto inteiro"""
+    for tabela in ('recepcao_historico', 'espera_medica_historico'):
+        conn.execute(f"""
+            UPDATE {tabela} SET espera_real_min = {SQL_ESPERA_REAL.format('dt_atendimento_ts', 'dt_chegada_ts')}
+            WHERE dt_atendimento_ts IS NOT NULL AND dt_chegada_ts IS NOT NULL
+        """)
+
+def _migracao_auth_sessoes(conn):
+    """Cookies de sessão por serviço/unidade com validade (auth_broker.py)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS auth_sessoes (
+            servico TEXT NOT NULL,
+            unidade TEXT NOT NULL DEFAULT '',
+            cookies TEXT NOT NULL,
+            expira_em REAL,
+            origem TEXT,
+            atualizado_em DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (servico, unidade)
+        )""")
+
+def _migracao_leases(conn):
+    """Posse das unidades entre réplicas dos workers (particionamento.py)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS unidade_leases (
+            recurso TEXT NOT NULL,
+            unidade TEXT NOT NULL,
+            dono TEXT NOT NULL,
+            expira_em REAL NOT NULL,
+            PRIMARY KEY (recurso, unidade)
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS lease_replicas (
+            recurso TEXT NOT NULL,
+            dono TEXT NOT NULL,
+            visto_em REAL NOT NULL,
+            PRIMARY KEY (recurso, dono)
+        )""")
+
+def _adicionar_coluna(conn, tabela, coluna, tipo):
+    colunas = {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+    if coluna not in colunas:
+        conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+
+# --- REGISTRO DE MIGRAÇÕES ---
+# (versão, descrição, função). A versão aplicada fica gravada em PRAGMA user_version,
+# então cada passo roda uma única vez por banco. Novos passos entram SEMPRE no fim da lista.
+MIGRACOES = [
+    (1, "schema base", _migracao_schema_base),
+    (2, "espera_medica_historico.espera_min", _migracao_espera_min),
+    (3, "feegow_appointments", _migracao_feegow_appointments),
+    (4, "tabelas clinia", _migracao_clinia),
+    (5, "índices compostos das filas", _migracao_indices_filas),
+    (6, "feegow_appointments.procedure_group_key e índices de cobertura", _migracao_indices_agenda),
+    (7, "campos derivados das filas (epoch, espera real, prioridades)", _migracao_campos_derivados),
+    (8, "auth_sessoes", _migracao_auth_sessoes),
+    (9, "unidade_leases e lease_replicas", _migracao_leases),
+    (10, "remove os índices parciais das filas", _migracao_sem_indices_parciais),
+    (11, "espera_real_min em minutos fracionários", _migracao_espera_real_fracionada),
+]
+SCHEMA_VERSION = MIGRACOES[-1][0]
+
+_schema_lock = threading.Lock()
+_schema_ok = set()  # bancos já conferidos neste processo
+
+def aplicar_migracoes(conn, db_path=DB_PATH):
+    """
+    Aplica apenas as migrações que faltam. Caminho rápido: uma leitura de user_version.
+    O lock de thread + BEGIN IMMEDIATE garantem que só um processo/thread migra por vez;
+    a versão é relida dentro do lock porque outro worker pode ter migrado enquanto esperávamos.
+    """
+    if db_path in _schema_ok:
+        return SCHEMA_VERSION
+
+    versao = conn.execute("PRAGMA user_version").fetchone()[0]
+    if versao >= SCHEMA_VERSION:
+        _schema_ok.add(db_path)
+        return versao
+
+    with _schema_lock:
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            versao = conn.execute("PRAGMA user_version").fetchone()[0]
+            for numero, descricao, funcao in MIGRACOES:
+                if numero <= versao:
+                    continue
+                print(f"   [DB] Aplicando migração {numero}: {descricao}")
+                funcao(conn)
+                conn.execute(f"PRAGMA user_version = {numero}")
+                versao = numero
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    _schema_ok.add(db_path)
+    return versao
+
 class DatabaseManager:
-    def __init__(self, db_name="dados_clinica.db"):
+    def __init__(self, db_name="dados_clinica.db", writer=None, fonte=None):
         # Se for instanciado com caminho diferente, respeita, senão usa o padrão global
         self.db_path = DB_PATH
         
@@ -18,179 +406,485 @@ class DatabaseManager:
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         self._init_db()
 
-    def _init_db(self):
-        """Inicializa todas as tabelas necessárias do sistema"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA journal_mode=WAL;") 
-            
-            # 1. TABELA DE CONFIGURAÇÕES (INTEGRAÇÕES - FEEGOW/CLINIA)
-            # Essencial para o Painel de Admin > Configurações
-            conn.execute("""
-            CREATE TABLE IF NOT EXISTS integrations_config (
-                service TEXT PRIMARY KEY,
-                username TEXT,
-                password TEXT,
-                token TEXT,
-                unit_id TEXT,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )""")
-
-            # 2. TABELA DE METAS (GOALS)
-            # Atualizada com todos os campos que a página de Metas exige
-            conn.execute("""
-            CREATE TABLE IF NOT EXISTS goals_config (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sector TEXT,
-                name TEXT,
-                periodicity TEXT,    -- 'mensal', 'semanal', etc.
-                target_value REAL,
-                unit TEXT,
-                start_date TEXT,     -- Vigência Início
-                end_date TEXT,       -- Vigência Fim
-                linked_kpi_id TEXT,  -- ID técnico do indicador
-                filter_group TEXT,   -- Filtros avançados (JSON ou texto)
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )""")
-
-            # 3. RECEPÇÃO (Histórico de Senhas)
-            conn.execute("""
-            CREATE TABLE IF NOT EXISTS recepcao_historico (
-                id INTEGER PRIMARY KEY,
-                unidade_id INTEGER,
-                senha TEXT,
-                status TEXT,
-                dt_chegada DATETIME,
-                dt_atendimento DATETIME,
-                tipo_senha TEXT,
-                dia_referencia DATE
-            )""")
-            
-            # 4. MÉDICO (Histórico de Espera)
-            conn.execute("""
-            CREATE TABLE IF NOT EXISTS espera_medica_historico (
-                hash_id TEXT PRIMARY KEY,
-                unidade_nome TEXT,
-                paciente TEXT,
-                idade TEXT,
-                hora_agendada TEXT,
-                profissional TEXT,
-                especialidade TEXT,
-                dt_chegada DATETIME,
-                dt_atendimento DATETIME,
-                status TEXT,
-                espera_min INTEGER,
-                dia_referencia DATE
-            )""")
-            
-            # Migração silenciosa para bancos antigos (evita erro se a coluna faltar)
+        # Escritor único opcional (db_writer.py). Sem ele, grava direto pela conexão do pool.
+        # writer=False força a escrita direta mesmo com DB_WRITER_SOCKET configurado.
+        if writer is None:
             try:
-                conn.execute("ALTER TABLE espera_medica_historico ADD COLUMN espera_min INTEGER")
-            except sqlite3.OperationalError:
-                pass 
-
-            # 5. LEGADO (Tabela simples de chave-valor, mantida por segurança)
-            conn.execute("CREATE TABLE IF NOT EXISTS config (chave TEXT PRIMARY KEY, valor TEXT)")
-
-            # 6. FATURAMENTO (Scraping)
-            # Tabela para guardar os dados do relatório "Modo Franquia"
-            conn.execute("""
-            CREATE TABLE IF NOT EXISTS faturamento_scraping (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                unidade TEXT,
-                categoria TEXT, -- Ex: 'Total', 'Particular', 'Convênio' (depende da tabela)
-                valor REAL,
-                data_referencia DATE, -- Mês/Ano ou Dia da extração
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )""")
-            
-            # Índices
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_rec_dia ON recepcao_historico (dia_referencia)")
+                from db_writer import writer_padrao
+            except ImportError:
+                from .db_writer import writer_padrao
+            writer = writer_padrao()
+        self.writer = writer
+        self.fonte = fonte or os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+        self._ultima_retencao = None
+
+    def _conn(self):
+        """Conexão persistente (pool por thread) já com os PRAGMAs aplicados"""
+        return get_connection(self.db_path)
+
+    @contextmanager
+    def _transacao(self):
+        """
+        Transação explícita: BEGIN IMMEDIATE pega o lock de escrita logo no início,
+        então o lote inteiro é gravado de uma vez e o lock do WAL é liberado no COMMIT.
+        """
+        conn = self._conn()
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    def executar_escrita(self, passos, fonte=None):
+        """
+        Grava uma lista de passos (sql, params, many) atomicamente.
+        Com writer configurado o pedido entra no group commit; senão vira uma transação local.
+        """
+        if self.writer:
+            return self.writer.executar(fonte or self.fonte, passos)
+        with self._transacao() as conn:
+            return executar_passos(conn, passos)
+
+    def _init_db(self):
+        """Garante o schema atual. Se o banco já estiver na última versão custa só uma leitura de PRAGMA"""
+        aplicar_migracoes(self._conn(), self.db_path)
 
     # --- MÉTODOS DE INTEGRAÇÃO (NOVO) ---
     def get_integration_config(self, service):
         """Busca as credenciais salvas pelo Painel Admin"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            res = conn.execute("SELECT * FROM integrations_config WHERE service = ?", (service,)).fetchone()
-            return dict(res) if res else None
+        cur = self._conn().execute("SELECT * FROM integrations_config WHERE service = ?", (service,))
+        res = cur.fetchone()
+        if not res:
+            return None
+        return {col[0]: valor for col, valor in zip(cur.description, res)}
+
+    # --- SESSÕES DE AUTENTICAÇÃO (auth_broker.py) ---
+    SQL_UPSERT_AUTH = """
+        INSERT INTO auth_sessoes (servico, unidade, cookies, expira_em, origem, atualizado_em)
+        VALUES (?, ?, ?, ?, ?, datetime('now'))
+        ON CONFLICT(servico, unidade) DO UPDATE SET
+            cookies=excluded.cookies, expira_em=excluded.expira_em,
+            origem=excluded.origem, atualizado_em=excluded.atualizado_em
+    """
+
+    def carregar_sessoes_auth(self, servico):
+        """{unidade: (cookies, expira_em, origem)} do serviço"""
+        return {
+            unidade: (cookies, expira_em, origem)
+            for unidade, cookies, expira_em, origem in self._conn().execute(
+                "SELECT unidade, cookies, expira_em, origem FROM auth_sessoes WHERE servico = ?", (servico,))
+        }
+
+    def salvar_sessao_auth(self, servico, unidade, cookies, expira_em=None, origem=None):
+        self.executar_escrita([(self.SQL_UPSERT_AUTH, (servico, str(unidade), cookies, expira_em, origem), False)])
+
+    def remover_sessao_auth(self, servico, unidade, cookies=None):
+        """Apaga a sessão; com cookies, só se ainda for a mesma (outro processo pode já ter renovado)"""
+        if cookies is None:
+            passo = ("DELETE FROM auth_sessoes WHERE servico = ? AND unidade = ?", (servico, str(unidade)), False)
+        else:
+            passo = ("DELETE FROM auth_sessoes WHERE servico = ? AND unidade = ? AND cookies = ?",
+                     (servico, str(unidade), cookies), False)
+        self.executar_escrita([passo])
+
+    # --- LEASES DAS UNIDADES ENTRE RÉPLICAS (particionamento.py) ---
+    # Só grava se o lease é nosso ou já venceu: duas réplicas nunca ficam com a mesma unidade.
+    SQL_RENOVAR_LEASE = """
+        INSERT INTO unidade_leases (recurso, unidade, dono, expira_em) VALUES (?1, ?2, ?3, ?4)
+        ON CONFLICT(recurso, unidade) DO UPDATE SET dono=excluded.dono, expira_em=excluded.expira_em
+        WHERE unidade_leases.dono = excluded.dono OR unidade_leases.expira_em < ?5
+        RETURNING unidade
+    """
+
+    def carregar_leases(self, recurso):
+        """({unidade: (dono, expira_em)}, {dono: visto_em}) do recurso"""
+        conn = self._conn()
+        leases = {
+            unidade: (dono, expira_em)
+            for unidade, dono, expira_em in conn.execute(
+                "SELECT unidade, dono, expira_em FROM unidade_leases WHERE recurso = ?", (recurso,))
+        }
+        replicas = dict(conn.execute("SELECT dono, visto_em FROM lease_replicas WHERE recurso = ?", (recurso,)))
+        return leases, replicas
+
+    def renovar_leases(self, recurso, dono, unidades, expira_em, agora, soltar=(), soltar_em=None):
+        """
+        Heartbeat da réplica: marca presença, renova/toma as `unidades` e encurta as de `soltar`
+        para `soltar_em`. Devolve as unidades que ficaram com esta réplica.
+        """
+        passos = [
+            ("""INSERT INTO lease_replicas (recurso, dono, visto_em) VALUES (?, ?, ?)
+                ON CONFLICT(recurso, dono) DO UPDATE SET visto_em=excluded.visto_em""",
+             (recurso, dono, agora), False),
+            ("UPDATE unidade_leases SET expira_em = MIN(expira_em, ?) WHERE recurso = ? AND dono = ? AND unidade = ?",
+             [(soltar_em, recurso, dono, str(u)) for u in soltar], True),
+        ]
+        passos += [(self.SQL_RENOVAR_LEASE, (recurso, str(u), dono, expira_em, agora), False) for u in unidades]
+        resultado = self.executar_escrita(passos)
+        return {linhas[0][0] for linhas, _ in resultado[2:] if linhas}
+
+    def liberar_leases(self, recurso, dono):
+        """Encerramento limpo: devolve as unidades na hora (sem esperar o lease vencer)"""
+        self.executar_escrita([
+            ("DELETE FROM unidade_leases WHERE recurso = ? AND dono = ?", (recurso, dono), False),
+            ("DELETE FROM lease_replicas WHERE recurso = ? AND dono = ?", (recurso, dono), False),
+        ])
+
+    def salvar_cookie(self, cookie, servico='feegow'):
+        """
+        Cookie colado manualmente (atualizar_token.py): vai para integrations_config.token,
+        que o Painel Admin também edita, e vira a sessão atual do Core no auth_sessoes.
+        """
+        self.executar_escrita([
+            ("""INSERT INTO integrations_config (service, token, updated_at) VALUES (?, ?, datetime('now'))
+                ON CONFLICT(service) DO UPDATE SET token=excluded.token, updated_at=excluded.updated_at""",
+             (servico, cookie), False),
+            (self.SQL_UPSERT_AUTH, (f"{servico}_core", '', cookie, None, 'manual'), False),
+        ])
 
     # --- MÉTODOS RECEPÇÃO ---
+    SQL_UPSERT_RECEPCAO = f"""
+        INSERT INTO recepcao_historico (id, unidade_id, senha, status, dt_chegada, dt_atendimento, tipo_senha, dia_referencia,
+                                        dt_chegada_ts, dt_atendimento_ts, espera_real_min)
+        VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8,
+                {SQL_EPOCH.format('?5')}, {SQL_EPOCH.format('?6')},
+                {SQL_ESPERA_REAL.format(SQL_EPOCH.format('?6'), SQL_EPOCH.format('?5'))})
+        ON CONFLICT(id) DO UPDATE SET
+            status=excluded.status, dt_atendimento=excluded.dt_atendimento,
+            dt_atendimento_ts=excluded.dt_atendimento_ts, espera_real_min=excluded.espera_real_min
+    """
+
     def salvar_dados_recepcao(self, lista_dados):
-        if not lista_dados: return
+        """Grava a fila da recepção em lote. Retorna {'inseridos': n, 'atualizados': n}"""
+        if not lista_dados: return {'inseridos': 0, 'atualizados': 0}
         hoje = datetime.date.today().isoformat()
-        with sqlite3.connect(self.db_path) as conn:
-            for item in lista_dados:
-                dt_atend = item.get('DataHoraAtendimento') or None
-                conn.execute("""
-                INSERT INTO recepcao_historico (id, unidade_id, senha, status, dt_chegada, dt_atendimento, tipo_senha, dia_referencia)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(id) DO UPDATE SET status=excluded.status, dt_atendimento=excluded.dt_atendimento
-                """, (item['id'], item['UnidadeID'], item.get('Senha'), item.get('Sta'), item.get('DataHoraChegada'), dt_atend, item.get('NomeTipo'), hoje))
+
+        # Monta todos os parâmetros numa passada só, fora da transação
+        params = [
+            (item['id'], item['UnidadeID'], item.get('Senha'), item.get('Sta'),
+             item.get('DataHoraChegada'), item.get('DataHoraAtendimento') or None,
+             item.get('NomeTipo'), hoje)
+            for item in lista_dados
+        ]
+        ids_json = json.dumps([p[0] for p in params])
+
+        resultado = self.executar_escrita([
+            ("SELECT COUNT(*) FROM recepcao_historico WHERE id IN (SELECT value FROM json_each(?))", (ids_json,), False),
+            (self.SQL_UPSERT_RECEPCAO, params, True),
+        ])
+        existentes = resultado[0][0][0][0]
+
+        total = len({p[0] for p in params})
+        return {'inseridos': total - existentes, 'atualizados': existentes}
+
+    # Anti-join contra a tabela temporária dos presentes. Busca por idx_rec_unidade_dia_status
+    # (unidade_id IN ... + dia + status); dt_atendimento IS NULL é filtrado nas linhas achadas.
+    SQL_FINALIZAR_RECEPCAO = f"""
+        UPDATE recepcao_historico SET
+            dt_atendimento = ?1, status = 'Atendido_Inferido',
+            dt_atendimento_ts = {SQL_EPOCH.format('?1')},
+            espera_real_min = {SQL_ESPERA_REAL.format(SQL_EPOCH.format('?1'), 'dt_chegada_ts')}
+        WHERE dia_referencia = ? AND status = 'Espera' AND dt_atendimento IS NULL
+        AND unidade_id IN (SELECT value FROM json_each(?))
+        AND NOT EXISTS (
+            SELECT 1 FROM temp._presentes_recepcao p
+            WHERE p.unidade = recepcao_historico.unidade_id AND p.chave = recepcao_historico.id
+        )
+        RETURNING unidade_id
+    """
 
     def finalizar_ausentes_recepcao(self, unidade_id, lista_ids_presentes):
+        return self.finalizar_ausentes_recepcao_lote({unidade_id: lista_ids_presentes}).get(unidade_id, 0)
+
+    def finalizar_ausentes_recepcao_lote(self, presentes_por_unidade):
+        """
+        Dá baixa (Atendido_Inferido) em quem saiu da fila, para várias unidades em um único UPDATE.
+        presentes_por_unidade: {unidade_id: [ids ainda na fila]}. Retorna {unidade_id: qtd_finalizada}
+        """
+        if not presentes_por_unidade: return {}
+        hoje = datetime.date.today().isoformat()
+        agora = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        presentes = [(uid, id_) for uid, ids in presentes_por_unidade.items() for id_ in ids]
+
+        resultado = self.executar_escrita(self._passos_presentes('_presentes_recepcao', 'INTEGER', 'INTEGER', presentes) + [
+            (self.SQL_FINALIZAR_RECEPCAO, (agora, hoje, json.dumps(list(presentes_por_unidade))), False)
+        ])
+        finalizados = resultado[-1][0]
+
+        return self._contar_por_unidade(presentes_por_unidade, finalizados)
+
+    # Baixa direta por chave, para quem o monitor já sabe que saiu (diff do estado em memória).
+    # "+dia_referencia" pelo mesmo motivo do SQL_FINALIZAR_MEDICOS_HASHES: busca só pela PK (id)
+    SQL_FINALIZAR_RECEPCAO_IDS = f"""
+        UPDATE recepcao_historico SET
+            dt_atendimento = ?1, status = 'Atendido_Inferido',
+            dt_atendimento_ts = {SQL_EPOCH.format('?1')},
+            espera_real_min = {SQL_ESPERA_REAL.format(SQL_EPOCH.format('?1'), 'dt_chegada_ts')}
+        WHERE id IN (SELECT value FROM json_each(?3))
+        AND +dia_referencia = ?2 AND status = 'Espera' AND dt_atendimento IS NULL
+        RETURNING unidade_id
+    """
+
+    def finalizar_recepcao_por_id(self, ids):
+        """Dá baixa nos ids informados (se ainda estiverem em espera hoje). Retorna {unidade_id: qtd}"""
+        if not ids: return {}
         hoje = datetime.date.today().isoformat()
         agora = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        placeholders = ",".join(map(str, lista_ids_presentes)) if lista_ids_presentes else "-1"
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(f"""
-                UPDATE recepcao_historico SET dt_atendimento = ?, status = 'Atendido_Inferido'
-                WHERE unidade_id = ? AND dia_referencia = ? AND status = 'Espera' 
-                AND dt_atendimento IS NULL AND id NOT IN ({placeholders})
-            """, (agora, unidade_id, hoje))
+        resultado = self.executar_escrita([(self.SQL_FINALIZAR_RECEPCAO_IDS, (agora, hoje, json.dumps(list(ids))), False)])
+        return self._contar_por_unidade({}, resultado[0][0])
+
+    def carregar_fila_ativa_recepcao(self, unidades):
+        """Linhas em espera hoje: {unidade_id: {id: (status, dt_atendimento)}} (aquece o QueueState)"""
+        hoje = datetime.date.today().isoformat()
+        filas = {uid: {} for uid in unidades}
+        for uid, id_, status, dt_atendimento in self._conn().execute("""
+            SELECT unidade_id, id, status, dt_atendimento FROM recepcao_historico
+            WHERE dia_referencia = ? AND status = 'Espera' AND dt_atendimento IS NULL
+            AND unidade_id IN (SELECT value FROM json_each(?))
+        """, (hoje, json.dumps(list(unidades)))):
+            filas.setdefault(uid, {})[id_] = (status, dt_atendimento)
+        return filas
+
+    @staticmethod
+    def _passos_presentes(tabela, tipo_unidade, tipo_chave, presentes):
+        """Passos que carregam (unidade, chave) na tabela temporária da conexão usada pelo anti-join"""
+        return [
+            (f"""CREATE TEMP TABLE IF NOT EXISTS {tabela} (
+                unidade {tipo_unidade}, chave {tipo_chave}, PRIMARY KEY (unidade, chave)
+            ) WITHOUT ROWID""", (), False),
+            (f"DELETE FROM temp.{tabela}", (), False),
+            (f"INSERT OR IGNORE INTO temp.{tabela} (unidade, chave) VALUES (?, ?)", presentes, True),
+        ]
+
+    @staticmethod
+    def _contar_por_unidade(presentes_por_unidade, linhas_retornadas):
+        contagem = dict.fromkeys(presentes_por_unidade, 0)
+        for (unidade,) in linhas_retornadas:
+            contagem[unidade] = contagem.get(unidade, 0) + 1
+        return contagem
 
     # --- MÉTODOS MÉDICOS ---
-    def _gerar_hash_medico(self, row, dia):
-        raw = f"{row['UNIDADE']}-{row['PACIENTE']}-{row['CHEGADA']}-{dia}"
-        return hashlib.md5(raw.encode()).hexdigest()
+    SQL_UPSERT_MEDICO = f"""
+        INSERT INTO espera_medica_historico 
+        (hash_id, unidade_nome, paciente, idade, hora_agendada, profissional, especialidade, dt_chegada, status, espera_min, dia_referencia,
+         prioridade_idoso, prioridade_cadeirante, prioridade_gestante, dt_chegada_ts)
+        VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?12, ?13, ?14, {SQL_EPOCH.format('?8')})
+        ON CONFLICT(hash_id) DO UPDATE SET 
+            status=excluded.status, 
+            espera_min=excluded.espera_min
+    """
+
+    @staticmethod
+    def _coluna(df, nome, padrao):
+        """Valores da coluna como tipos Python nativos (ou o padrão, se ela não existir)"""
+        if nome in df.columns:
+            return df[nome].tolist()
+        return [padrao] * len(df)
+
+    @staticmethod
+    def _vazio(valor):
+        # Célula vazia da tabela: None ou NaN (o read_html/parser_fila devolvem NaN)
+        return valor is None or (isinstance(valor, float) and valor != valor)
+
+    def _dt_chegada(self, hoje, chegada):
+        """'YYYY-MM-DD HH:MM:00' da chegada, ou None (NULL) se a célula veio vazia"""
+        return None if self._vazio(chegada) else f"{hoje} {chegada}:00"
+
+    def gerar_hashes_medicos(self, df_medico, dia=None):
+        """
+        Hash de identificação de cada paciente (Unidade-Paciente-Chegada-Dia), em uma passada.
+        A chave é montada valor a valor como o f-string por linha original (célula vazia = "nan"):
+        o astype(str) por coluna deixa NaN no pandas 3 e quebrava o md5 da unidade inteira.
+        """
+        dia = dia or datetime.date.today().isoformat()
+        chaves = zip(df_medico['UNIDADE'].tolist(), df_medico['PACIENTE'].tolist(), df_medico['CHEGADA'].tolist())
+        return [hashlib.md5(f"{unidade}-{paciente}-{chegada}-{dia}".encode()).hexdigest()
+                for unidade, paciente, chegada in chaves]
 
     def salvar_dados_medicos(self, df_medico):
-        if df_medico.empty: return
+        """
+        Grava a fila médica em lote. Se o DataFrame ainda não tiver a coluna HASH_ID
+        ela é preenchida aqui, para que o monitor reaproveite os hashes no finalizar_ausentes.
+        Retorna {'inseridos': n, 'atualizados': n}
+        """
+        if df_medico.empty: return {'inseridos': 0, 'atualizados': 0}
         hoje = datetime.date.today().isoformat()
-        data_base = datetime.date.today().strftime('%Y-%m-%d')
-        
-        with sqlite3.connect(self.db_path) as conn:
-            for _, row in df_medico.iterrows():
-                hash_id = self._gerar_hash_medico(row, hoje)
-                dt_chegada_completa = f"{data_base} {row['CHEGADA']}:00"
-                
-                status_real = row.get('STATUS_DETECTADO', 'Espera')
-                espera_real = row.get('ESPERA_MINUTOS', 0)
-                
-                conn.execute("""
-                INSERT INTO espera_medica_historico 
-                (hash_id, unidade_nome, paciente, idade, hora_agendada, profissional, especialidade, dt_chegada, status, espera_min, dia_referencia)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(hash_id) DO UPDATE SET 
-                    status=excluded.status, 
-                    espera_min=excluded.espera_min
-                """, (
-                    hash_id, 
-                    row['UNIDADE'], 
-                    row['PACIENTE'], 
-                    row.get('IDADE',''), 
-                    row.get('HORA',''), 
-                    row['PROFISSIONAL'], 
-                    row['COMPROMISSO'], 
-                    dt_chegada_completa, 
-                    status_real, 
-                    espera_real, 
-                    hoje
-                ))
+
+        if 'HASH_ID' not in df_medico.columns:
+            df_medico['HASH_ID'] = self.gerar_hashes_medicos(df_medico, hoje)
+
+        return self._gravar_medicos(hoje, zip(
+            df_medico['HASH_ID'].tolist(),
+            self._coluna(df_medico, 'UNIDADE', None),
+            self._coluna(df_medico, 'PACIENTE', None),
+            self._coluna(df_medico, 'IDADE', ''),
+            self._coluna(df_medico, 'HORA', ''),
+            self._coluna(df_medico, 'PROFISSIONAL', None),
+            self._coluna(df_medico, 'COMPROMISSO', None),
+            df_medico['CHEGADA'].tolist(),
+            self._coluna(df_medico, 'STATUS_DETECTADO', 'Espera'),
+            self._coluna(df_medico, 'ESPERA_MINUTOS', 0),
+            self._coluna(df_medico, 'PRIORIDADE_IDOSO', 0),
+            self._coluna(df_medico, 'PRIORIDADE_CADEIRANTE', 0),
+            self._coluna(df_medico, 'PRIORIDADE_GESTANTE', 0),
+        ))
+
+    def salvar_fila_medica(self, entradas):
+        """
+        Mesmo upsert do salvar_dados_medicos a partir de QueueEntry (parser_fila.entradas_fila),
+        com o hash que já veio do parse. Retorna {'inseridos': n, 'atualizados': n}
+        """
+        if not entradas: return {'inseridos': 0, 'atualizados': 0}
+        hoje = datetime.date.today().isoformat()
+
+        return self._gravar_medicos(hoje, (
+            (e.hash_id, e.unidade, e.paciente, e.idade, e.hora, e.profissional, e.compromisso, e.chegada,
+             e.status, e.espera_min, e.prioridade_idoso, e.prioridade_cadeirante, e.prioridade_gestante)
+            for e in entradas
+        ))
+
+    # Só reescreve a linha quando o Feegow informou outro valor (o minuto virou)
+    SQL_ATUALIZAR_ESPERA_MEDICO = """
+        UPDATE espera_medica_historico SET espera_min = ?1
+        WHERE hash_id = ?2 AND espera_min IS NOT ?1
+    """
+
+    def atualizar_espera_medicos(self, entradas):
+        """Atualiza espera_min de quem continua na fila com o mesmo status. Retorna quantas linhas mudaram"""
+        if not entradas: return 0
+        resultado = self.executar_escrita([
+            (self.SQL_ATUALIZAR_ESPERA_MEDICO, [(e.espera_min, e.hash_id) for e in entradas], True)
+        ])
+        return resultado[0][1]
+
+    def _gravar_medicos(self, hoje, linhas):
+        """
+        Upsert da fila médica usado pelos dois caminhos (DataFrame e QueueEntry). Cada linha:
+        (hash, unidade, paciente, idade, hora, profissional, compromisso, chegada "HH:MM",
+         status, espera_min, idoso, cadeirante, gestante). Retorna {'inseridos': n, 'atualizados': n}
+        """
+        params = [
+            (hash_id, unidade, paciente, idade, hora, profissional, compromisso, self._dt_chegada(hoje, chegada),
+             status, espera_min, hoje, idoso, cadeirante, gestante)
+            for (hash_id, unidade, paciente, idade, hora, profissional, compromisso, chegada,
+                 status, espera_min, idoso, cadeirante, gestante) in linhas
+        ]
+        hashes = [p[0] for p in params]
+
+        resultado = self.executar_escrita([
+            ("SELECT COUNT(*) FROM espera_medica_historico WHERE hash_id IN (SELECT value FROM json_each(?))",
+             (json.dumps(hashes),), False),
+            (self.SQL_UPSERT_MEDICO, params, True),
+        ])
+        existentes = resultado[0][0][0][0]
+
+        total = len(set(hashes))
+        return {'inseridos': total - existentes, 'atualizados': existentes}
+
+    # Mesmo anti-join, pelo idx_med_dia_unidade_status (dia + unidade_nome IN ... + status)
+    SQL_FINALIZAR_MEDICOS = f"""
+        UPDATE espera_medica_historico SET
+            dt_atendimento = ?1, status = 'Atendido_Inferido',
+            dt_atendimento_ts = {SQL_EPOCH.format('?1')},
+            espera_real_min = {SQL_ESPERA_REAL.format(SQL_EPOCH.format('?1'), 'dt_chegada_ts')}
+        WHERE dia_referencia = ? AND status IN ('Espera', 'Em Atendimento')
+        AND unidade_nome IN (SELECT value FROM json_each(?))
+        AND NOT EXISTS (
+            SELECT 1 FROM temp._presentes_medicos p
+            WHERE p.unidade = espera_medica_historico.unidade_nome AND p.chave = espera_medica_historico.hash_id
+        )
+        RETURNING unidade_nome
+    """
 
     def finalizar_ausentes_medicos(self, nome_unidade, lista_hashes_presentes):
+        return self.finalizar_ausentes_medicos_lote({nome_unidade: lista_hashes_presentes}).get(nome_unidade, 0)
+
+    def finalizar_ausentes_medicos_lote(self, presentes_por_unidade):
+        """
+        Mesmo anti-join da recepção para a fila médica.
+        presentes_por_unidade: {nome_unidade: [hashes ainda na fila]}. Retorna {nome_unidade: qtd_finalizada}
+        """
+        if not presentes_por_unidade: return {}
         hoje = datetime.date.today().isoformat()
         agora = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        placeholders = ",".join([f"'{h}'" for h in lista_hashes_presentes]) if lista_hashes_presentes else "'NO_IDS'"
-        
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(f"""
-                UPDATE espera_medica_historico SET dt_atendimento = ?, status = 'Atendido_Inferido'
-                WHERE unidade_nome = ? AND dia_referencia = ? 
-                AND (status = 'Espera' OR status = 'Em Atendimento')
-                AND hash_id NOT IN ({placeholders})
-            """, (agora, nome_unidade, hoje))
+        presentes = [(nome, h) for nome, hashes in presentes_por_unidade.items() for h in hashes]
+
+        resultado = self.executar_escrita(self._passos_presentes('_presentes_medicos', 'TEXT', 'TEXT', presentes) + [
+            (self.SQL_FINALIZAR_MEDICOS, (agora, hoje, json.dumps(list(presentes_por_unidade))), False)
+        ])
+        finalizados = resultado[-1][0]
+
+        return self._contar_por_unidade(presentes_por_unidade, finalizados)
             
+    # "+dia_referencia" tira a coluna do índice: o plano vai direto pela PK (hash_id) em vez de
+    # percorrer todos os ativos do dia no idx_med_dia_unidade_status
+    SQL_FINALIZAR_MEDICOS_HASHES = f"""
+        UPDATE espera_medica_historico SET
+            dt_atendimento = ?1, status = 'Atendido_Inferido',
+            dt_atendimento_ts = {SQL_EPOCH.format('?1')},
+            espera_real_min = {SQL_ESPERA_REAL.format(SQL_EPOCH.format('?1'), 'dt_chegada_ts')}
+        WHERE hash_id IN (SELECT value FROM json_each(?3))
+        AND +dia_referencia = ?2 AND status IN ('Espera', 'Em Atendimento')
+        RETURNING unidade_nome
+    """
+
+    def finalizar_medicos_por_hash(self, hashes):
+        """Dá baixa nos hashes informados (se ainda estiverem ativos hoje). Retorna {nome_unidade: qtd}"""
+        if not hashes: return {}
+        hoje = datetime.date.today().isoformat()
+        agora = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        resultado = self.executar_escrita([(self.SQL_FINALIZAR_MEDICOS_HASHES, (agora, hoje, json.dumps(list(hashes))), False)])
+        return self._contar_por_unidade({}, resultado[0][0])
+
+    def carregar_fila_ativa_medicos(self, unidades):
+        """Pacientes ativos hoje: {nome_unidade: {hash_id: status}} (aquece o QueueState)"""
+        hoje = datetime.date.today().isoformat()
+        filas = {nome: {} for nome in unidades}
+        for nome, hash_id, status in self._conn().execute("""
+            SELECT unidade_nome, hash_id, status FROM espera_medica_historico
+            WHERE dia_referencia = ? AND status IN ('Espera', 'Em Atendimento')
+            AND unidade_nome IN (SELECT value FROM json_each(?))
+        """, (hoje, json.dumps(list(unidades)))):
+            filas.setdefault(nome, {})[hash_id] = status
+        return filas
+
     def limpar_dias_anteriores(self):
-        # Opcional: Limpar dados antigos
-        pass
\ No newline at end of file
+        """
+        Retenção diária (retencao.py): dias anteriores à janela quente vão para o banco de arquivo.
+        Chamado a cada ciclo dos monitores, mas só roda uma vez por dia entre todos os processos.
+        """
+        hoje = datetime.date.today()
+        if self._ultima_retencao == hoje:
+            return None
+        self._ultima_retencao = hoje
+
+        try:
+            from retencao import reivindicar_execucao, executar_retencao
+        except ImportError:
+            from .retencao import reivindicar_execucao, executar_retencao
+
+        conn = self._conn()
+        if not reivindicar_execucao(conn, hoje.isoformat()):
+            return None
+
+        # Manutenção grava direto (lotes curtos de BEGIN IMMEDIATE), sem passar pelo writer
+        inicio = datetime.datetime.now()
+        resumo = executar_retencao(conn, self.db_path, hoje)
+        total = sum(sum(meses.values()) for meses in resumo["movidas"].values())
+        segundos = (datetime.datetime.now() - inicio).total_seconds()
+        print(f"   [RETENÇÃO] {total} linhas arquivadas (corte {resumo['corte']}), "
+              f"{len(resumo['expurgadas'])} tabelas expurgadas em {segundos:.1f}s")
+        return resumo
+
+    def checkpoint_wal(self):
+        """Checkpoint do WAL se ele cresceu (checkpoint_wal.py); chamar no fim de cada ciclo"""
+        try:
+            from checkpoint_wal import checkpoint_manager
+        except ImportError:
+            from .checkpoint_wal import checkpoint_manager
+        return checkpoint_manager(self.db_path).verificar()
@@ -0,0 +1,311 @@
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import sqlite3
+import threading
+import socketserver
+from concurrent.futures import Future
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from database_manager import DB_PATH, get_connection, aplicar_migracoes, executar_passos
+    from checkpoint_wal import checkpoint_manager
+except ImportError:
+    from .database_manager import DB_PATH, get_connection, aplicar_migracoes, executar_passos
+    from .checkpoint_wal import checkpoint_manager
+
+# Intervalo máximo que um pedido espera para ser agrupado com outros no mesmo COMMIT
+FLUSH_INTERVAL = float(os.getenv("DB_WRITER_FLUSH_INTERVAL", "0.05"))
+MAX_PEDIDOS_POR_COMMIT = int(os.getenv("DB_WRITER_MAX_LOTE", "500"))
+SOCKET_PADRAO = os.getenv("DB_WRITER_SOCKET", "")
+# Quanto um worker espera pelo COMMIT do seu pedido antes de desistir (TimeoutError)
+TIMEOUT_PEDIDO = float(os.getenv("DB_WRITER_TIMEOUT", "30"))
+
+class _Pedido:
+    __slots__ = ("fonte", "passos", "future", "enfileirado_em")
+
+    def __init__(self, fonte, passos):
+        self.fonte = fonte
+        self.passos = passos
+        self.future = Future()
+        self.enfileirado_em = time.monotonic()
+
+class DatabaseWriter:
+    """
+    Escritor único do dados_clinica.db.
+    Os workers enviam pedidos de escrita (lista de passos SQL) para uma fila local;
+    uma única thread junta tudo o que chegou dentro de FLUSH_INTERVAL e grava num só
+    BEGIN IMMEDIATE ... COMMIT (group commit). Cada pedido roda dentro de um SAVEPOINT,
+    então o erro de um worker não derruba a gravação dos outros.
+
+    Passo = (sql, params, many). O resultado de cada pedido é a lista [(linhas, rowcount), ...].
+    """
+
+    def __init__(self, db_path=DB_PATH, flush_interval=FLUSH_INTERVAL, max_lote=MAX_PEDIDOS_POR_COMMIT):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_lote = max_lote
+        self._fila = queue.Queue()
+        self._parar = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._fontes = {}
+        self._commits = {"total": 0, "pedidos": 0, "erros": 0, "ultimo_ms": 0.0, "max_ms": 0.0, "soma_ms": 0.0}
+        self.checkpoint = checkpoint_manager(db_path)
+
+    # --- CICLO DE VIDA ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """Para a thread depois de gravar o que já estava na fila"""
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    # --- API DOS WORKERS ---
+    def submit(self, fonte, passos):
+        """Enfileira um pedido e devolve um Future com o resultado após o COMMIT"""
+        pedido = _Pedido(fonte, passos)
+        with self._lock:
+            m = self._metricas_fonte(fonte)
+            m["pendentes"] += 1
+            m["max_pendentes"] = max(m["max_pendentes"], m["pendentes"])
+        self._fila.put(pedido)
+        return pedido.future
+
+    def executar(self, fonte, passos, timeout=TIMEOUT_PEDIDO):
+        """Versão bloqueante de submit (mesma assinatura do cliente via socket)"""
+        return self.submit(fonte, passos).result(timeout)
+
+    def metricas(self):
+        """Profundidade da fila por origem, latência dos commits (em ms) e estado do WAL"""
+        with self._lock:
+            commits = dict(self._commits)
+            total = commits.pop("soma_ms")
+            commits["medio_ms"] = round(total / commits["total"], 3) if commits["total"] else 0.0
+            fontes = {}
+            for fonte, m in self._fontes.items():
+                fontes[fonte] = dict(m)
+                soma = fontes[fonte].pop("soma_espera_ms")
+                fontes[fonte]["espera_media_ms"] = round(soma / m["gravados"], 3) if m["gravados"] else 0.0
+        return {"fila_total": self._fila.qsize(), "commits": commits, "fontes": fontes, "wal": self.checkpoint.metricas()}
+
+    # --- LOOP INTERNO ---
+    def _metricas_fonte(self, fonte):
+        m = self._fontes.get(fonte)
+        if m is None:
+            m = {"pendentes": 0, "max_pendentes": 0, "gravados": 0, "erros": 0, "soma_espera_ms": 0.0}
+            self._fontes[fonte] = m
+        return m
+
+    def _loop(self):
+        conn = get_connection(self.db_path)
+        aplicar_migracoes(conn, self.db_path)
+        while not (self._parar.is_set() and self._fila.empty()):
+            try:
+                primeiro = self._fila.get(timeout=0.5)
+            except queue.Empty:
+                # Nenhuma escrita há meio segundo: bom momento para o checkpoint
+                try:
+                    self.checkpoint.verificar()
+                except Exception as e:
+                    print(f"   [WRITER] Erro no checkpoint: {e}")
+                continue
+
+            lote = [primeiro]
+            limite = time.monotonic() + self.flush_interval
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._fila.get(timeout=restante))
+                except queue.Empty:
+                    break
+
+            try:
+                self._gravar(conn, lote)
+            except Exception as e:
+                # Erro fora do previsto no _gravar: a thread continua e ninguém do lote fica sem resposta
+                print(f"   [WRITER] Erro no lote de {len(lote)} pedidos: {e}")
+                self._desfazer(conn)
+                for pedido in lote:
+                    if not pedido.future.done():
+                        pedido.future.set_exception(e)
+
+    @staticmethod
+    def _desfazer(conn):
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _gravar(self, conn, lote):
+        inicio = time.monotonic()
+        resultados = []
+        try:
+            if conn.in_transaction:
+                conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+            for pedido in lote:
+                conn.execute("SAVEPOINT pedido")
+                try:
+                    resultados.append((pedido, executar_passos(conn, pedido.passos), None))
+                    conn.execute("RELEASE pedido")
+                except Exception as e:
+                    # Qualquer erro do pedido (SQL, parâmetro inválido como um int maior que 64 bits...)
+                    # fica só com ele
+                    conn.execute("ROLLBACK TO pedido")
+                    conn.execute("RELEASE pedido")
+                    resultados.append((pedido, None, e))
+            conn.commit()
+        except Exception as e:
+            # Falha no BEGIN/COMMIT: nada foi gravado, todos os pedidos do lote recebem o erro
+            self._desfazer(conn)
+            resultados = [(pedido, None, e) for pedido in lote]
+
+        fim = time.monotonic()
+        duracao_ms = (fim - inicio) * 1000
+        with self._lock:
+            c = self._commits
+            c["total"] += 1
+            c["pedidos"] += len(lote)
+            c["ultimo_ms"] = round(duracao_ms, 3)
+            c["max_ms"] = max(c["max_ms"], c["ultimo_ms"])
+            c["soma_ms"] += duracao_ms
+            for pedido, _, erro in resultados:
+                m = self._metricas_fonte(pedido.fonte)
+                m["pendentes"] -= 1
+                if erro:
+                    m["erros"] += 1
+                    c["erros"] += 1
+                else:
+                    m["gravados"] += 1
+                    m["soma_espera_ms"] += (fim - pedido.enfileirado_em) * 1000
+
+        for pedido, resultado, erro in resultados:
+            if erro:
+                pedido.future.set_exception(erro)
+            else:
+                pedido.future.set_result(resultado)
+
+# --- ACESSO ENTRE PROCESSOS (UNIX SOCKET) ---
+# Protocolo: uma linha JSON por pedido.
+#   {"fonte": "...", "passos": [[sql, params, many], ...]} -> {"ok": true, "resultado": [...]}
+#   {"metricas": true}                                       -> {"ok": true, "metricas": {...}}
+
+class _HandlerWriter(socketserver.StreamRequestHandler):
+    def handle(self):
+        for linha in self.rfile:
+            try:
+                msg = json.loads(linha)
+                if msg.get("metricas"):
+                    resposta = {"ok": True, "metricas": self.server.writer.metricas()}
+                else:
+                    resultado = self.server.writer.executar(msg["fonte"], msg["passos"])
+                    resposta = {"ok": True, "resultado": resultado}
+            except Exception as e:
+                resposta = {"ok": False, "erro": str(e)}
+            self.wfile.write((json.dumps(resposta, default=str) + "\n").encode())
+            self.wfile.flush()
+
+class _ServidorWriter(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def servir_socket(writer, caminho=SOCKET_PADRAO):
+    """Expõe o writer para outros processos via unix socket (bloqueia)"""
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    with _ServidorWriter(caminho, _HandlerWriter) as servidor:
+        servidor.writer = writer
+        print(f"   [WRITER] Aceitando escritas em {caminho}")
+        servidor.serve_forever()
+
+class ClienteWriter:
+    """Cliente do writer em outro processo; mesma interface executar/metricas do DatabaseWriter"""
+
+    def __init__(self, caminho=SOCKET_PADRAO, timeout=30):
+        self.caminho = caminho
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _arquivo(self):
+        arq = getattr(self._local, "arquivo", None)
+        if arq is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.caminho)
+            arq = sock.makefile("rwb")
+            self._local.arquivo = arq
+        return arq
+
+    def _enviar(self, msg):
+        arq = self._arquivo()
+        try:
+            arq.write((json.dumps(msg) + "\n").encode())
+            arq.flush()
+            resposta = json.loads(arq.readline())
+        except (OSError, ValueError):
+            # Conexão caiu (writer reiniciou): descarta para reconectar na próxima chamada
+            self._local.arquivo = None
+            raise
+        if not resposta.get("ok"):
+            raise sqlite3.OperationalError(resposta.get("erro"))
+        return resposta
+
+    def executar(self, fonte, passos, timeout=TIMEOUT_PEDIDO):
+        return self._enviar({"fonte": fonte, "passos": passos})["resultado"]
+
+    def metricas(self):
+        return self._enviar({"metricas": True})["metricas"]
+
+# Writer do próprio processo (supervisor monitor_service.py): todo DatabaseManager criado depois usa ele
+_writer_local = None
+
+def usar_writer_local(writer):
+    global _writer_local
+    _writer_local = writer
+
+def writer_padrao():
+    """
+    Writer do processo (usar_writer_local), senão o cliente do writer compartilhado se
+    DB_WRITER_SOCKET estiver configurado; senão None (escrita direta)
+    """
+    if _writer_local is not None:
+        return _writer_local
+    if SOCKET_PADRAO and os.path.exists(SOCKET_PADRAO):
+        return ClienteWriter(SOCKET_PADRAO)
+    return None
+
+def run_db_writer():
+    print("=== DB WRITER (GROUP COMMIT) INICIADO ===")
+    if not SOCKET_PADRAO:
+        print("   [ERRO] Defina DB_WRITER_SOCKET com o caminho do unix socket.")
+        return
+    writer = DatabaseWriter().start()
+
+    def relatorio():
+        while True:
+            time.sleep(60)
+            print(f"   [WRITER] {json.dumps(writer.metricas())}")
+
+    threading.Thread(target=relatorio, daemon=True).start()
+    try:
+        servir_socket(writer, SOCKET_PADRAO)
+    except KeyboardInterrupt:
+        print("\nWriter encerrado.")
+    finally:
+        writer.stop()
+
+if __name__ == "__main__":
+    run_db_writer()
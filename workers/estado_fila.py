@@ -0,0 +1,65 @@
+import os
+import time
+from datetime import date
+from collections import namedtuple
+
+# Fila atual de cada unidade mantida em memória pelo monitor.
+# Em vez de regravar todo mundo a cada ciclo, o monitor compara o payload novo com este
+# estado e só grava quem chegou, quem mudou de status e quem saiu: as escritas passam a
+# acompanhar o movimento da fila, não o tamanho dela.
+
+# De tempos em tempos o estado é recarregado do banco (outro processo pode ter gravado)
+ESTADO_RESYNC_S = float(os.getenv("ESTADO_FILA_RESYNC_S", "600"))
+
+DiffFila = namedtuple("DiffFila", ["chegaram", "alterados", "sairam"])
+
+class QueueState:
+    """
+    {unidade: {chave: assinatura}} da fila ativa de hoje.
+    `carregar(unidades)` lê do banco as linhas ativas no mesmo formato; é usado no
+    aquecimento, na virada do dia e a cada ESTADO_RESYNC_S segundos.
+    A assinatura é o que o upsert atualiza (ex: status); se não mudou, a linha não é regravada.
+    """
+
+    def __init__(self, carregar, resync_s=ESTADO_RESYNC_S):
+        self._carregar = carregar
+        self.resync_s = resync_s
+        self._filas = {}
+        self._dia = None
+        self._aquecido_em = 0.0
+        self.linhas_vistas = 0
+        self.linhas_gravadas = 0
+
+    def aquecer(self, unidades):
+        unidades = set(unidades) | set(self._filas)
+        filas = {unidade: {} for unidade in unidades}
+        filas.update(self._carregar(sorted(unidades, key=str)))
+        self._filas = filas
+        self._dia = date.today()
+        self._aquecido_em = time.monotonic()
+
+    def _garantir(self, unidade):
+        vencido = time.monotonic() - self._aquecido_em >= self.resync_s
+        if vencido or self._dia != date.today() or unidade not in self._filas:
+            self.aquecer([unidade])
+
+    def diff(self, unidade, atuais):
+        """Compara {chave: assinatura} do ciclo com o estado conhecido da unidade"""
+        self._garantir(unidade)
+        conhecidos = self._filas[unidade]
+
+        chegaram = [chave for chave in atuais if chave not in conhecidos]
+        alterados = [chave for chave, assinatura in atuais.items()
+                     if chave in conhecidos and conhecidos[chave] != assinatura]
+        sairam = [chave for chave in conhecidos if chave not in atuais]
+
+        self.linhas_vistas += len(atuais)
+        self.linhas_gravadas += len(chegaram) + len(alterados) + len(sairam)
+        return DiffFila(chegaram, alterados, sairam)
+
+    def confirmar(self, unidade, atuais):
+        """Chamado depois que o diff foi gravado com sucesso"""
+        self._filas[unidade] = dict(atuais)
+
+    def resumo(self):
+        return f"linhas gravadas {self.linhas_gravadas}/{self.linhas_vistas}"
@@ -1,9 +1,17 @@
-import requests
 import pandas as pd
 import os
-import json
+import sys
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from resiliencia import requisitar
+    from limitador import LOTE
+except ImportError:
+    from .resiliencia import requisitar
+    from .limitador import LOTE
+
 # --- CARREGA AMBIENTE ---
 env_path = os.path.join(os.path.dirname(__file__), '../.env')
 load_dotenv(env_path)
@@ -25,7 +33,8 @@ def request_endpoint(endpoint, method="GET", json_body=None):
     url = f"{BASE_URL}/{endpoint}"
     headers = get_headers()
     try:
-        response = requests.request(method=method, url=url, headers=headers, json=json_body, timeout=20)
+        # Sincronização em massa: cede a vez aos monitores no limite de taxa do host
+        response = requisitar(method, url, headers=headers, json=json_body, timeout=20, prioridade=LOTE)
         response.raise_for_status()
         return response.json()
     except Exception as e:
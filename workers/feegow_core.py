@@ -1,20 +1,74 @@
-import requests
-import pandas as pd
 import os
 import time
 import html
 import re
+import sys
 import sqlite3
-from io import StringIO
+import threading
 from datetime import datetime
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from resiliencia import requisitar
+    from limitador import TEMPO_REAL
+    from cliente_http import nova_sessao
+    from parser_fila import ler_fila, ler_tabela, entradas_fila, status_tempo, COLUNAS_FILA
+except ImportError:
+    from .resiliencia import requisitar
+    from .limitador import TEMPO_REAL
+    from .cliente_http import nova_sessao
+    from .parser_fila import ler_fila, ler_tabela, entradas_fila, status_tempo, COLUNAS_FILA
+
 load_dotenv()
 
+# O pandas só é importado nos métodos que devolvem DataFrame (parse_html e recepção do Core):
+# o monitor médico usa o parse_fila e roda sem carregar pandas/numpy no processo
+
 # Caminho absoluto para o banco de dados
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/dados_clinica.db')
 
+# Recepção do Core: o token CSRF vale a sessão inteira do Laravel, então fica guardado por cookie
+# e só é buscado de novo quando vence ou quando o POST da tabela é recusado (419 = token inválido)
+URL_CORE = "https://core.feegow.com"
+CORE_TOKEN_TTL_S = float(os.getenv("CORE_TOKEN_TTL_S", "1800"))
+CORE_TOKEN_RECUSADO = (419, 403)
+PADROES_TOKEN_CORE = [
+    re.compile(r'name="_token" value="([^"]+)"'),
+    re.compile(r'name="csrf-token" content="([^"]+)"'),
+    re.compile(r'window\.csrfToken\s*=\s*["\']([^"\']+)["\']'),
+]
+
+_tokens_core = {}       # cookie -> (token, expira_em)
+_tokens_core_lock = threading.Lock()
+
+def _extrair_token_core(html_content):
+    for padrao in PADROES_TOKEN_CORE:
+        match = padrao.search(html_content)
+        if match:
+            return match.group(1)
+    return None
+
+def token_core_em_cache(cookie):
+    with _tokens_core_lock:
+        item = _tokens_core.get(cookie)
+    if item is not None and item[1] > time.time():
+        return item[0]
+    return None
+
+def guardar_token_core(cookie, token):
+    agora = time.time()
+    with _tokens_core_lock:
+        # Cookie trocado no Painel Admin: tokens dos cookies antigos vencem e saem daqui
+        for antigo in [c for c, (_, expira_em) in _tokens_core.items() if expira_em <= agora]:
+            del _tokens_core[antigo]
+        _tokens_core[cookie] = (token, agora + CORE_TOKEN_TTL_S)
+
+def descartar_token_core(cookie):
+    with _tokens_core_lock:
+        _tokens_core.pop(cookie, None)
+
 def get_feegow_config_from_db():
     """Busca credenciais no banco de dados SQLite"""
     try:
@@ -34,7 +88,8 @@ def get_feegow_config_from_db():
 
 class FeegowSystem:
     def __init__(self):
-        self.session = requests.Session()
+        # Sessão própria (cookies do login da unidade) sobre o pool de conexões compartilhado
+        self.session = nova_sessao()
         # Headers que fingem ser um navegador Chrome
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0 Safari/537.36",
@@ -63,7 +118,7 @@ class FeegowSystem:
         
         try:
             print(f"[{datetime.now().strftime('%H:%M:%S')}] Tentando login...")
-            resp = self.session.post(url, data=payload, timeout=20)
+            resp = requisitar("POST", url, cliente=self.session, data=payload, timeout=20, prioridade=TEMPO_REAL)
             
             # Verifica sucesso via Cookies
             cookies = self.session.cookies.get_dict()
@@ -81,13 +136,17 @@ class FeegowSystem:
         """Troca o contexto da sessão para a unidade desejada"""
         url = f"{self.base_url}/v8.1/?P=MudaLocal&Pers=1&MudaLocal={unidade_id}"
         try:
-            self.session.get(url, timeout=10)
+            requisitar("GET", url, cliente=self.session, timeout=10, prioridade=TEMPO_REAL)
             return True
         except:
             return False
 
-    def obter_fila_raw(self):
-        """Baixa o HTML da fila da unidade atual"""
+    def obter_fila_raw(self, prazo=None):
+        """
+        Baixa o HTML da fila da unidade atual. None = sessão caiu (voltou para o login).
+        Falha de rede, circuito aberto ou prazo do ciclo esgotado levantam requests.RequestException:
+        não é motivo para descartar a sessão.
+        """
         url = f"{self.base_url}/v8.1/ListaEsperaCont.asp"
         params = {
             "TipoAtendimentoTriagem": "ATENDIMENTO",
@@ -95,14 +154,12 @@ class FeegowSystem:
             "Ordem": "HoraSta",
             "StatusExibir": "4"
         }
-        try:
-            resp = self.session.get(url, params=params, timeout=10)
-            # Se redirecionar para Login, a sessão caiu
-            if "login" in resp.url.lower():
-                return None 
-            return resp.content.decode('iso-8859-1')
-        except:
-            return None
+        resp = requisitar("GET", url, cliente=self.session, params=params, timeout=10, prazo=prazo,
+                          prioridade=TEMPO_REAL)
+        # Se redirecionar para Login, a sessão caiu
+        if "login" in resp.url.lower():
+            return None 
+        return resp.content.decode('iso-8859-1')
         
     def _login_app_specific(self):
         """
@@ -126,7 +183,7 @@ class FeegowSystem:
                 "Origin": "https://app.feegow.com",
                 "Referer": "https://app.feegow.com/main/?P=Login"
             }
-            resp = self.session.post(url, data=payload, headers=headers_login, timeout=20)
+            resp = requisitar("POST", url, cliente=self.session, data=payload, headers=headers_login, timeout=20)
             
             # --- PONTE DE COOKIES (A MÁGICA) ---
             # O login pode ter setado cookies para 'app.feegow.com' ou '.feegow.com'.
@@ -149,32 +206,17 @@ class FeegowSystem:
             return False
 
     def parse_html(self, html_content, nome_unidade):
+        import pandas as pd
         if not html_content or "<table" not in html_content:
             return pd.DataFrame()
 
         try:
             html_content = html.unescape(html_content)
-            dfs = pd.read_html(StringIO(html_content))
-            # Pega as 7 colunas originais do print
-            df = dfs[0].iloc[:, :7].copy()
-            df.columns = ['HORA', 'CHEGADA', 'PACIENTE', 'IDADE', 'PROFISSIONAL', 'COMPROMISSO', 'TEMPO_TEXTO']
-
-            # Função para extrair dados da coluna de texto
-            def processar_status_tempo(texto):
-                texto = str(texto).strip()
-                
-                # Caso 1: "Em atendimento"
-                if "atendimento" in texto.lower():
-                    return "Em Atendimento", 0 # Status, Minutos
-                
-                # Caso 2: "Aguardando há 316 minutos"
-                # Extrai apenas os números usando Regex
-                match = re.search(r'(\d+)', texto)
-                minutos = int(match.group(1)) if match else 0
-                return "Espera", minutos
-
-            # Aplica a lógica
-            dados_processados = df['TEMPO_TEXTO'].apply(processar_status_tempo)
+            # Pega as 7 colunas originais do print (parser lxml compartilhado, parser_fila.py)
+            df = pd.DataFrame(ler_fila(html_content), columns=COLUNAS_FILA)
+
+            # Status e minutos de "Aguardando há 316 minutos" / "Em atendimento" (parser_fila.status_tempo)
+            dados_processados = df['TEMPO_TEXTO'].apply(status_tempo)
             
             # Cria as novas colunas limpas
             df['STATUS_DETECTADO'] = [x[0] for x in dados_processados]
@@ -182,6 +224,13 @@ class FeegowSystem:
             
             # Limpeza padrão
             df['UNIDADE'] = nome_unidade
+
+            # Flags de prioridade calculadas uma vez aqui (o painel lia por substring a cada poll)
+            pacientes = df['PACIENTE'].astype(str).str.lower()
+            idades = pd.to_numeric(df['IDADE'].astype(str).str.extract(r'^\s*(\d+)')[0], errors='coerce')
+            df['PRIORIDADE_IDOSO'] = (pacientes.str.contains('idoso') | (idades >= 60)).astype(int)
+            df['PRIORIDADE_CADEIRANTE'] = pacientes.str.contains('cadeirante').astype(int)
+            df['PRIORIDADE_GESTANTE'] = pacientes.str.contains('gestante').astype(int)
             
             # Removemos a coluna suja original para não atrapalhar
             # df = df.drop(columns=['TEMPO_TEXTO']) 
@@ -190,15 +239,26 @@ class FeegowSystem:
         except Exception as e:
             print(f"Erro parse: {e}")
             return pd.DataFrame()
-        
+
+    def parse_fila(self, html_content, nome_unidade):
+        """Mesma fila do parse_html como lista de QueueEntry (caminho do monitor, sem DataFrame)"""
+        if not html_content or "<table" not in html_content:
+            return []
+
+        try:
+            return entradas_fila(html.unescape(html_content), nome_unidade)
+        except Exception as e:
+            print(f"Erro parse: {e}")
+            return []
+
     def obter_dados_recepcao_core(self, unidade_id):
         """
         Busca dados da fila de recepção no sistema CORE.
         Estratégia: Réplica exata do 'teste_separacao.py' usando cookie completo.
+        Com o token em cache é um POST por unidade; Dashboard/relatório só quando o token vence ou é recusado.
         """
-        base_url_core = "https://core.feegow.com"
-        url_dashboard = f"{base_url_core}/"       
-        url_api_post = f"{base_url_core}/reports/r/queue/table" 
+        import pandas as pd
+        url_api_post = f"{URL_CORE}/reports/r/queue/table"
         hoje = datetime.now().strftime('%d/%m/%Y')
 
         # 1. Carregar o Cookie Completo do Banco (Prioridade) ou .ENV
@@ -210,8 +270,8 @@ class FeegowSystem:
             return pd.DataFrame()
 
         # 2. Configurar Headers IDÊNTICOS ao script que funcionou
-        # Nota: Não usamos self.session.cookies.set aqui para garantir 
-        # que a string seja enviada exatamente como no navegador.
+        # Nota: o cookie vai como string no header (e não no cookie jar da sessão)
+        # para garantir que seja enviado exatamente como no navegador.
         headers_custom = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Content-Type": "application/x-www-form-urlencoded",
@@ -219,44 +279,12 @@ class FeegowSystem:
         }
 
         try:
-            # 3. Acessa Dashboard para pegar o Token (Automação necessária)
-            # Usamos requests puro (sem session) para ter controle total dos headers
-            # print(f"   [CORE] Usando cookie completo para capturar token...")
-            resp_dash = requests.get(url_dashboard, headers=headers_custom, timeout=15)
-            
-            if "login" in resp_dash.url:
-                print(f"   [ERRO] Cookie expirado (Redirecionou para Login). Atualize no Painel Admin.")
-                return pd.DataFrame()
-
-            # Extração do Token via Regex
-            html_content = resp_dash.text
-            token = None
-            import re
-            
-            # Padrões de busca
-            patterns = [
-                r'name="_token" value="([^"]+)"',
-                r'name="csrf-token" content="([^"]+)"',
-                r'window\.csrfToken\s*=\s*["\']([^"\']+)["\']'
-            ]
-            for pattern in patterns:
-                match = re.search(pattern, html_content)
-                if match:
-                    token = match.group(1)
-                    break
-
-            if not token:
-                print("   [ERRO] Token CSRF não encontrado na Dashboard.")
-                # Fallback: Tenta achar o token dentro da própria página do relatório
-                # (às vezes o token da dashboard é diferente do token de formulários)
-                url_relatorio = f"{base_url_core}/reports/r/queue"
-                resp_rel = requests.get(url_relatorio, headers=headers_custom, timeout=15)
-                match = re.search(r'name="_token" value="([^"]+)"', resp_rel.text)
-                if match:
-                    token = match.group(1)
-            
+            # 3. Token CSRF: cache por cookie, senão Dashboard (e a página do relatório como fallback)
+            token = token_core_em_cache(cookie_full)
+            novo = token is None
+            if novo:
+                token = self._buscar_token_core(headers_custom)
             if not token:
-                print("   [ERRO FATAL] Impossível obter token mesmo com cookie válido.")
                 return pd.DataFrame()
 
             # 4. Requisição dos Dados (Payload igual ao teste)
@@ -266,14 +294,32 @@ class FeegowSystem:
                 "DATA_INICIO": hoje,
                 "DATA_FIM": hoje
             }
-            
-            # print(f"   [CORE] Consultando Unidade {unidade_id}...")
-            resp_table = requests.post(url_api_post, headers=headers_custom, data=payload, timeout=15)
+
+            resp_table = requisitar("POST", url_api_post, headers=headers_custom, data=payload, timeout=15)
+
+            # Token do cache recusado (sessão do Laravel renovada): busca outro e tenta uma vez mais
+            if not novo and resp_table.status_code in CORE_TOKEN_RECUSADO:
+                descartar_token_core(cookie_full)
+                novo = True
+                token = self._buscar_token_core(headers_custom)
+                if not token:
+                    return pd.DataFrame()
+                payload["_token"] = token
+                resp_table = requisitar("POST", url_api_post, headers=headers_custom, data=payload, timeout=15)
+
+            if "login" in resp_table.url:
+                descartar_token_core(cookie_full)
+                print(f"   [ERRO] Cookie expirado (Redirecionou para Login). Atualize no Painel Admin.")
+                return pd.DataFrame()
 
             if resp_table.status_code == 200:
+                if novo:
+                    guardar_token_core(cookie_full, token)
                 # Usa o seu parser existente
                 return self._parse_tabela_core(resp_table.text, unidade_id)
             else:
+                if resp_table.status_code in CORE_TOKEN_RECUSADO:
+                    descartar_token_core(cookie_full)
                 print(f"   [ERRO] Status {resp_table.status_code} na unidade {unidade_id}")
                 return pd.DataFrame()
 
@@ -281,17 +327,38 @@ class FeegowSystem:
             print(f"   Erro recepção Core: {e}")
             return pd.DataFrame()
 
+    def _buscar_token_core(self, headers_custom):
+        """Token CSRF novo do Core (Dashboard, senão a página do relatório); None se não achar"""
+        resp_dash = requisitar("GET", f"{URL_CORE}/", headers=headers_custom, timeout=15)
+
+        if "login" in resp_dash.url:
+            print(f"   [ERRO] Cookie expirado (Redirecionou para Login). Atualize no Painel Admin.")
+            return None
+
+        token = _extrair_token_core(resp_dash.text)
+        if not token:
+            print("   [ERRO] Token CSRF não encontrado na Dashboard.")
+            # Fallback: Tenta achar o token dentro da própria página do relatório
+            # (às vezes o token da dashboard é diferente do token de formulários)
+            resp_rel = requisitar("GET", f"{URL_CORE}/reports/r/queue", headers=headers_custom, timeout=15)
+            match = PADROES_TOKEN_CORE[0].search(resp_rel.text)
+            if match:
+                token = match.group(1)
+
+        if not token:
+            print("   [ERRO FATAL] Impossível obter token mesmo com cookie válido.")
+        return token
+
     def _parse_tabela_core(self, html_content, unidade_id):
-        if not html_content: return pd.DataFrame()
-        soup = BeautifulSoup(html_content, 'html.parser')
-        table = soup.find('table')
-        if not table: return pd.DataFrame()
+        import pandas as pd
+        if not html_content or "<table" not in html_content: return pd.DataFrame()
 
         try:
-            df = pd.read_html(str(table))[0]
+            tabela = ler_tabela(html_content)
+            df = pd.DataFrame(tabela.linhas, columns=tabela.colunas)
             df['UNIDADE_ID'] = unidade_id
             df['TIPO_FILA'] = 'RECEPCAO'
             df['DATA_COLETA'] = datetime.now()
             return df
         except Exception:
-            return pd.DataFrame()
\ No newline at end of file
+            return pd.DataFrame()
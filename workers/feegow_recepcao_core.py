@@ -1,71 +1,148 @@
-import requests
+import asyncio
 import os
-import json
-import sqlite3
-import pandas as pd
+import sys
+import threading
+import requests
 from dotenv import load_dotenv
 
-load_dotenv()
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Caminho absoluto para o banco
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/dados_clinica.db')
+try:
+    from auth_broker import auth_broker
+    from resiliencia import requisitar, PrazoEsgotado
+    from limitador import TEMPO_REAL
+    from cliente_http import cliente_http
+except ImportError:
+    from .auth_broker import auth_broker
+    from .resiliencia import requisitar, PrazoEsgotado
+    from .limitador import TEMPO_REAL
+    from .cliente_http import cliente_http
 
-def get_feegow_token_db():
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        res = conn.execute("SELECT token FROM integrations_config WHERE service = 'feegow'").fetchone()
-        conn.close()
-        if res and res[0]:
-            return res[0]
-    except: pass
-    return None
+load_dotenv()
+
+ENDPOINT_FILA = "https://core.feegow.com/totem-queue/admin/get-queue-by-filter"
+UNIDADES_PADRAO = (2, 3, 12)
+# Todas as unidades são consultadas ao mesmo tempo, até este limite de requisições simultâneas
+MAX_CONCORRENCIA = int(os.getenv("RECEPCAO_MAX_CONCORRENCIA", "4"))
+TIMEOUT_UNIDADE = float(os.getenv("RECEPCAO_TIMEOUT_UNIDADE", "10"))
 
 class FeegowRecepcaoSystem:
-    def __init__(self):
-        pass
-
-    def obter_dados_brutos(self, unidades=[2, 3, 12]):
-        # 1. Busca Cookie no Banco (Prioridade)
-        cookie_full = get_feegow_token_db()
-        
-        # 2. Fallback para .env se não achar no banco
-        if not cookie_full:
-            cookie_full = os.getenv("FEEGOW_CORE_COOKIE_FULL")
+    def __init__(self, broker=None):
+        # Cookie do Core vem do broker (cache em memória, troca automática quando expira)
+        self.broker = broker or auth_broker()
+        self.cookie_atual = None
+        # Sessão sem estado do processo (cliente_http.py): conexões HTTPS abertas entre unidades e ciclos.
+        # O cookie vai no header; a sessão não guarda Set-Cookie, senão ele sobrescreveria o header.
+        self.session = cliente_http()
+
+    def _headers(self):
+        # auth_sessoes > Painel Admin > .env (o broker só vai ao banco quando o cookie muda)
+        cookie_full = self.broker.cookie_core()
+        self.cookie_atual = cookie_full
 
         if not cookie_full:
-            return [], "ERRO: Cookie não configurado no Painel Admin ou .env"
+            return None
 
-        headers = {
+        return {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0 Safari/537.36",
             "Cookie": cookie_full,
             "X-Requested-With": "XMLHttpRequest",
             "Referer": "https://core.feegow.com/totem-queue/admin/queue"
         }
-        
-        endpoint = "https://core.feegow.com/totem-queue/admin/get-queue-by-filter"
+
+    def _buscar_unidade(self, uid, headers, timeout=TIMEOUT_UNIDADE, prazo=None):
+        """
+        Fila de uma unidade -> (dados, log ou None).
+        O timeout vai na própria chamada HTTP (cortado pelo prazo do ciclo no requisitar),
+        então a thread termina sozinha quando ele estoura.
+        """
+        try:
+            url = f"{ENDPOINT_FILA}?filter=&unit_id={uid}"
+            resp = requisitar("GET", url, cliente=self.session, headers=headers, timeout=timeout, prazo=prazo,
+                              prioridade=TEMPO_REAL)
+
+            if resp.status_code == 200:
+                data = resp.json()
+                if isinstance(data, dict): data = [data]
+                if isinstance(data, list):
+                    for item in data:
+                        if 'UnidadeID' not in item or not item['UnidadeID']:
+                            item['UnidadeID'] = uid
+                    return data, None
+            
+            elif resp.status_code == 403:
+                return [], f"UID {uid}: 403 (Cookie Expirou - Atualize no Painel)"
+
+            else:
+                # Resposta de erro não é fila vazia: a unidade fica de fora das baixas
+                return [], f"UID {uid}: status {resp.status_code}"
+
+        except PrazoEsgotado:
+            return [], f"UID {uid}: prazo do ciclo esgotado"
+        except requests.Timeout:
+            return [], f"UID {uid}: timeout ({timeout:g}s)"
+        except Exception as e:
+            return [], f"UID {uid}: {str(e)}"
+        return [], None
+
+    async def obter_dados_brutos_async(self, unidades=UNIDADES_PADRAO, max_concorrencia=MAX_CONCORRENCIA,
+                                       timeouts=None, prazo=None):
+        """
+        Consulta todas as unidades ao mesmo tempo (até max_concorrencia) e devolve (dados, msg).
+        timeouts: {unidade_id: segundos} para unidades que precisam de prazo diferente do padrão.
+        prazo: orçamento do ciclo (resiliencia.Prazo); o timeout de cada chamada é cortado pelo que sobra dele.
+        """
+        headers = self._headers()
+        if not headers:
+            return [], "ERRO: Cookie não configurado no Painel Admin ou .env"
+
+        timeouts = timeouts or {}
+        semaforo = asyncio.Semaphore(max_concorrencia)
+
+        async def consultar(uid):
+            timeout = timeouts.get(uid, TIMEOUT_UNIDADE)
+            async with semaforo:
+                # O requests é bloqueante: cada unidade roda numa thread do executor padrão.
+                # Cancelar a tarefa não pararia a thread; quem encerra a chamada é o timeout do requests.
+                return await asyncio.to_thread(self._buscar_unidade, uid, headers, timeout, prazo)
+
+        resultados = await asyncio.gather(*(consultar(uid) for uid in unidades))
+
+        # Mantém a ordem das unidades pedidas, como na versão sequencial
         todos_dados = []
         logs = []
+        for dados, log in resultados:
+            todos_dados.extend(dados)
+            if log:
+                logs.append(log)
 
-        for uid in unidades:
+        msg = "OK" if not logs else " | ".join(logs)
+        return todos_dados, msg
+
+    def renovar_cookie(self):
+        """O Core rejeitou o cookie atual: pede outro ao broker. Devolve True se já há um novo para o próximo ciclo"""
+        return self.broker.invalidar_core(self.cookie_atual) is not None
+
+    def obter_dados_brutos(self, unidades=UNIDADES_PADRAO, prazo=None):
+        """Versão síncrona (usada pelo monitor_recepcao): mesmo contrato (dados, msg)"""
+        coro = self.obter_dados_brutos_async(unidades, prazo=prazo)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        # Chamada de dentro de um loop (ex: direto no loop do supervisor): asyncio.run não pode
+        # rodar aqui, então o ciclo ganha um loop próprio numa thread separada
+        resultado = {}
+
+        def rodar():
             try:
-                url = f"{endpoint}?filter=&unit_id={uid}"
-                resp = requests.get(url, headers=headers, timeout=10)
-
-                if resp.status_code == 200:
-                    data = resp.json()
-                    if isinstance(data, dict): data = [data]
-                    if isinstance(data, list):
-                        for item in data:
-                            if 'UnidadeID' not in item or not item['UnidadeID']:
-                                item['UnidadeID'] = uid
-                        todos_dados.extend(data)
-                
-                elif resp.status_code == 403:
-                    logs.append(f"UID {uid}: 403 (Cookie Expirou - Atualize no Painel)")
-                    
-            except Exception as e:
-                logs.append(f"UID {uid}: {str(e)}")
-                continue
+                resultado["ok"] = asyncio.run(coro)
+            except BaseException as e:
+                resultado["erro"] = e
 
-        msg = "OK" if not logs else " | ".join(logs)
-        return todos_dados, msg
\ No newline at end of file
+        thread = threading.Thread(target=rodar, name="recepcao-core", daemon=True)
+        thread.start()
+        thread.join()
+        if "erro" in resultado:
+            raise resultado["erro"]
+        return resultado["ok"]
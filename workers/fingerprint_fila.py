@@ -0,0 +1,69 @@
+import re
+import json
+import hashlib
+import threading
+from datetime import date
+
+# A maioria dos ciclos de 15s devolve exatamente a mesma fila. Guardando a impressão digital
+# (blake2b) do payload bruto de cada unidade, o monitor pula parse e gravação quando nada mudou.
+
+_ENTRE_TAGS = re.compile(r'>\s+<')
+_ESPACOS = re.compile(r'\s+')
+
+def digest_html(html):
+    """Impressão digital do HTML normalizado (sem espaços entre tags, demais espaços colapsados)"""
+    normalizado = _ESPACOS.sub(' ', _ENTRE_TAGS.sub('><', html)).strip()
+    return hashlib.blake2b(normalizado.encode('utf-8'), digest_size=16).hexdigest()
+
+def digest_json(dados):
+    """Impressão digital de um payload JSON (chaves ordenadas, sem espaços)"""
+    corpo = json.dumps(dados, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(corpo.encode('utf-8'), digest_size=16).hexdigest()
+
+class FingerprintCache:
+    """
+    Último payload processado por unidade.
+    O digest só é confirmado depois que a gravação deu certo, então uma falha no banco
+    faz o próximo ciclo processar a unidade de novo. A virada do dia invalida tudo.
+    """
+
+    def __init__(self):
+        self._ultimos = {}
+        self._lock = threading.Lock()
+        self._dia = date.today()
+        self.processados = 0
+        self.pulados = 0
+
+    def mudou(self, unidade, digest):
+        """True se o payload da unidade é diferente do último processado (conta pulados/processados)"""
+        with self._lock:
+            hoje = date.today()
+            if hoje != self._dia:
+                self._dia = hoje
+                self._ultimos.clear()
+
+            anterior = self._ultimos.get(unidade)
+            if anterior is not None and anterior[0] == digest:
+                self.pulados += 1
+                return False
+            self.processados += 1
+            return True
+
+    def confirmar(self, unidade, digest, qtd=0):
+        with self._lock:
+            self._ultimos[unidade] = (digest, qtd)
+
+    def esquecer(self, unidade):
+        with self._lock:
+            self._ultimos.pop(unidade, None)
+
+    def ultima_qtd(self, unidade):
+        """Quantidade de pessoas na fila no último payload processado da unidade"""
+        with self._lock:
+            anterior = self._ultimos.get(unidade)
+        return anterior[1] if anterior else 0
+
+    def resumo(self):
+        total = self.processados + self.pulados
+        taxa = (self.pulados / total * 100) if total else 0.0
+        return f"inalteradas {self.pulados}/{total} ({taxa:.0f}%)"
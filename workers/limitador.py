@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from database_manager import DB_PATH, get_connection
+except ImportError:
+    from .database_manager import DB_PATH, get_connection
+
+# Limite de requisições por host compartilhado entre todos os processos (token bucket no SQLite).
+# Monitores de 15s, o backfill e a varredura de 60 dias do worker_feegow batem no mesmo Feegow;
+# cada requisição pega uma ficha do balde do host, que se reabastece a `taxa` fichas por segundo.
+#
+# Prioridades:
+#   TEMPO_REAL  monitores das filas: podem esvaziar o balde
+#   NORMAL      validações, logins fora do ciclo: deixam metade da reserva
+#   LOTE        sincronizações em massa: deixam a reserva inteira (RATE_RESERVA da capacidade)
+# A reserva só vale enquanto houve tráfego de tempo real nos últimos RATE_JANELA_TEMPO_REAL_S;
+# fora do expediente (monitores parados) o lote usa o balde todo.
+#
+# Fica num banco separado (RATE_LIMIT_DB) para não disputar o lock de escrita das filas.
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", os.path.join(os.path.dirname(DB_PATH), "rate_limit.db"))
+# host: [capacidade do balde, fichas por segundo]. Host fora da lista não é limitado.
+RATE_LIMITS = json.loads(os.getenv("RATE_LIMITS", "") or json.dumps({
+    "api.feegow.com": [10, 5],
+    "franchising.feegow.com": [6, 2],
+    "app.feegow.com": [4, 1],
+    "core.feegow.com": [6, 2],
+    "dashboard.clinia.io": [4, 1],
+}))
+RATE_RESERVA = float(os.getenv("RATE_RESERVA", "0.5"))
+RATE_JANELA_TEMPO_REAL_S = float(os.getenv("RATE_JANELA_TEMPO_REAL_S", "300"))
+RATE_ESPERA_PASSO_S = float(os.getenv("RATE_ESPERA_PASSO_S", "0.25"))
+
+TEMPO_REAL, NORMAL, LOTE = 0, 1, 2
+NOMES_PRIORIDADE = {TEMPO_REAL: "tempo_real", NORMAL: "normal", LOTE: "lote"}
+
+class TokenBucketLimiter:
+    """Baldes por host no SQLite; cada adquirir() é uma transação curta (BEGIN IMMEDIATE)"""
+
+    def __init__(self, db_path=RATE_LIMIT_DB, limites=RATE_LIMITS, reserva=RATE_RESERVA,
+                 janela_tempo_real=RATE_JANELA_TEMPO_REAL_S):
+        self.db_path = db_path
+        self.limites = {host: (float(cap), float(taxa)) for host, (cap, taxa) in limites.items()}
+        self.reserva = reserva
+        self.janela_tempo_real = janela_tempo_real
+        self.desativado = None
+        self._lock = threading.Lock()
+        self._metricas = {}
+        try:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            get_connection(db_path).execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    host TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    atualizado REAL NOT NULL,
+                    tempo_real_em REAL NOT NULL DEFAULT 0
+                )""")
+        except sqlite3.Error as e:
+            # Sem o banco do limitador as requisições seguem sem limite (não derruba os workers)
+            self.desativado = str(e)
+            print(f"   [LIMITE] Limitador desativado: {e}")
+
+    def _piso(self, prioridade, capacidade):
+        if prioridade == TEMPO_REAL:
+            return 0.0
+        if prioridade == NORMAL:
+            return capacidade * self.reserva / 2
+        return capacidade * self.reserva
+
+    def _transacao(self, host, capacidade, taxa, aplicar):
+        """Lê o balde reabastecido, aplica `aplicar(tokens, tempo_real_em, agora)` e grava"""
+        conn = get_connection(self.db_path)
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            agora = time.time()
+            linha = conn.execute("SELECT tokens, atualizado, tempo_real_em FROM buckets WHERE host = ?",
+                                 (host,)).fetchone()
+            if linha is None:
+                tokens, tempo_real_em = capacidade, 0.0
+            else:
+                tokens = min(capacidade, linha[0] + max(0.0, agora - linha[1]) * taxa)
+                tempo_real_em = linha[2]
+            tokens, tempo_real_em, resultado = aplicar(tokens, tempo_real_em, agora)
+            conn.execute("INSERT OR REPLACE INTO buckets (host, tokens, atualizado, tempo_real_em) VALUES (?, ?, ?, ?)",
+                         (host, tokens, agora, tempo_real_em))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return resultado
+
+    def _tentar(self, host, capacidade, taxa, prioridade):
+        """Pega uma ficha se houver acima do piso da prioridade; senão devolve quantas faltam"""
+        def aplicar(tokens, tempo_real_em, agora):
+            if prioridade == TEMPO_REAL:
+                tempo_real_em = agora
+            ativo = agora - tempo_real_em < self.janela_tempo_real
+            piso = self._piso(prioridade, capacidade) if ativo else 0.0
+            falta = piso + 1 - tokens
+            if falta <= 0:
+                return tokens - 1, tempo_real_em, 0.0
+            return tokens, tempo_real_em, falta
+        return self._transacao(host, capacidade, taxa, aplicar)
+
+    def adquirir(self, host, prioridade=NORMAL, espera_max=None):
+        """
+        Bloqueia até conseguir uma ficha do host. Devolve False se precisaria esperar mais que
+        espera_max segundos (ex: o que sobra do prazo do ciclo); host sem limite devolve True na hora.
+        """
+        limite = self.limites.get(host)
+        if limite is None or self.desativado:
+            return True
+        capacidade, taxa = limite
+        fim = None if espera_max is None else time.monotonic() + espera_max
+        inicio = time.monotonic()
+
+        while True:
+            try:
+                falta = self._tentar(host, capacidade, taxa, prioridade)
+            except sqlite3.Error as e:
+                print(f"   [LIMITE] Erro no limitador ({host}): {e}")
+                return True
+            if falta <= 0:
+                self._registrar(host, prioridade, time.monotonic() - inicio)
+                return True
+            espera = falta / taxa
+            if fim is not None and time.monotonic() + espera > fim:
+                self._registrar(host, prioridade, time.monotonic() - inicio, negado=True)
+                return False
+            # Passos curtos: uma prioridade maior pode chegar e mudar o piso no meio da espera
+            time.sleep(min(espera, RATE_ESPERA_PASSO_S))
+
+    def penalizar(self, host, segundos):
+        """O host respondeu 429: esvazia o balde por `segundos` para todos os processos"""
+        limite = self.limites.get(host)
+        if limite is None or self.desativado:
+            return
+        capacidade, taxa = limite
+
+        def aplicar(tokens, tempo_real_em, agora):
+            return min(tokens, -segundos * taxa), tempo_real_em, None
+        try:
+            self._transacao(host, capacidade, taxa, aplicar)
+        except sqlite3.Error as e:
+            print(f"   [LIMITE] Erro no limitador ({host}): {e}")
+        with self._lock:
+            self._metricas_host(host)["penalidades"] += 1
+
+    def _metricas_host(self, host):
+        m = self._metricas.get(host)
+        if m is None:
+            m = self._metricas[host] = {
+                "adquiridas": {nome: 0 for nome in NOMES_PRIORIDADE.values()},
+                "esperas": 0, "espera_total_s": 0.0, "espera_max_s": 0.0, "negadas": 0, "penalidades": 0,
+            }
+        return m
+
+    def _registrar(self, host, prioridade, espera, negado=False):
+        with self._lock:
+            m = self._metricas_host(host)
+            if negado:
+                m["negadas"] += 1
+            else:
+                m["adquiridas"][NOMES_PRIORIDADE[prioridade]] += 1
+            if espera > 0.001:
+                m["esperas"] += 1
+                m["espera_total_s"] = round(m["espera_total_s"] + espera, 3)
+                m["espera_max_s"] = round(max(m["espera_max_s"], espera), 3)
+
+    def metricas(self):
+        with self._lock:
+            return {host: dict(m, adquiridas=dict(m["adquiridas"])) for host, m in self._metricas.items()}
+
+_limitador = None
+_limitador_lock = threading.Lock()
+
+def limitador():
+    """Um limitador por processo (os baldes em si são compartilhados pelo banco)"""
+    global _limitador
+    with _limitador_lock:
+        if _limitador is None:
+            _limitador = TokenBucketLimiter()
+        return _limitador
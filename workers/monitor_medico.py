@@ -1,8 +1,8 @@
 import time
 import sys
 import os
-import hashlib
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturoTimeout
 from dotenv import load_dotenv
 
 # Ajuste para rodar tanto da raiz quanto da pasta workers
@@ -11,10 +11,22 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 # Imports com fallback
 try:
     from feegow_core import FeegowSystem
+    from auth_broker import auth_broker
     from database_manager import DatabaseManager
+    from fingerprint_fila import FingerprintCache, digest_html
+    from estado_fila import QueueState
+    from agendador import PollScheduler
+    from resiliencia import Prazo, PRAZO_CICLO_S
+    from particionamento import leases
 except ImportError:
     from .feegow_core import FeegowSystem
+    from .auth_broker import auth_broker
     from .database_manager import DatabaseManager
+    from .fingerprint_fila import FingerprintCache, digest_html
+    from .estado_fila import QueueState
+    from .agendador import PollScheduler
+    from .resiliencia import Prazo, PRAZO_CICLO_S
+    from .particionamento import leases
 
 load_dotenv()
 
@@ -25,11 +37,72 @@ UNIDADES = [
     ("Campinas Shopping", 12)
 ]
 
+# Modo paralelo: uma sessão logada por unidade, consultadas ao mesmo tempo.
+# MONITOR_MEDICO_PARALELO=0 volta ao modo antigo (uma sessão trocando de unidade).
+MODO_PARALELO = os.getenv("MONITOR_MEDICO_PARALELO", "1") == "1"
+MAX_THREADS = int(os.getenv("MONITOR_MEDICO_THREADS", str(len(UNIDADES))))
+
+def persistir_unidade(db, estado, nome_unidade, entradas):
+    """
+    Compara a fila da unidade (lista de QueueEntry) com o estado em memória e grava só a diferença:
+    quem chegou ou mudou de status (upsert) e quem saiu (baixa).
+    Devolve (quantidade de pacientes, houve movimento na fila).
+    """
+    # Hash de cada paciente já vem calculado do parse (parser_fila.entradas_fila)
+    atuais = {e.hash_id: e.status for e in entradas}
+
+    diff = estado.diff(nome_unidade, atuais)
+
+    # espera_min muda a cada minuto para todos, mas não entra na comparação (o painel calcula
+    # a espera a partir de dt_chegada_ts): quem não mudou recebe só o espera_min, e só se ele mudou
+    gravar = set(diff.chegaram) | set(diff.alterados)
+    if gravar:
+        db.salvar_fila_medica([e for e in entradas if e.hash_id in gravar])
+    db.atualizar_espera_medicos([e for e in entradas if e.hash_id not in gravar])
+
+    # Verifica quem saiu da fila (foi atendido)
+    if diff.sairam:
+        db.finalizar_medicos_por_hash(diff.sairam)
+
+    estado.confirmar(nome_unidade, atuais)
+
+    # Log por unidade para confirmar que passou aqui
+    print(f"   -> {nome_unidade}: {len(entradas)} pacientes "
+          f"(+{len(diff.chegaram)} ~{len(diff.alterados)} -{len(diff.sairam)}).")
+    return len(entradas), bool(gravar or diff.sairam)
+
+def coletar_unidade(pool, nome_unidade, uid, fingerprints, prazo=None):
+    """
+    Baixa e interpreta a fila na sessão dedicada da unidade.
+    Devolve (digest, entradas), com entradas=None se o HTML não mudou desde o último ciclo,
+    ou None se a sessão não está disponível. Erro de rede (ou circuito aberto) levanta exceção.
+    """
+    sistema = pool.sessao(uid)
+    if sistema is None:
+        return None
+
+    html = sistema.obter_fila_raw(prazo=prazo)
+    if html is None:
+        pool.invalidar(uid)
+        return None
+
+    digest = digest_html(html)
+    if not fingerprints.mudou(nome_unidade, digest):
+        return digest, None
+    return digest, sistema.parse_fila(html, nome_unidade)
+
 def run_monitor_medico():
+    if MODO_PARALELO:
+        return run_monitor_medico_paralelo()
+
     print("=== MONITOR MÉDICO (COM HISTÓRICO) INICIADO ===")
     
     sistema = FeegowSystem()
     db = DatabaseManager()
+    fingerprints = FingerprintCache()
+    estado = QueueState(db.carregar_fila_ativa_medicos)
+    estado.aquecer([nome for nome, _ in UNIDADES])
+    agendador = PollScheduler([nome for nome, _ in UNIDADES])
     sessao_ativa = False
 
     while True:
@@ -46,16 +119,22 @@ def run_monitor_medico():
 
             # Limpeza diária
             db.limpar_dias_anteriores()
-            hoje = datetime.now().strftime('%Y-%m-%d')
             timestamp = datetime.now().strftime('%H:%M:%S')
             
             total_detectado_ciclo = 0
+
+            # Só as unidades abertas cujo intervalo (adaptativo) já venceu
+            vencidas = set(agendador.vencidas())
             
             # 2. Varredura por Unidade (Loop Explícito)
             for nome_unidade, uid in UNIDADES:
+                if nome_unidade not in vencidas:
+                    continue
+
                 # Tenta trocar a unidade
                 if not sistema.trocar_unidade(uid):
                     print(f"[{timestamp}] Falha ao trocar para {nome_unidade} ({uid})")
+                    agendador.registrar(nome_unidade, False)
                     continue
                 
                 # Pequeno delay para o servidor processar a troca de sessão
@@ -70,43 +149,163 @@ def run_monitor_medico():
                     sessao_ativa = False
                     break 
 
-                # Processa HTML
-                df = sistema.parse_html(html, nome_unidade)
-                
-                hashes_presentes = []
-                qtd_unidade = 0
-                
-                if not df.empty:
-                    qtd_unidade = len(df)
-                    total_detectado_ciclo += qtd_unidade
-                    
-                    # Salva no Banco
-                    db.salvar_dados_medicos(df)
-                    
-                    # Gera Hashes para verificar saídas
-                    for _, row in df.iterrows():
-                        raw = f"{row['UNIDADE']}-{row['PACIENTE']}-{row['CHEGADA']}-{hoje}"
-                        hashes_presentes.append(hashlib.md5(raw.encode()).hexdigest())
-                
-                # Verifica quem saiu da fila (foi atendido)
-                db.finalizar_ausentes_medicos(nome_unidade, hashes_presentes)
-                
-                # Log por unidade para confirmar que passou aqui
-                print(f"   -> {nome_unidade}: {qtd_unidade} pacientes.")
+                # Mesmo HTML do ciclo anterior: nada a interpretar nem gravar
+                digest = digest_html(html)
+                if not fingerprints.mudou(nome_unidade, digest):
+                    total_detectado_ciclo += fingerprints.ultima_qtd(nome_unidade)
+                    agendador.registrar(nome_unidade, False, fingerprints.ultima_qtd(nome_unidade))
+                    continue
+
+                # Processa HTML e grava
+                entradas = sistema.parse_fila(html, nome_unidade)
+                qtd_unidade, movimento = persistir_unidade(db, estado, nome_unidade, entradas)
+                fingerprints.confirmar(nome_unidade, digest, qtd_unidade)
+                agendador.registrar(nome_unidade, movimento, qtd_unidade)
+                total_detectado_ciclo += qtd_unidade
 
-            if sessao_ativa:
+            if sessao_ativa and vencidas:
                 if total_detectado_ciclo == 0:
                     # Imprime ponto se ninguém em nenhuma unidade (para não poluir)
                     print(".", end="", flush=True)
                 else:
-                    print(f"[{timestamp}] Ciclo concluído. Total: {total_detectado_ciclo}")
+                    print(f"[{timestamp}] Ciclo concluído. Total: {total_detectado_ciclo} | {fingerprints.resumo()} | {estado.resumo()}")
 
         except Exception as e:
             print(f"\n[ERRO CRÍTICO] Monitor Médico: {e}")
             sessao_ativa = False # Força relogin
         
-        # Espera 15s para o próximo ciclo
-        time.sleep(15)
+        # Momento ocioso entre ciclos: checkpoint do WAL se ele cresceu
+        db.checkpoint_wal()
+        # Dorme até a próxima unidade vencer (fila parada ou unidade fechada = intervalos maiores)
+        time.sleep(agendador.espera())
+
+class MonitorMedico:
+    """
+    Estado do monitor paralelo (sessões, fingerprints, fila em memória, agendador) e um ciclo por chamada.
+    Usado pelo loop deste arquivo e pelo supervisor (monitor_service.py).
+    """
+
+    def __init__(self, db=None, pool=None, max_threads=MAX_THREADS, prazo_s=PRAZO_CICLO_S, lease=None):
+        self.prazo_s = prazo_s
+        # Sessões logadas por unidade vêm do broker (reaproveitadas do banco e renovadas antes de vencer)
+        self.pool = pool or auth_broker().iniciar()
+        self.db = db or DatabaseManager()
+        self.fingerprints = FingerprintCache()
+        self.estado = QueueState(self.db.carregar_fila_ativa_medicos)
+        self.estado.aquecer([nome for nome, _ in UNIDADES])
+        self.agendador = PollScheduler([nome for nome, _ in UNIDADES])
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="unidade")
+        # Com várias réplicas cada uma fica com uma parte das unidades (particionamento.py)
+        self.lease = lease or leases("monitor_medico", [nome for nome, _ in UNIDADES])
+        self._minhas = set()
+
+    def _unidades_da_replica(self):
+        """Unidades com lease válido; as que acabaram de chegar recarregam o estado do banco"""
+        minhas = self.lease.minhas()
+        for nome_unidade in minhas ^ self._minhas:
+            self.fingerprints.esquecer(nome_unidade)
+        novas = minhas - self._minhas
+        if novas:
+            # Outra réplica gravou essas unidades até agora: o estado em memória daqui está velho
+            self.estado.aquecer(novas)
+        self._minhas = minhas
+        return minhas
+
+    def ciclo(self):
+        """Consulta as unidades vencidas, grava o diff e devolve quantos segundos dormir até o próximo ciclo"""
+        db, fingerprints, estado, agendador = self.db, self.fingerprints, self.estado, self.agendador
+        try:
+            # Limpeza diária
+            db.limpar_dias_anteriores()
+            timestamp = datetime.now().strftime('%H:%M:%S')
+            inicio = time.monotonic()
+            # Orçamento do ciclo: o timeout de cada unidade é cortado pelo que sobra dele
+            prazo = Prazo(self.prazo_s)
+
+            # Rede em paralelo; a gravação fica nesta thread, na ordem em que as unidades terminam.
+            # Só entram as unidades desta réplica, abertas, cujo intervalo (adaptativo) já venceu.
+            vencidas = set(agendador.vencidas(self._unidades_da_replica()))
+            futuros = {
+                self.executor.submit(coletar_unidade, self.pool, nome_unidade, uid, fingerprints, prazo): nome_unidade
+                for nome_unidade, uid in UNIDADES if nome_unidade in vencidas
+            }
+            total_detectado_ciclo = 0
+            pendentes = set(futuros)
+            try:
+                for futuro in as_completed(futuros, timeout=prazo.restante()):
+                    pendentes.discard(futuro)
+                    nome_unidade = futuros[futuro]
+                    try:
+                        coletado = futuro.result()
+                    except Exception as e:
+                        print(f"[{timestamp}] Erro ao consultar {nome_unidade}: {e}")
+                        agendador.registrar(nome_unidade, False)
+                        continue
+
+                    # Sem sessão: não dá baixa em ninguém, a unidade tenta de novo no próximo ciclo
+                    if coletado is None:
+                        print(f"[{timestamp}] Sessão de {nome_unidade} indisponível. Novo login no próximo ciclo.")
+                        agendador.registrar(nome_unidade, False)
+                        continue
+
+                    # HTML igual ao do ciclo anterior: nada a gravar
+                    digest, entradas = coletado
+                    if entradas is None:
+                        total_detectado_ciclo += fingerprints.ultima_qtd(nome_unidade)
+                        agendador.registrar(nome_unidade, False, fingerprints.ultima_qtd(nome_unidade))
+                        continue
+
+                    # Lease perdido no meio do ciclo: a outra réplica é quem grava e dá baixa agora
+                    if not self.lease.possui(nome_unidade):
+                        print(f"[{timestamp}] {nome_unidade}: lease perdido, gravação descartada.")
+                        continue
+
+                    qtd_unidade, movimento = persistir_unidade(db, estado, nome_unidade, entradas)
+                    fingerprints.confirmar(nome_unidade, digest, qtd_unidade)
+                    agendador.registrar(nome_unidade, movimento, qtd_unidade)
+                    total_detectado_ciclo += qtd_unidade
+            except FuturoTimeout:
+                # Prazo do ciclo acabou: quem não respondeu fica para o próximo ciclo (sem baixa de ninguém)
+                for futuro in pendentes:
+                    futuro.cancel()
+                    nome_unidade = futuros[futuro]
+                    print(f"[{timestamp}] {nome_unidade}: prazo do ciclo ({prazo.segundos:g}s) esgotado.")
+                    agendador.registrar(nome_unidade, False)
+
+            duracao = time.monotonic() - inicio
+            if futuros:
+                if total_detectado_ciclo == 0:
+                    print(".", end="", flush=True)
+                else:
+                    print(f"[{timestamp}] Ciclo concluído em {duracao:.1f}s. Total: {total_detectado_ciclo} | {fingerprints.resumo()} | {estado.resumo()}")
+
+        except Exception as e:
+            print(f"\n[ERRO CRÍTICO] Monitor Médico: {e}")
+            # Sobe para quem chamou: o supervisor faz o backoff e, depois de várias seguidas, recria o job
+            raise
+
+        # Momento ocioso entre ciclos: checkpoint do WAL se ele cresceu
+        db.checkpoint_wal()
+        # Até a próxima unidade vencer (fila parada ou unidade fechada = intervalos maiores)
+        return self.lease.limitar_espera(agendador.espera(self._minhas))
+
+    def fechar(self):
+        self.executor.shutdown(wait=False)
+        self.lease.parar()
+
+def run_monitor_medico_paralelo():
+    print(f"=== MONITOR MÉDICO (SESSÃO POR UNIDADE, {MAX_THREADS} THREADS) INICIADO ===")
+
+    monitor = MonitorMedico()
+    try:
+        while True:
+            try:
+                time.sleep(monitor.ciclo())
+            except Exception:
+                print("   Retentando em 30s...")
+                time.sleep(30)
+    finally:
+        monitor.fechar()
 
 if __name__ == "__main__":
     run_monitor_medico()
\ No newline at end of file
@@ -9,60 +9,166 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 try:
     from feegow_recepcao_core import FeegowRecepcaoSystem
     from database_manager import DatabaseManager
+    from fingerprint_fila import FingerprintCache, digest_json
+    from estado_fila import QueueState
+    from agendador import PollScheduler
+    from resiliencia import Prazo
+    from particionamento import leases
 except ImportError:
     from .feegow_recepcao_core import FeegowRecepcaoSystem
     from .database_manager import DatabaseManager
+    from .fingerprint_fila import FingerprintCache, digest_json
+    from .estado_fila import QueueState
+    from .agendador import PollScheduler
+    from .resiliencia import Prazo
+    from .particionamento import leases
 
 load_dotenv()
 
-def run_monitor_recepcao():
-    print("=== MONITOR RECEPÇÃO (MODO TOKEN MANUAL) INICIADO ===")
-    
-    sistema = FeegowRecepcaoSystem()
-    db = DatabaseManager()
+UNIDADES = [2, 3, 12]
 
-    while True:
+class MonitorRecepcao:
+    """
+    Estado do monitor da recepção (sessão HTTP, fingerprints, fila em memória, agendador) e um ciclo por chamada.
+    Usado pelo loop deste arquivo e pelo supervisor (monitor_service.py).
+    """
+
+    def __init__(self, db=None, sistema=None, lease=None):
+        self.sistema = sistema or FeegowRecepcaoSystem()
+        # Thread do broker: testa o cookie do Core em segundo plano e troca antes do próximo ciclo
+        self.sistema.broker.iniciar()
+        self.db = db or DatabaseManager()
+        self.fingerprints = FingerprintCache()
+        self.estado = QueueState(self.db.carregar_fila_ativa_recepcao)
+        self.estado.aquecer(UNIDADES)
+        self.agendador = PollScheduler(UNIDADES)
+        # Com várias réplicas cada uma fica com uma parte das unidades (particionamento.py)
+        self.lease = lease or leases("monitor_recepcao", UNIDADES)
+        self._minhas = set()
+
+    def _unidades_da_replica(self):
+        """Unidades com lease válido; as que acabaram de chegar recarregam o estado do banco"""
+        minhas = self.lease.minhas()
+        for uid in minhas ^ self._minhas:
+            self.fingerprints.esquecer(uid)
+        novas = minhas - self._minhas
+        if novas:
+            # Outra réplica gravou essas unidades até agora: o estado em memória daqui está velho
+            self.estado.aquecer(novas)
+        self._minhas = minhas
+        return minhas
+
+    def ciclo(self):
+        """Consulta as unidades vencidas, grava o diff e devolve quantos segundos dormir até o próximo ciclo"""
+        sistema, db, fingerprints, estado, agendador = (
+            self.sistema, self.db, self.fingerprints, self.estado, self.agendador)
         try:
             db.limpar_dias_anteriores()
             timestamp = datetime.now().strftime('%H:%M:%S')
 
-            # Coleta dados (ele lê o cookie do banco sozinho)
-            dados_brutos, msg_erro = sistema.obter_dados_brutos(unidades=[2, 3, 12])
+            # Só as unidades desta réplica, abertas, cujo intervalo (adaptativo) já venceu
+            vencidas = agendador.vencidas(self._unidades_da_replica())
+            if vencidas:
+                # Coleta dados (ele lê o cookie do banco sozinho)
+                # Com orçamento de tempo: unidade que não responder a tempo fica para o próximo ciclo
+                dados_brutos, msg_erro = sistema.obter_dados_brutos(unidades=vencidas, prazo=Prazo())
 
-            # --- DETECÇÃO DE TOKEN EXPIRADO ---
-            if "Cookie Expirou" in msg_erro or "403" in msg_erro:
-                print(f"\n[{timestamp}] 🚨 ALERTA: O TOKEN DA RECEPÇÃO EXPIROU!")
-                print("   Ação Necessária: Rode 'python atualizar_token.py' e cole um novo cookie.")
-                print("   (O monitor continuará tentando a cada 15s até você atualizar)\n")
+                # --- DETECÇÃO DE TOKEN EXPIRADO ---
+                if "Cookie Expirou" in msg_erro or "403" in msg_erro:
+                    # O broker troca pelo próximo cookie válido (ou faz login); o alerta para
+                    # rodar o atualizar_token.py só sai se nada funcionar, e sem repetir a cada ciclo
+                    renovado = sistema.renovar_cookie()
+                    for uid in vencidas:
+                        agendador.registrar(uid, renovado)
             
-            elif msg_erro != "OK" and not dados_brutos:
-                print(f"[{timestamp}] Erro técnico: {msg_erro}")
+                elif msg_erro != "OK" and not dados_brutos:
+                    print(f"[{timestamp}] Erro técnico: {msg_erro}")
+                    for uid in vencidas:
+                        agendador.registrar(uid, False)
             
-            else:
-                # Fluxo Normal
-                if dados_brutos:
-                    db.salvar_dados_recepcao(dados_brutos)
-                
-                # Baixa automática de quem saiu da fila
-                for uid in [2, 3, 12]:
-                    ids_nesta_unidade = [
-                        item['id'] for item in dados_brutos 
-                        if item.get('UnidadeID') == uid or item.get('UnidadeID_Coleta') == uid
-                    ]
-                    db.finalizar_ausentes_recepcao(uid, ids_nesta_unidade)
-
-                if dados_brutos:
-                    print(f"[{timestamp}] OK. {len(dados_brutos)} pessoas na fila.")
                 else:
-                    print(".", end="", flush=True)
+                    # Unidade que falhou neste ciclo (timeout, erro) fica de fora:
+                    # a lista vazia dela não pode virar baixa de todo mundo
+                    consultadas = []
+                    for uid in vencidas:
+                        if f"UID {uid}:" in msg_erro:
+                            agendador.registrar(uid, False)
+                        else:
+                            consultadas.append(uid)
+
+                    # Fluxo Normal: separa o payload por unidade e só processa as que mudaram
+                    por_unidade = {
+                        uid: [
+                            item for item in dados_brutos 
+                            if item.get('UnidadeID') == uid or item.get('UnidadeID_Coleta') == uid
+                        ]
+                        for uid in consultadas
+                    }
+                    digests = {uid: digest_json(itens) for uid, itens in por_unidade.items()}
+                    # Lease perdido no meio do ciclo: a outra réplica é quem grava e dá baixa agora
+                    alteradas = [uid for uid in por_unidade
+                                 if self.lease.possui(uid) and fingerprints.mudou(uid, digests[uid])]
+                    movimento = dict.fromkeys(por_unidade, False)
+
+                    if alteradas:
+                        # Diff contra o estado em memória: grava só quem chegou/mudou e dá baixa em quem saiu
+                        atuais = {
+                            uid: {item['id']: (item.get('Sta'), item.get('DataHoraAtendimento') or None)
+                                  for item in por_unidade[uid]}
+                            for uid in alteradas
+                        }
+                        gravar, sairam = [], []
+                        for uid in alteradas:
+                            diff = estado.diff(uid, atuais[uid])
+                            mudaram = set(diff.chegaram) | set(diff.alterados)
+                            movimento[uid] = bool(mudaram or diff.sairam)
+                            gravar.extend(item for item in por_unidade[uid] if item['id'] in mudaram)
+                            sairam.extend(diff.sairam)
+
+                        if gravar:
+                            db.salvar_dados_recepcao(gravar)
+                    
+                        # Baixa automática de quem saiu da fila (todas as unidades num único UPDATE)
+                        finalizados = db.finalizar_recepcao_por_id(sairam)
+                        if any(finalizados.values()):
+                            print(f"[{timestamp}] Baixas: {finalizados}")
+
+                        for uid in alteradas:
+                            estado.confirmar(uid, atuais[uid])
+                            fingerprints.confirmar(uid, digests[uid], len(por_unidade[uid]))
+
+                    for uid in por_unidade:
+                        agendador.registrar(uid, movimento[uid], len(por_unidade[uid]))
+
+                    if dados_brutos:
+                        print(f"[{timestamp}] OK. {len(dados_brutos)} pessoas na fila. | {fingerprints.resumo()} | {estado.resumo()}")
+                    else:
+                        print(".", end="", flush=True)
 
-        except KeyboardInterrupt:
-            print("\nMonitor encerrado.")
-            break
         except Exception as e:
             print(f"\n[ERRO CRÍTICO] {e}")
+            # O supervisor precisa ver a falha para fazer o backoff (e recriar o job se ela se repetir)
+            raise
+
+        # Momento ocioso entre ciclos: checkpoint do WAL se ele cresceu
+        db.checkpoint_wal()
+        # Até a próxima unidade vencer (fila parada ou unidade fechada = intervalos maiores)
+        return self.lease.limitar_espera(agendador.espera(self._minhas))
+
+def run_monitor_recepcao():
+    print("=== MONITOR RECEPÇÃO (MODO TOKEN MANUAL) INICIADO ===")
 
-        time.sleep(15)
+    monitor = MonitorRecepcao()
+    while True:
+        try:
+            time.sleep(monitor.ciclo())
+        except KeyboardInterrupt:
+            monitor.lease.parar()
+            print("\nMonitor encerrado.")
+            break
+        except Exception:
+            print("   Retentando em 30s...")
+            time.sleep(30)
 
 if __name__ == "__main__":
     run_monitor_recepcao()
\ No newline at end of file
@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import importlib
+from datetime import datetime
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from database_manager import DatabaseManager
+    from db_writer import DatabaseWriter, usar_writer_local
+    from auth_broker import auth_broker
+    from resiliencia import metricas_breakers
+    from limitador import limitador
+    from particionamento import leases, metricas_leases, parar_leases, LEASE_HEARTBEAT_S
+except ImportError:
+    from .database_manager import DatabaseManager
+    from .db_writer import DatabaseWriter, usar_writer_local
+    from .auth_broker import auth_broker
+    from .resiliencia import metricas_breakers
+    from .limitador import limitador
+    from .particionamento import leases, metricas_leases, parar_leases, LEASE_HEARTBEAT_S
+
+load_dotenv()
+
+# Supervisor único dos workers (é o CMD do Dockerfile).
+# Cada job roda no mesmo processo, numa thread do loop asyncio (o código dos workers é bloqueante):
+# um só interpretador e um só import do pandas, o mesmo DatabaseWriter (group commit) e o
+# mesmo AuthBroker (sessões e cookies de login) para todos os jobs.
+#   - cada job tem seu próprio task: um ciclo nunca começa antes do anterior terminar
+#   - SUPERVISOR_MAX_CONCORRENCIA limita quantos ciclos rodam ao mesmo tempo
+#   - exceção que escapa do ciclo: espera com backoff; depois de SUPERVISOR_MAX_FALHAS seguidas
+#     o job é recriado do zero (novo login, estado recarregado do banco)
+#   - com várias réplicas (docker compose up --scale worker=N) os monitores dividem as unidades
+#     e cada job de instância única roda em uma réplica só (leases em particionamento.py)
+SUPERVISOR_JOBS = os.getenv("SUPERVISOR_JOBS", "monitor_medico,monitor_recepcao,worker_clinia,worker_feegow,worker_faturamento")
+SUPERVISOR_MAX_CONCORRENCIA = int(os.getenv("SUPERVISOR_MAX_CONCORRENCIA", "4"))
+SUPERVISOR_MAX_FALHAS = int(os.getenv("SUPERVISOR_MAX_FALHAS", "3"))
+SUPERVISOR_BACKOFF_MIN = float(os.getenv("SUPERVISOR_BACKOFF_MIN", "5"))
+SUPERVISOR_BACKOFF_MAX = float(os.getenv("SUPERVISOR_BACKOFF_MAX", "300"))
+SUPERVISOR_RELATORIO_S = float(os.getenv("SUPERVISOR_RELATORIO_S", "300"))
+
+# Jobs de execução única, repetidos em intervalo fixo (segundos)
+FEEGOW_FINANCEIRO_INTERVALO = float(os.getenv("FEEGOW_FINANCEIRO_INTERVALO", "3600"))
+FATURAMENTO_INTERVALO = float(os.getenv("FATURAMENTO_INTERVALO", "21600"))
+
+def _importar(modulo):
+    try:
+        return importlib.import_module(modulo)
+    except ImportError:
+        return importlib.import_module(f".{modulo}", __package__)
+
+def _monitor_medico():
+    mod = _importar("monitor_medico")
+    return mod.MonitorMedico(db=DatabaseManager(fonte="monitor_medico")).ciclo
+
+def _monitor_recepcao():
+    mod = _importar("monitor_recepcao")
+    return mod.MonitorRecepcao(db=DatabaseManager(fonte="monitor_recepcao")).ciclo
+
+def _worker_clinia():
+    return _importar("worker_clinia").MonitorClinia().ciclo
+
+def _worker_feegow():
+    return _importar("worker_feegow").update_financial_data
+
+def _worker_faturamento():
+    return _importar("worker_faturamento_scraping").run_scraper
+
+# nome: (fábrica que devolve a função de um ciclo, intervalo fixo ou None se o ciclo devolve a espera,
+#        instância única entre réplicas; os monitores dividem as unidades por conta própria)
+JOBS = {
+    "monitor_medico": (_monitor_medico, None, False),
+    "monitor_recepcao": (_monitor_recepcao, None, False),
+    "worker_clinia": (_worker_clinia, None, True),
+    "worker_feegow": (_worker_feegow, FEEGOW_FINANCEIRO_INTERVALO, True),
+    "worker_faturamento": (_worker_faturamento, FATURAMENTO_INTERVALO, True),
+}
+
+class Job:
+    """Um worker supervisionado: cria o ciclo, roda em intervalo e guarda as métricas"""
+
+    def __init__(self, nome, fabrica, intervalo=None, exclusivo=False):
+        self.nome = nome
+        self.fabrica = fabrica
+        self.intervalo = intervalo
+        self.exclusivo = exclusivo
+        self.lease = None
+        self.ciclo = None
+        self.falhas_seguidas = 0
+        self.desativado = None
+        self._metricas = {
+            "ciclos": 0, "falhas": 0, "reinicios": 0,
+            "ultimo_s": 0.0, "max_s": 0.0, "ultimo_em": None, "ultimo_erro": None,
+        }
+
+    def preparar(self):
+        """Cria o ciclo (import + login/aquecimento). Dependência ausente desativa o job."""
+        try:
+            self.ciclo = self.fabrica()
+        except (ImportError, SystemExit) as e:
+            self.desativado = str(e) or type(e).__name__
+            return False
+        return True
+
+    def rodar(self):
+        """Um ciclo; devolve quantos segundos dormir até o próximo"""
+        inicio = time.monotonic()
+        espera = self.ciclo()
+        duracao = round(time.monotonic() - inicio, 3)
+        m = self._metricas
+        m["ciclos"] += 1
+        m["ultimo_s"] = duracao
+        m["max_s"] = max(m["max_s"], duracao)
+        m["ultimo_em"] = datetime.now().strftime('%H:%M:%S')
+        self.falhas_seguidas = 0
+        if self.intervalo is not None:
+            return max(self.intervalo - duracao, 1.0)
+        return espera if espera is not None else SUPERVISOR_BACKOFF_MIN
+
+    def falhou(self, erro):
+        """Registra a falha e devolve o backoff; muitas seguidas descartam o ciclo para recriá-lo"""
+        self.falhas_seguidas += 1
+        self._metricas["falhas"] += 1
+        self._metricas["ultimo_erro"] = f"{type(erro).__name__}: {erro}"
+        if self.falhas_seguidas >= SUPERVISOR_MAX_FALHAS:
+            self.ciclo = None
+            self._metricas["reinicios"] += 1
+        return min(SUPERVISOR_BACKOFF_MIN * 2 ** (self.falhas_seguidas - 1), SUPERVISOR_BACKOFF_MAX)
+
+    def metricas(self):
+        m = dict(self._metricas)
+        m["desativado"] = self.desativado
+        return m
+
+class Supervisor:
+    """Roda os jobs num único loop asyncio, cada ciclo numa thread do executor padrão"""
+
+    def __init__(self, jobs, max_concorrencia=SUPERVISOR_MAX_CONCORRENCIA):
+        self.jobs = jobs
+        self.max_concorrencia = max_concorrencia
+        self.writer = None
+        self.broker = None
+        self._parar = None
+        self._semaforo = None
+
+    async def _executar_job(self, job):
+        while not self._parar.is_set():
+            # Job de instância única com o lease em outra réplica: só confere de novo no próximo heartbeat
+            if job.lease is not None and not job.lease.possui(job.nome):
+                try:
+                    await asyncio.wait_for(self._parar.wait(), timeout=LEASE_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            async with self._semaforo:
+                try:
+                    if job.ciclo is None:
+                        print(f"   [SUPERVISOR] Iniciando {job.nome}...")
+                        if not await asyncio.to_thread(job.preparar):
+                            print(f"   [SUPERVISOR] {job.nome} desativado: {job.desativado}")
+                            return
+                    espera = await asyncio.to_thread(job.rodar)
+                except Exception as e:
+                    espera = job.falhou(e)
+                    print(f"\n[ERRO CRÍTICO] {job.nome}: {e} (falha {job.falhas_seguidas}, nova tentativa em {espera:.0f}s)")
+
+            # Dorme até o próximo ciclo, mas acorda na hora se o processo for encerrado
+            try:
+                await asyncio.wait_for(self._parar.wait(), timeout=espera)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _relatorio(self):
+        while not self._parar.is_set():
+            try:
+                await asyncio.wait_for(self._parar.wait(), timeout=SUPERVISOR_RELATORIO_S)
+            except asyncio.TimeoutError:
+                pass
+            print(f"   [SUPERVISOR] {json.dumps(self.metricas(), default=str)}")
+
+    def metricas(self):
+        m = {job.nome: job.metricas() for job in self.jobs}
+        if self.writer is not None:
+            m["writer"] = self.writer.metricas()
+        if self.broker is not None:
+            m["auth"] = self.broker.metricas()
+        m["circuitos"] = metricas_breakers()
+        m["limite_taxa"] = limitador().metricas()
+        m["leases"] = metricas_leases()
+        return m
+
+    def encerrar(self):
+        if self._parar is not None:
+            self._parar.set()
+
+    async def executar(self):
+        self._parar = asyncio.Event()
+        self._semaforo = asyncio.Semaphore(self.max_concorrencia)
+
+        loop = asyncio.get_running_loop()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sinal, self.encerrar)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        # Um writer para todos os jobs: as escritas de todos entram no mesmo group commit
+        self.writer = DatabaseWriter().start()
+        usar_writer_local(self.writer)
+        # Sessões de login compartilhadas, renovadas em segundo plano
+        self.broker = auth_broker().iniciar()
+        exclusivos = [job for job in self.jobs if job.exclusivo]
+        if exclusivos:
+            lease = await asyncio.to_thread(leases, "supervisor", [job.nome for job in exclusivos])
+            for job in exclusivos:
+                job.lease = lease
+        try:
+            tarefas = [asyncio.create_task(self._executar_job(job)) for job in self.jobs]
+            relatorio = asyncio.create_task(self._relatorio())
+            await asyncio.gather(*tarefas)
+            relatorio.cancel()
+        finally:
+            # Devolve unidades e jobs para as outras réplicas assumirem sem esperar o lease vencer
+            parar_leases()
+            self.broker.parar()
+            usar_writer_local(None)
+            self.writer.stop()
+
+def criar_jobs(nomes=SUPERVISOR_JOBS):
+    jobs = []
+    for nome in [n.strip() for n in nomes.split(',') if n.strip()]:
+        if nome not in JOBS:
+            print(f"   [SUPERVISOR] Job desconhecido ignorado: {nome}")
+            continue
+        fabrica, intervalo, exclusivo = JOBS[nome]
+        jobs.append(Job(nome, fabrica, intervalo, exclusivo))
+    return jobs
+
+def run_monitor_service():
+    jobs = criar_jobs()
+    print(f"=== MONITOR SERVICE ({len(jobs)} JOBS, ATÉ {SUPERVISOR_MAX_CONCORRENCIA} SIMULTÂNEOS) INICIADO ===")
+    supervisor = Supervisor(jobs)
+    try:
+        asyncio.run(supervisor.executar())
+    except KeyboardInterrupt:
+        pass
+    print("\nMonitor service encerrado.")
+
+if __name__ == "__main__":
+    run_monitor_service()
@@ -0,0 +1,346 @@
+import re
+import html
+import hashlib
+from datetime import date
+from io import StringIO
+from collections import namedtuple
+from lxml import etree
+
+# Parser único das tabelas HTML do Feegow (fila médica, lista de espera e relatório do Core).
+# Percorre as linhas da primeira tabela direto no lxml e devolve registros tipados, sem passar
+# pelo pd.read_html (que monta um TextParser e um DataFrame só para ler ~30 linhas).
+# As regras são as mesmas do read_html, para o resultado ser idêntico ao que era gravado antes:
+#   - primeira tabela com texto; elementos com display:none são ignorados; <br> vira espaço
+#   - cabeçalho = <thead> ou linhas do topo só com <th>; colspan/rowspan repetem o texto
+#   - espaços: quebras de linha e sequências de 2+ espaços viram um espaço
+#   - tipos por coluna: int, float (se houver vazio), bool ou texto; vazio/"nan"/"NULL"... = NaN (float)
+
+COLUNAS_FILA = ['HORA', 'CHEGADA', 'PACIENTE', 'IDADE', 'PROFISSIONAL', 'COMPROMISSO', 'TEMPO_TEXTO']
+
+# Correções de caracteres específicas (padrões Feegow): UTF-8 lido como latin-1/cp1252.
+# Aplicadas uma vez no HTML bruto, antes de ler a tabela, com um regex só (chaves mais longas primeiro).
+CORRECOES_TEXTO = {
+    'Ã\x8d': 'Í', 'Ã\x81': 'Á', 'Ã‰': 'É', 'Ã“': 'Ó', 'Ãš': 'Ú',
+    'Ã¢': 'â', 'Ãª': 'ê', 'Ã®': 'î', 'Ã´': 'ô', 'Ã»': 'û',
+    'Ã£': 'ã', 'Ãµ': 'õ', 'Ã§': 'ç', 'Ã‡': 'Ç',
+    'Ã€': 'À', 'Âº': 'º', 'Âª': 'ª', 'hÃ¡': 'há'
+}
+
+# Linha da fila de espera do Feegow (as 7 primeiras colunas da tabela)
+LinhaFila = namedtuple("LinhaFila", COLUNAS_FILA)
+
+Tabela = namedtuple("Tabela", ["colunas", "linhas"])
+
+class QueueEntry:
+    """
+    Paciente da fila médica já interpretado (status, espera, prioridades e hash), usado pelo
+    monitor no lugar de um DataFrame por unidade por ciclo. __slots__: ~30 objetos pequenos por ciclo.
+    """
+    __slots__ = ("hash_id", "unidade", "paciente", "idade", "hora", "chegada", "profissional", "compromisso",
+                 "status", "espera_min", "prioridade_idoso", "prioridade_cadeirante", "prioridade_gestante")
+
+    def __init__(self, hash_id, unidade, paciente, idade, hora, chegada, profissional, compromisso,
+                 status, espera_min, prioridade_idoso, prioridade_cadeirante, prioridade_gestante):
+        self.hash_id = hash_id
+        self.unidade = unidade
+        self.paciente = paciente
+        self.idade = idade
+        self.hora = hora
+        self.chegada = chegada
+        self.profissional = profissional
+        self.compromisso = compromisso
+        self.status = status
+        self.espera_min = espera_min
+        self.prioridade_idoso = prioridade_idoso
+        self.prioridade_cadeirante = prioridade_cadeirante
+        self.prioridade_gestante = prioridade_gestante
+
+    def __repr__(self):
+        return f"QueueEntry({self.unidade!r}, {self.paciente!r}, {self.status!r}, {self.espera_min})"
+
+_MINUTOS = re.compile(r"(\d+)")
+_IDADE = re.compile(r"^\s*(\d+)")
+_ESPACOS = re.compile(r"[\r\n]+|\s{2,}")
+_ESPACOS_TEXTO = re.compile(r"\s+")
+_PRIMEIRA_VEZ = re.compile("Primeira vez ", re.IGNORECASE)
+_RE_CORRECOES = re.compile("|".join(map(re.escape, sorted(CORRECOES_TEXTO, key=len, reverse=True))))
+_INTEIRO = re.compile(r"^[+-]?[0-9]+$")
+_DECIMAL = re.compile(r"^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$")
+_MILHAR = re.compile(r"^[\-\+]?([0-9]+,|[0-9])*(\.[0-9]*)?([0-9]?(E|e)\-?[0-9]+)?$")
+_INFINITO = {"inf", "+inf", "-inf", "infinity", "+infinity", "-infinity"}
+_NULOS = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+          '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+NAN = float("nan")
+_VERDADEIROS = {"True", "TRUE", "true"}
+_FALSOS = {"False", "FALSE", "false"}
+
+# etree puro (sem as classes do lxml.html): mesma árvore do libxml2, sem custo por elemento
+_PARSER = etree.HTMLParser(recover=True)
+_INICIO_NUMERO = frozenset("0123456789+-.iI")
+
+def _texto(elem):
+    # Texto da célula sem comentários (o mesmo que o text_content() usado pelo read_html)
+    return etree.tostring(elem, method="text", encoding=str, with_tail=False)
+
+def _limpar(linhas):
+    """Espaços de todas as células numa passada só do regex (\x00 separa as células)"""
+    contagem = [len(linha) for linha in linhas]
+    celulas = _ESPACOS.sub(" ", "\x00".join(t for linha in linhas for t in linha)).split("\x00")
+    limpas, inicio = [], 0
+    for n in contagem:
+        limpas.append([t.strip() for t in celulas[inicio:inicio + n]])
+        inicio += n
+    return limpas
+
+def _remover(elem):
+    """Tira o elemento da árvore mantendo o texto que vem depois dele (como o drop_tree do lxml.html)"""
+    pai = elem.getparent()
+    if pai is None:
+        return
+    if elem.tail:
+        anterior = elem.getprevious()
+        if anterior is not None:
+            anterior.tail = (anterior.tail or "") + elem.tail
+        else:
+            pai.text = (pai.text or "") + elem.tail
+    pai.remove(elem)
+
+def _tem_texto(tabela):
+    # Mesmo critério do read_html (texto que case com ".+": algo além de quebras de linha)
+    return any(t.strip("\n") for t in tabela.itertext())
+
+def _oculto(elem):
+    return "display:none" in elem.get("style", "").replace(" ", "")
+
+def _primeira_tabela(doc):
+    for tabela in doc.iter("table"):
+        if _oculto(tabela) or not _tem_texto(tabela):
+            continue
+        for elem in tabela.xpath(".//style"):
+            _remover(elem)
+        for elem in tabela.xpath(".//*[@style]"):
+            if _oculto(elem):
+                _remover(elem)
+        for br in tabela.iter("br"):
+            br.tail = "\n" + (br.tail or "")
+        cabecalho, corpo, rodape = _secoes(tabela)
+        if cabecalho or corpo or rodape:
+            return cabecalho, corpo, rodape
+    raise ValueError("nenhuma tabela encontrada no HTML")
+
+def _celulas(tr):
+    return [filho for filho in tr if filho.tag == "td" or filho.tag == "th"]
+
+def _secoes(tabela):
+    """Linhas (já em texto) do cabeçalho, corpo e rodapé"""
+    linhas_cabecalho = []
+    for thead in tabela.xpath(".//thead"):
+        linhas_cabecalho.extend(thead.xpath("./tr"))
+        if _celulas(thead):
+            linhas_cabecalho.append(thead)
+    linhas_corpo = tabela.xpath(".//tbody//tr") + tabela.xpath("./tr")
+    linhas_rodape = tabela.xpath(".//tfoot//tr")
+
+    if not linhas_cabecalho:
+        while linhas_corpo and all(td.tag == "th" for td in _celulas(linhas_corpo[0])):
+            linhas_cabecalho.append(linhas_corpo.pop(0))
+
+    # Caso comum (fila do Feegow): nenhum colspan/rowspan na tabela, uma célula = uma coluna
+    if not tabela.xpath("boolean(.//*[@rowspan or @colspan])"):
+        cabecalho = [[_texto(td) for td in _celulas(tr)] for tr in linhas_cabecalho]
+        corpo = [[_texto(td) for td in _celulas(tr)] for tr in linhas_corpo]
+        rodape = [[_texto(td) for td in _celulas(tr)] for tr in linhas_rodape]
+    else:
+        # Cada seção é expandida sozinha, como no read_html do pandas 2 (o da imagem python:3.9)
+        cabecalho = _expandir(linhas_cabecalho)
+        corpo = _expandir(linhas_corpo)
+        rodape = _expandir(linhas_rodape)
+    linhas = _limpar(cabecalho + corpo + rodape)
+    return linhas[:len(cabecalho)], linhas[len(cabecalho):len(cabecalho) + len(corpo)], linhas[len(cabecalho) + len(corpo):]
+
+def _expandir(trs):
+    """Texto de cada <tr>, repetindo células com colspan/rowspan"""
+    textos_linhas = []
+    resto = []
+    for tr in trs:
+        textos, proximo = [], []
+        indice = 0
+        for td in _celulas(tr):
+            while resto and resto[0][0] <= indice:
+                i, texto, rowspan = resto.pop(0)
+                textos.append(texto)
+                if rowspan > 1:
+                    proximo.append((i, texto, rowspan - 1))
+                indice += 1
+            texto = _texto(td)
+            rowspan = int(td.get("rowspan") or 1)
+            colspan = int(td.get("colspan") or 1)
+            for _ in range(colspan):
+                textos.append(texto)
+                if rowspan > 1:
+                    proximo.append((indice, texto, rowspan - 1))
+                indice += 1
+        for i, texto, rowspan in resto:
+            textos.append(texto)
+            if rowspan > 1:
+                proximo.append((i, texto, rowspan - 1))
+        textos_linhas.append(textos)
+        resto = proximo
+
+    # rowspan que passa da última linha da seção vira linhas só com essas células
+    while resto:
+        textos, proximo = [], []
+        for i, texto, rowspan in resto:
+            textos.append(texto)
+            if rowspan > 1:
+                proximo.append((i, texto, rowspan - 1))
+        textos_linhas.append(textos)
+        resto = proximo
+    return textos_linhas
+
+def _numero(texto):
+    """int/float do texto da célula (aceita separador de milhar ","), ou None se não for número"""
+    if texto[0] not in _INICIO_NUMERO:
+        return None
+    if "," in texto and _MILHAR.search(texto):
+        texto = texto.replace(",", "")
+    if _INTEIRO.match(texto):
+        return int(texto)
+    if _DECIMAL.match(texto) or texto.lower() in _INFINITO:
+        return float(texto)
+    return None
+
+def _tipar(valores):
+    """Converte a coluna inteira para um tipo só, como o read_html faz"""
+    textos = [None if v in _NULOS else v for v in valores]
+    presentes = [v for v in textos if v is not None]
+    vazios = len(presentes) < len(textos)
+
+    numeros = []
+    for v in presentes:
+        n = _numero(v)
+        if n is None:
+            break
+        numeros.append(n)
+    else:
+        if presentes:
+            if not vazios and all(isinstance(n, int) for n in numeros):
+                return numeros
+            convertidos = iter(numeros)
+            return [NAN if v is None else float(next(convertidos)) for v in textos]
+
+    if presentes and not vazios and all(v in _VERDADEIROS or v in _FALSOS for v in presentes):
+        return [v in _VERDADEIROS for v in textos]
+    return [NAN if v is None else v for v in textos] if vazios else textos
+
+def _nomes_colunas(linha):
+    """Cabeçalho de uma linha: vazio vira "Unnamed: i" e nome repetido ganha ".1", ".2"..."""
+    nomes, vistos = [], {}
+    for i, nome in enumerate(linha):
+        nome = nome or f"Unnamed: {i}"
+        if nome in vistos:
+            vistos[nome] += 1
+            novo = f"{nome}.{vistos[nome]}"
+            while novo in vistos:
+                vistos[nome] += 1
+                novo = f"{nome}.{vistos[nome]}"
+            vistos[novo] = 0
+            nome = novo
+        else:
+            vistos[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+def ler_tabela(html):
+    """
+    Primeira tabela do HTML como Tabela(colunas, linhas): colunas vêm do cabeçalho (ou 0..n-1)
+    e cada linha é uma tupla com os valores já tipados. Levanta ValueError se não houver tabela.
+    """
+    doc = etree.parse(StringIO(html), _PARSER).getroot()
+    if doc is None:
+        raise ValueError("HTML vazio")
+    cabecalho, corpo, rodape = _primeira_tabela(doc)
+
+    linhas = cabecalho + corpo + rodape
+    largura = max(len(linha) for linha in linhas)
+    for linha in linhas:
+        if len(linha) < largura:
+            linha.extend([""] * (largura - len(linha)))
+
+    if len(cabecalho) == 1:
+        colunas = _nomes_colunas(cabecalho[0])
+    elif cabecalho:
+        niveis = [linha for linha in cabecalho if any(linha)]
+        colunas = list(zip(*niveis))
+    else:
+        colunas = list(range(largura))
+    dados = corpo + rodape
+    if largura == 1:
+        dados = [linha for linha in dados if linha[0].strip()]
+
+    valores = [_tipar(coluna) for coluna in zip(*dados)] if dados else [[] for _ in colunas]
+    return Tabela(colunas, list(zip(*valores)))
+
+def ler_fila(html):
+    """Linhas da fila de espera (LinhaFila) da primeira tabela; ValueError se a tabela não tiver as 7 colunas"""
+    tabela = ler_tabela(html)
+    if len(tabela.colunas) < len(COLUNAS_FILA):
+        raise ValueError(f"tabela da fila com {len(tabela.colunas)} colunas")
+    largura = len(COLUNAS_FILA)
+    return [LinhaFila(*linha[:largura]) for linha in tabela.linhas]
+
+def status_tempo(texto):
+    """("Em Atendimento", 0) ou ("Espera", minutos) a partir da coluna "Aguardando há 316 minutos" """
+    texto = str(texto).strip()
+    if "atendimento" in texto.lower():
+        return "Em Atendimento", 0
+    match = _MINUTOS.search(texto)
+    return "Espera", int(match.group(1)) if match else 0
+
+def vazio(valor):
+    """Célula vazia da tabela (NaN, como no read_html; None para quem monta os valores à mão)"""
+    return valor is None or (isinstance(valor, float) and valor != valor)
+
+def _str(valor):
+    # Mesmo texto do astype(str) do pandas que montava a chave do hash (vazio era NaN -> "nan")
+    return "nan" if vazio(valor) else str(valor)
+
+def hash_medico(unidade, paciente, chegada, dia):
+    """Hash de identificação do paciente na fila médica (Unidade-Paciente-Chegada-Dia)"""
+    return hashlib.md5(f"{unidade}-{_str(paciente)}-{_str(chegada)}-{dia}".encode()).hexdigest()
+
+def entradas_fila(html, unidade, dia=None):
+    """Fila médica como lista de QueueEntry, com status, prioridades e hash calculados uma vez aqui"""
+    dia = dia or date.today().isoformat()
+    entradas = []
+    for linha in ler_fila(html):
+        status, minutos = status_tempo(_str(linha.TEMPO_TEXTO))
+        paciente = _str(linha.PACIENTE).lower()
+        idade = _IDADE.match(_str(linha.IDADE))
+        entradas.append(QueueEntry(
+            hash_medico(unidade, linha.PACIENTE, linha.CHEGADA, dia), unidade,
+            linha.PACIENTE, linha.IDADE, linha.HORA, linha.CHEGADA, linha.PROFISSIONAL, linha.COMPROMISSO,
+            status, minutos,
+            int("idoso" in paciente or (idade is not None and int(idade.group(1)) >= 60)),
+            int("cadeirante" in paciente), int("gestante" in paciente),
+        ))
+    return entradas
+
+def corrigir_texto(texto):
+    """Troca todas as sequências de CORRECOES_TEXTO numa passada só"""
+    return _RE_CORRECOES.sub(lambda m: CORRECOES_TEXTO[m.group()], texto)
+
+def fila_texto(html_content):
+    """
+    Fila de espera só com texto limpo (usada pelo Enpoints/feegow/api_client.py): HTML em bytes
+    latin-1 ou str, entidades e mojibake corrigidos, espaços normalizados e sem o selo "Primeira vez".
+    Vazio vira "nan", como no astype(str) do pandas 2 que montava essa saída.
+    """
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode('iso-8859-1', errors='replace')
+    linhas = []
+    for linha in ler_fila(corrigir_texto(html.unescape(html_content))):
+        valores = [_ESPACOS_TEXTO.sub(" ", _str(v)).strip() for v in linha]
+        valores[2] = _PRIMEIRA_VEZ.sub("", valores[2])
+        linhas.append(LinhaFila(*valores))
+    return linhas
@@ -0,0 +1,182 @@
+import os
+import sys
+import math
+import time
+import socket
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from database_manager import DatabaseManager
+except ImportError:
+    from .database_manager import DatabaseManager
+
+# Divisão das unidades entre réplicas do worker (docker compose up --scale worker=N).
+# Cada réplica mantém leases no banco compartilhado (tabela unidade_leases) para as unidades
+# que consulta, renovados por um heartbeat em segundo plano:
+#   - cota = teto(unidades / réplicas vivas); quem tem mais que a cota solta as sobras
+#   - lease vencido (réplica caiu ou travou) é tomado por outra réplica no próximo heartbeat
+#   - a tomada é um upsert condicional: só grava se o lease é nosso ou já venceu
+# O monitor só consulta e só dá baixa nas unidades cujo lease ainda vale com folga
+# (LEASE_MARGEM_S), então uma réplica atrasada para de gravar antes de outra poder assumir.
+LEASE_ATIVO = os.getenv("LEASE_ATIVO", "1") == "1"
+LEASE_TTL_S = float(os.getenv("LEASE_TTL_S", "30"))
+LEASE_HEARTBEAT_S = float(os.getenv("LEASE_HEARTBEAT_S", "10"))
+LEASE_MARGEM_S = float(os.getenv("LEASE_MARGEM_S", "5"))
+# No Docker o hostname é o id do container: um container reiniciado retoma os próprios leases na hora
+REPLICA_ID = os.getenv("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+class LeaseManager:
+    """Leases de um recurso (ex: monitor_medico) para as unidades desta réplica"""
+
+    def __init__(self, recurso, unidades, db=None, dono=REPLICA_ID, ttl=LEASE_TTL_S,
+                 heartbeat=LEASE_HEARTBEAT_S, margem=LEASE_MARGEM_S, ativo=LEASE_ATIVO):
+        self.recurso = recurso
+        self.unidades = list(unidades)
+        self.db = db or DatabaseManager(fonte="leases")
+        self.dono = dono
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.margem = margem
+        self.ativo = ativo
+        # Sem leases (LEASE_ATIVO=0) a réplica fica com todas as unidades, como antes
+        self._minhas = set(self.unidades) if not ativo else set()
+        self._expira_em = math.inf if not ativo else 0.0
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._metricas = {"heartbeats": 0, "erros": 0, "tomadas": 0, "soltas": 0}
+
+    def _chave(self, unidade):
+        return str(unidade)
+
+    def renovar(self):
+        """Um heartbeat: marca presença, renova as nossas, solta sobras e toma as livres até a cota"""
+        if not self.ativo:
+            return self.minhas()
+        agora = time.time()
+        leases, replicas = self.db.carregar_leases(self.recurso)
+        vivas = {dono for dono, visto_em in replicas.items() if visto_em >= agora - self.ttl} | {self.dono}
+        cota = math.ceil(len(self.unidades) / len(vivas))
+
+        nossas, livres = [], []
+        for unidade in self.unidades:
+            dono, expira_em = leases.get(self._chave(unidade), (None, 0.0))
+            if dono == self.dono and expira_em >= agora:
+                nossas.append(unidade)
+            elif dono is None or expira_em < agora:
+                livres.append(unidade)
+
+        # Réplica nova entrou: as sobras são encurtadas até a margem e param de ser consultadas já
+        soltar = nossas[cota:]
+        querer = nossas[:cota] + livres[:max(0, cota - len(nossas))]
+        expira_em = agora + self.ttl
+        with self._lock:
+            for unidade in soltar:
+                self._minhas.discard(unidade)
+        renovadas = self.db.renovar_leases(self.recurso, self.dono, querer, expira_em, agora,
+                                           soltar=soltar, soltar_em=agora + self.margem)
+        minhas = {u for u in querer if self._chave(u) in renovadas}
+
+        with self._lock:
+            tomadas = minhas - self._minhas
+            soltas = self._minhas - minhas
+            self._minhas = minhas
+            self._expira_em = expira_em
+            self._metricas["heartbeats"] += 1
+            self._metricas["tomadas"] += len(tomadas)
+            self._metricas["soltas"] += len(soltas) + len(soltar)
+        if tomadas or soltas or soltar:
+            print(f"   [LEASE] {self.recurso} ({self.dono}): {sorted(minhas, key=str)} "
+                  f"de {len(self.unidades)} unidades, {len(vivas)} réplica(s).")
+        return minhas
+
+    def minhas(self):
+        """Unidades que esta réplica pode consultar e gravar agora"""
+        with self._lock:
+            if time.time() >= self._expira_em - self.margem:
+                # Heartbeat atrasado (banco travado?): não grava nada até renovar
+                return set()
+            return set(self._minhas)
+
+    def possui(self, unidade):
+        return unidade in self.minhas()
+
+    def todas(self):
+        """True se esta réplica está com todas as unidades (não há outra dividindo)"""
+        return len(self.minhas()) == len(self.unidades)
+
+    def limitar_espera(self, espera):
+        """Dividindo unidades, o monitor acorda a cada heartbeat para assumir as que vagarem"""
+        return espera if self.todas() else min(espera, self.heartbeat)
+
+    # --- HEARTBEAT EM SEGUNDO PLANO ---
+    def iniciar(self):
+        """Primeiro heartbeat na hora e depois a thread (idempotente). Devolve o próprio manager"""
+        if not self.ativo:
+            return self
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return self
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._loop, name=f"lease-{self.recurso}", daemon=True)
+        self._heartbeat()
+        self._thread.start()
+        return self
+
+    def parar(self, liberar=True):
+        """Para o heartbeat e devolve as unidades para as outras réplicas assumirem na hora"""
+        self._parar.set()
+        if not self.ativo:
+            return
+        with self._lock:
+            self._minhas = set()
+            self._expira_em = 0.0
+        if liberar:
+            try:
+                self.db.liberar_leases(self.recurso, self.dono)
+            except Exception as e:
+                print(f"   [LEASE] Erro ao liberar {self.recurso}: {e}")
+
+    def _heartbeat(self):
+        try:
+            self.renovar()
+        except Exception as e:
+            with self._lock:
+                self._metricas["erros"] += 1
+            print(f"   [LEASE] Erro no heartbeat de {self.recurso}: {e}")
+
+    def _loop(self):
+        while not self._parar.wait(self.heartbeat):
+            self._heartbeat()
+
+    def metricas(self):
+        with self._lock:
+            m = dict(self._metricas)
+        m["dono"] = self.dono
+        m["unidades"] = sorted((str(u) for u in self.minhas()))
+        return m
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def leases(recurso, unidades):
+    """Um LeaseManager por recurso por processo (um job recriado pelo supervisor reaproveita o mesmo)"""
+    with _managers_lock:
+        manager = _managers.get(recurso)
+        if manager is None:
+            manager = _managers[recurso] = LeaseManager(recurso, unidades)
+    return manager.iniciar()
+
+def metricas_leases():
+    with _managers_lock:
+        managers = list(_managers.values())
+    return {m.recurso: m.metricas() for m in managers}
+
+def parar_leases():
+    """Encerramento do processo: solta todas as unidades desta réplica"""
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        manager.parar()
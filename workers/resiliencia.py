@@ -0,0 +1,199 @@
+import os
+import sys
+import time
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit
+import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from limitador import limitador, NORMAL
+    from cliente_http import cliente_http, timeout_http, HTTP_TIMEOUT_S
+except ImportError:
+    from .limitador import limitador, NORMAL
+    from .cliente_http import cliente_http, timeout_http, HTTP_TIMEOUT_S
+
+# Camada de resiliência das chamadas HTTP dos workers.
+#   - Circuit breaker por host (franchising, core, app, api.feegow, dashboard.clinia): depois de
+#     CB_LIMITE_FALHAS falhas seguidas o host fica "aberto" e as chamadas falham na hora, sem
+#     esperar o timeout. Passados CB_ABERTO_S segundos uma única requisição de teste
+#     (meio-aberto) decide se ele volta a fechar ou fica aberto por mais tempo (dobra até CB_ABERTO_MAX_S).
+#   - Prazo por ciclo: o timeout de cada chamada é cortado pelo que sobra do orçamento do ciclo,
+#     então uma unidade lenta não segura o ciclo inteiro.
+#   - Limite de taxa por host compartilhado entre processos, com prioridade (limitador.py).
+#   - Sem `cliente`, a chamada sai pelo pool de conexões do processo (cliente_http.py).
+# Os breakers valem para o processo todo (todos os jobs do supervisor enxergam o mesmo estado).
+CB_LIMITE_FALHAS = int(os.getenv("CB_LIMITE_FALHAS", "5"))
+CB_ABERTO_S = float(os.getenv("CB_ABERTO_S", "30"))
+CB_ABERTO_MAX_S = float(os.getenv("CB_ABERTO_MAX_S", "300"))
+PRAZO_CICLO_S = float(os.getenv("PRAZO_CICLO_S", "25"))
+
+class CircuitoAberto(requests.RequestException):
+    """Host com o circuito aberto: a chamada nem foi feita"""
+
+class PrazoEsgotado(requests.Timeout):
+    """O orçamento de tempo do ciclo acabou antes da chamada"""
+
+class CircuitBreaker:
+    FECHADO, ABERTO, MEIO_ABERTO = "fechado", "aberto", "meio_aberto"
+
+    def __init__(self, host, limite_falhas=CB_LIMITE_FALHAS, aberto_s=CB_ABERTO_S, aberto_max_s=CB_ABERTO_MAX_S):
+        self.host = host
+        self.limite_falhas = limite_falhas
+        self.aberto_s = aberto_s
+        self.aberto_max_s = aberto_max_s
+        self.estado = self.FECHADO
+        self._falhas = 0
+        self._espera = aberto_s
+        self._reabre_em = 0.0
+        self._sonda = False
+        self._lock = threading.Lock()
+        self._metricas = {"chamadas": 0, "falhas": 0, "rejeitadas": 0, "aberturas": 0, "ultima_abertura": None}
+
+    def permitir(self):
+        """True se a chamada pode seguir. No meio-aberto só passa uma sonda por vez"""
+        with self._lock:
+            if self.estado == self.ABERTO and time.monotonic() >= self._reabre_em:
+                self.estado = self.MEIO_ABERTO
+                self._sonda = False
+            if self.estado == self.FECHADO or (self.estado == self.MEIO_ABERTO and not self._sonda):
+                self._sonda = self.estado == self.MEIO_ABERTO
+                self._metricas["chamadas"] += 1
+                return True
+            self._metricas["rejeitadas"] += 1
+            return False
+
+    def sucesso(self):
+        with self._lock:
+            if self.estado != self.FECHADO:
+                print(f"   [CIRCUITO] {self.host} fechado de novo.")
+            self.estado = self.FECHADO
+            self._falhas = 0
+            self._espera = self.aberto_s
+            self._sonda = False
+
+    def falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._metricas["falhas"] += 1
+            if self.estado == self.MEIO_ABERTO:
+                # A sonda falhou: fica aberto por mais tempo
+                self._espera = min(self._espera * 2, self.aberto_max_s)
+            elif self._falhas < self.limite_falhas:
+                return
+            self.estado = self.ABERTO
+            self._sonda = False
+            self._reabre_em = time.monotonic() + self._espera
+            self._metricas["aberturas"] += 1
+            self._metricas["ultima_abertura"] = datetime.now().strftime('%H:%M:%S')
+        print(f"   [CIRCUITO] {self.host} aberto por {self._espera:g}s ({self._falhas} falhas seguidas).")
+
+    def liberar(self):
+        """Chamada interrompida sem dizer nada sobre o host (ex: prazo do ciclo): libera a sonda"""
+        with self._lock:
+            self._sonda = False
+
+    def metricas(self):
+        with self._lock:
+            m = dict(self._metricas)
+            m["estado"] = self.estado
+            m["falhas_seguidas"] = self._falhas
+            if self.estado == self.ABERTO:
+                m["reabre_em_s"] = round(max(0.0, self._reabre_em - time.monotonic()), 1)
+        return m
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def breaker(host):
+    """Um breaker por host por processo"""
+    with _breakers_lock:
+        cb = _breakers.get(host)
+        if cb is None:
+            cb = _breakers[host] = CircuitBreaker(host)
+        return cb
+
+def metricas_breakers():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {cb.host: cb.metricas() for cb in breakers}
+
+class Prazo:
+    """Orçamento de tempo de um ciclo de polling"""
+
+    def __init__(self, segundos=PRAZO_CICLO_S):
+        self.segundos = segundos
+        self.fim = time.monotonic() + segundos
+
+    def restante(self):
+        return max(0.0, self.fim - time.monotonic())
+
+    def esgotado(self):
+        return self.restante() <= 0
+
+    def timeout(self, padrao):
+        """Timeout da próxima chamada: o padrão dela, cortado pelo que sobra do ciclo"""
+        restante = self.restante()
+        if restante <= 0:
+            raise PrazoEsgotado(f"prazo do ciclo ({self.segundos:g}s) esgotado")
+        return min(padrao, restante)
+
+def _segundos_retry_after(resp, padrao=30.0):
+    try:
+        return float(resp.headers.get("Retry-After", padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+def requisitar(metodo, url, cliente=None, timeout=HTTP_TIMEOUT_S, prazo=None, prioridade=NORMAL, **kwargs):
+    """
+    requests.request (pool compartilhado, ou a sessão `cliente`) passando pelo breaker do host,
+    pelo limite de taxa e pelo prazo do ciclo.
+    Erro de rede, timeout e 5xx contam como falha do host; qualquer outra resposta é sucesso.
+    Levanta CircuitoAberto / PrazoEsgotado (ambos requests.RequestException) sem fazer a chamada.
+    """
+    host = urlsplit(url).hostname or url
+    cb = breaker(host)
+    if prazo is not None:
+        prazo.timeout(timeout)
+    if not cb.permitir():
+        raise CircuitoAberto(f"{cb.host}: circuito aberto")
+
+    # Espera a vez no limite de taxa (no máximo o que sobra do ciclo)
+    if not limitador().adquirir(host, prioridade, prazo.restante() if prazo is not None else None):
+        cb.liberar()
+        raise PrazoEsgotado(f"{host}: sem capacidade no limite de taxa dentro do prazo do ciclo")
+
+    cortado = False
+    if prazo is not None:
+        try:
+            limite = prazo.timeout(timeout)
+        except PrazoEsgotado:
+            cb.liberar()
+            raise
+        cortado = limite < timeout
+        timeout = limite
+
+    try:
+        resp = (cliente or cliente_http()).request(metodo, url, timeout=timeout_http(timeout, prazo is not None),
+                                                   **kwargs)
+    except requests.Timeout:
+        if cortado:
+            # Timeout encurtado pelo prazo do ciclo não é culpa do host
+            cb.liberar()
+        else:
+            cb.falha()
+        raise
+    except Exception:
+        cb.falha()
+        raise
+
+    if resp.status_code >= 500:
+        cb.falha()
+    else:
+        cb.sucesso()
+    if resp.status_code == 429:
+        # Throttling do servidor: todos os processos seguram as chamadas a este host
+        limitador().penalizar(host, _segundos_retry_after(resp))
+    return resp
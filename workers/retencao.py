@@ -0,0 +1,235 @@
+import os
+import json
+import sqlite3
+import datetime
+from urllib.request import pathname2url
+
+# Retenção das tabelas quentes de fila.
+# Linhas de dias já encerrados saem de recepcao_historico/espera_medica_historico e vão,
+# em lotes pequenos, para tabelas mensais (ex: recepcao_historico_2026_01) num banco de
+# arquivo anexado. Assim as queries do "hoje" só enxergam poucos dias de dados, e o
+# auto_vacuum=INCREMENTAL devolve ao disco as páginas liberadas no banco principal.
+# Banco criado antes disso precisa de um VACUUM completo, uma vez, com os workers parados:
+#   python workers/retencao.py vacuum
+
+RETENCAO_DIAS_QUENTE = int(os.getenv("RETENCAO_DIAS_QUENTE", "7"))      # dias mantidos nas tabelas quentes
+RETENCAO_MESES_ARQUIVO = int(os.getenv("RETENCAO_MESES_ARQUIVO", "24"))  # meses mantidos no arquivo (0 = para sempre)
+RETENCAO_LOTE = int(os.getenv("RETENCAO_LOTE", "2000"))                  # linhas movidas por transação
+VACUUM_PAGINAS = int(os.getenv("RETENCAO_VACUUM_PAGINAS", "4000"))       # páginas liberadas por execução
+
+TABELAS_ARQUIVADAS = ('recepcao_historico', 'espera_medica_historico')
+CHAVE_ULTIMA_EXECUCAO = 'retencao_ultimo_dia'
+
+def caminho_arquivo(db_path):
+    return os.getenv("DB_ARQUIVO_PATH") or os.path.join(os.path.dirname(db_path), 'dados_clinica_arquivo.db')
+
+def _fechar_transacao(conn):
+    if conn.in_transaction:
+        conn.commit()
+
+def anexar_arquivo(conn, db_path):
+    """Anexa o banco de arquivo como 'arq' (criando com auto_vacuum incremental) e monta as views"""
+    _fechar_transacao(conn)
+    anexados = {row[1] for row in conn.execute("PRAGMA database_list")}
+    if 'arq' not in anexados:
+        caminho = caminho_arquivo(db_path)
+        novo = not os.path.exists(caminho)
+        conn.execute("ATTACH DATABASE ? AS arq", (caminho,))
+        if novo:
+            # auto_vacuum só pode ser definido antes da primeira tabela
+            conn.execute("PRAGMA arq.auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA arq.journal_mode = WAL")
+    criar_views(conn)
+
+def tabelas_mensais(conn, tabela):
+    linhas = conn.execute(
+        "SELECT name FROM arq.sqlite_master WHERE type = 'table' AND name GLOB ? ORDER BY name",
+        (f"{tabela}_[0-9][0-9][0-9][0-9]_[0-9][0-9]",)
+    ).fetchall()
+    return [nome for (nome,) in linhas]
+
+def _colunas(conn, esquema, tabela):
+    return [row[1] for row in conn.execute(f"PRAGMA {esquema}.table_info({tabela})")]
+
+def _garantir_tabela_mensal(conn, tabela, destino):
+    """Cria a tabela mensal com o mesmo DDL (e PK) da tabela quente, ou completa colunas novas"""
+    existentes = _colunas(conn, 'arq', destino)
+    if not existentes:
+        ddl = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (tabela,)
+        ).fetchone()[0]
+        conn.execute(f"CREATE TABLE arq.{destino} " + ddl[ddl.index('('):])
+        return
+    tipos = {row[1]: row[2] for row in conn.execute(f"PRAGMA main.table_info({tabela})")}
+    for coluna, tipo in tipos.items():
+        if coluna not in existentes:
+            conn.execute(f"ALTER TABLE arq.{destino} ADD COLUMN {coluna} {tipo}")
+
+def _anexado(conn):
+    return 'arq' in {row[1] for row in conn.execute("PRAGMA database_list")}
+
+def criar_views(conn):
+    """
+    Views TEMP <tabela>_completo = tabela quente UNION ALL todas as tabelas mensais.
+    São por conexão (o SQLite não deixa view do banco principal apontar para banco anexado):
+    quem lê o histórico usa conectar_leitura() (ex: ver_tabela_medica.py, ver_tabela_recepcao.py).
+    Sem o arquivo anexado a view cobre só a tabela quente.
+    """
+    anexado = _anexado(conn)
+    for tabela in TABELAS_ARQUIVADAS:
+        colunas = _colunas(conn, 'main', tabela)
+        if not colunas:
+            continue
+        partes = [f"SELECT {', '.join(colunas)} FROM main.{tabela}"]
+        for mensal in (tabelas_mensais(conn, tabela) if anexado else []):
+            existentes = set(_colunas(conn, 'arq', mensal))
+            campos = [c if c in existentes else f"NULL AS {c}" for c in colunas]
+            partes.append(f"SELECT {', '.join(campos)} FROM arq.{mensal}")
+        conn.execute(f"DROP VIEW IF EXISTS temp.{tabela}_completo")
+        conn.execute(f"CREATE TEMP VIEW {tabela}_completo AS " + " UNION ALL ".join(partes))
+
+def _uri_leitura(caminho):
+    return f"file:{pathname2url(os.path.abspath(caminho))}?mode=ro"
+
+def conectar_leitura(db_path):
+    """
+    Conexão só de leitura para relatórios e scripts: banco principal + arquivo anexado (se já
+    existir) e as views <tabela>_completo com o histórico inteiro. Quem abre fecha.
+    """
+    conn = sqlite3.connect(_uri_leitura(db_path), uri=True)
+    caminho = caminho_arquivo(db_path)
+    if os.path.exists(caminho):
+        conn.execute("ATTACH DATABASE ? AS arq", (_uri_leitura(caminho),))
+    criar_views(conn)
+    return conn
+
+def _proximo_mes(mes):
+    ano, m = int(mes[:4]), int(mes[5:7])
+    return f"{ano + (m == 12):04d}-{(m % 12) + 1:02d}"
+
+def arquivar_tabela(conn, tabela, corte, lote=RETENCAO_LOTE):
+    """Move as linhas com dia_referencia < corte, mês a mês, em transações de até `lote` linhas"""
+    movidas = {}
+    colunas = ", ".join(_colunas(conn, 'main', tabela))
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (menor_dia,) = conn.execute(
+                f"SELECT MIN(dia_referencia) FROM main.{tabela} WHERE dia_referencia < ?", (corte,)
+            ).fetchone()
+            if not menor_dia:
+                conn.commit()
+                break
+
+            mes = menor_dia[:7]
+            destino = f"{tabela}_{mes.replace('-', '_')}"
+            _garantir_tabela_mensal(conn, tabela, destino)
+
+            rowids = [r[0] for r in conn.execute(
+                f"""SELECT rowid FROM main.{tabela}
+                    WHERE dia_referencia >= ? AND dia_referencia < ? AND dia_referencia < ?
+                    LIMIT ?""",
+                (f"{mes}-01", f"{_proximo_mes(mes)}-01", corte, lote)
+            )]
+            ids_json = json.dumps(rowids)
+            # INSERT OR REPLACE: se um lote anterior copiou e caiu antes do DELETE, repetir é seguro
+            conn.execute(
+                f"""INSERT OR REPLACE INTO arq.{destino} ({colunas})
+                    SELECT {colunas} FROM main.{tabela} WHERE rowid IN (SELECT value FROM json_each(?))""",
+                (ids_json,)
+            )
+            conn.execute(f"DELETE FROM main.{tabela} WHERE rowid IN (SELECT value FROM json_each(?))", (ids_json,))
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        movidas[mes] = movidas.get(mes, 0) + len(rowids)
+    return movidas
+
+def expurgar_arquivo(conn, hoje, meses=RETENCAO_MESES_ARQUIVO):
+    """Descarta tabelas mensais mais antigas que a janela de retenção do arquivo"""
+    if meses <= 0:
+        return []
+    limite = hoje.year * 12 + hoje.month - 1 - meses
+    removidas = []
+    for tabela in TABELAS_ARQUIVADAS:
+        for mensal in tabelas_mensais(conn, tabela):
+            ano, mes = int(mensal[-7:-3]), int(mensal[-2:])
+            if ano * 12 + mes - 1 < limite:
+                conn.execute(f"DROP TABLE arq.{mensal}")
+                removidas.append(mensal)
+    return removidas
+
+def garantir_auto_vacuum(conn):
+    """
+    Liga auto_vacuum=INCREMENTAL no banco principal. Em banco já existente a mudança
+    só vale depois de um VACUUM completo: reescreve o arquivo inteiro e segura a escrita
+    durante todo o processo, por isso roda só pela linha de comando (main abaixo), nunca no ciclo.
+    """
+    if conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] == 2:
+        return False
+    _fechar_transacao(conn)
+    conn.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM main")
+    return True
+
+def reivindicar_execucao(conn, hoje_iso):
+    """Marca a retenção de hoje na tabela config; só um processo por dia recebe True"""
+    _fechar_transacao(conn)
+    with conn:
+        cur = conn.execute("""
+            INSERT INTO config (chave, valor) VALUES (?, ?)
+            ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor WHERE valor < excluded.valor
+        """, (CHAVE_ULTIMA_EXECUCAO, hoje_iso))
+    return cur.rowcount == 1
+
+def executar_retencao(conn, db_path, hoje=None, dias_quente=RETENCAO_DIAS_QUENTE):
+    """Uma rodada completa: arquiva, expurga o arquivo antigo e libera páginas. Retorna um resumo"""
+    hoje = hoje or datetime.date.today()
+    corte = (hoje - datetime.timedelta(days=max(dias_quente, 1) - 1)).isoformat()
+
+    resumo = {"corte": corte, "movidas": {}, "expurgadas": []}
+    if conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] != 2:
+        # Sem auto_vacuum incremental as páginas liberadas ficam no arquivo (reaproveitadas, não devolvidas)
+        print("   [RETENÇÃO] Banco principal sem auto_vacuum=INCREMENTAL: rode 'python workers/retencao.py vacuum'")
+
+    anexar_arquivo(conn, db_path)
+    for tabela in TABELAS_ARQUIVADAS:
+        movidas = arquivar_tabela(conn, tabela, corte)
+        if movidas:
+            resumo["movidas"][tabela] = movidas
+
+    with conn:
+        resumo["expurgadas"] = expurgar_arquivo(conn, hoje)
+    criar_views(conn)
+
+    _fechar_transacao(conn)
+    conn.execute(f"PRAGMA main.incremental_vacuum({VACUUM_PAGINAS})").fetchall()
+    conn.execute(f"PRAGMA arq.incremental_vacuum({VACUUM_PAGINAS})").fetchall()
+    return resumo
+
+def main(argv):
+    """Manutenção manual: 'vacuum' liga o auto_vacuum incremental no banco principal (com os workers parados)"""
+    if argv[1:] != ["vacuum"]:
+        print("uso: python workers/retencao.py vacuum")
+        return 2
+    try:
+        from database_manager import DB_PATH
+    except ImportError:
+        from .database_manager import DB_PATH
+
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        inicio = datetime.datetime.now()
+        if garantir_auto_vacuum(conn):
+            segundos = (datetime.datetime.now() - inicio).total_seconds()
+            print(f"[RETENÇÃO] VACUUM concluído em {segundos:.1f}s: auto_vacuum=INCREMENTAL em {DB_PATH}")
+        else:
+            print(f"[RETENÇÃO] {DB_PATH} já está com auto_vacuum=INCREMENTAL")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv))
@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Os testes importam os módulos como os workers rodam (de dentro da pasta workers)
+PASTA_WORKERS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PASTA_WORKERS)
+
+# Limite de taxa compartilhado (limitador.py) fora da pasta data/ do projeto
+os.environ.setdefault("RATE_LIMIT_DB", os.path.join(tempfile.mkdtemp(), "rate_limit.db"))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def ler_fixture(nome, modo="r"):
+    with open(os.path.join(FIXTURES, nome), modo, **({} if "b" in modo else {"encoding": "utf-8"})) as f:
+        return f.read()
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """DatabaseManager num banco temporário, gravando direto (sem o db_writer)"""
+    import database_manager
+    monkeypatch.setattr(database_manager, "DB_PATH", str(tmp_path / "dados_clinica.db"))
+    return database_manager.DatabaseManager(writer=False)
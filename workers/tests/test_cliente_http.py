@@ -0,0 +1,15 @@
+from urllib3.util.retry import Retry
+from cliente_http import nova_sessao, adaptador_http, HTTP_POOL_CONEXOES
+
+def test_sessoes_compartilham_o_pool():
+    a, b = nova_sessao(), nova_sessao(guardar_cookies=False)
+    assert a.get_adapter("https://core.feegow.com") is adaptador_http()
+    assert b.get_adapter("https://api.feegow.com") is adaptador_http()
+    assert a.headers["Accept-Encoding"] == "gzip, deflate"
+
+def test_sessao_com_retry_proprio():
+    retry = Retry(total=3, status_forcelist=[429, 500, 502, 503, 504])
+    adaptador = nova_sessao(retry=retry).get_adapter("https://api.feegow.com")
+    assert adaptador is not adaptador_http()
+    assert adaptador.max_retries is retry
+    assert adaptador._pool_maxsize == HTTP_POOL_CONEXOES
@@ -0,0 +1,90 @@
+import sys
+import hashlib
+import datetime
+import subprocess
+import pandas as pd
+from conftest import ler_fixture, PASTA_WORKERS
+
+def _fila(linhas):
+    return pd.DataFrame(linhas, columns=['UNIDADE', 'PACIENTE', 'IDADE', 'HORA', 'PROFISSIONAL', 'COMPROMISSO',
+                                         'CHEGADA', 'STATUS_DETECTADO', 'ESPERA_MINUTOS'])
+
+def test_hash_medico_com_celula_vazia_igual_ao_fstring_por_linha(db):
+    hoje = datetime.date.today().isoformat()
+    df = _fila([
+        ("Centro", "Ana", 30, "08:00", "Dr A", "Consulta", "07:50", "Espera", 10),
+        ("Centro", float("nan"), 61, "08:10", "Dr A", "Consulta", "07:55", "Espera", 5),
+        ("Centro", "Bia", 45, "08:20", "Dr B", "Retorno", float("nan"), "Espera", 0),
+    ])
+
+    hashes = db.gerar_hashes_medicos(df, hoje)
+
+    # Mesmo texto do f-string por linha de antes do lote: célula vazia vira "nan"
+    esperados = [hashlib.md5(f"Centro-{p}-{c}-{hoje}".encode()).hexdigest()
+                 for p, c in (("Ana", "07:50"), ("nan", "07:55"), ("Bia", "nan"))]
+    assert hashes == esperados
+
+def test_salvar_dados_medicos_grava_unidade_com_celula_vazia(db):
+    hoje = datetime.date.today().isoformat()
+    df = _fila([
+        ("Centro", "Ana", 30, "08:00", "Dr A", "Consulta", "07:50", "Espera", 10),
+        ("Centro", float("nan"), 61, "08:10", "Dr A", "Consulta", "07:55", "Espera", 5),
+        ("Centro", "Bia", 45, "08:20", "Dr B", "Retorno", float("nan"), "Espera", 0),
+    ])
+
+    assert db.salvar_dados_medicos(df) == {'inseridos': 3, 'atualizados': 0}
+
+    linhas = dict(db._conn().execute(
+        "SELECT paciente, dt_chegada FROM espera_medica_historico ORDER BY dt_chegada").fetchall())
+    assert linhas["Ana"] == f"{hoje} 07:50:00"
+    assert linhas[None] == f"{hoje} 07:55:00"
+    # Chegada vazia: NULL (e não "YYYY-MM-DD nan:00")
+    assert linhas["Bia"] is None
+
+def _linhas_gravadas(db):
+    return db._conn().execute("""
+        SELECT hash_id, unidade_nome, paciente, idade, hora_agendada, profissional, especialidade, dt_chegada,
+               status, espera_min, prioridade_idoso, prioridade_cadeirante, prioridade_gestante
+        FROM espera_medica_historico ORDER BY hash_id
+    """).fetchall()
+
+def test_fila_medica_grava_o_mesmo_pelos_dois_caminhos(db, tmp_path, monkeypatch):
+    import database_manager
+    from feegow_core import FeegowSystem
+    html = ler_fixture("fila_celulas_vazias.html")
+    sistema = FeegowSystem()
+
+    assert db.salvar_fila_medica(sistema.parse_fila(html, "Ouro Verde")) == {'inseridos': 3, 'atualizados': 0}
+    monkeypatch.setattr(database_manager, "DB_PATH", str(tmp_path / "dataframe.db"))
+    outro = database_manager.DatabaseManager(writer=False)
+    assert outro.salvar_dados_medicos(sistema.parse_html(html, "Ouro Verde")) == {'inseridos': 3, 'atualizados': 0}
+
+    linhas = _linhas_gravadas(db)
+    assert linhas == _linhas_gravadas(outro)
+    hoje = datetime.date.today().isoformat()
+    # Chegada vazia: NULL (e não "YYYY-MM-DD nan:00")
+    assert sorted(linha[7] or "" for linha in linhas) == ["", f"{hoje} 07:40:00", f"{hoje} 07:55:00"]
+
+def test_persistir_unidade_atualiza_espera_de_quem_continua(db):
+    from feegow_core import FeegowSystem
+    from estado_fila import QueueState
+    from monitor_medico import persistir_unidade
+    entradas = FeegowSystem().parse_fila(ler_fixture("fila_celulas_vazias.html"), "Ouro Verde")
+    estado = QueueState(db.carregar_fila_ativa_medicos)
+    persistir_unidade(db, estado, "Ouro Verde", entradas)
+
+    # Próximo ciclo: mesma fila e mesmos status, o Feegow mostra um minuto a mais para quem espera
+    for e in entradas:
+        if e.status == "Espera":
+            e.espera_min += 1
+    assert persistir_unidade(db, estado, "Ouro Verde", entradas) == (3, False)
+
+    esperas = dict(db._conn().execute("SELECT hash_id, espera_min FROM espera_medica_historico"))
+    assert esperas == {e.hash_id: e.espera_min for e in entradas}
+    # Sem mudança, nenhuma linha é reescrita
+    assert db.atualizar_espera_medicos(entradas) == 0
+
+def test_monitor_medico_nao_carrega_pandas():
+    codigo = "import sys, monitor_medico; print('pandas' in sys.modules, 'numpy' in sys.modules)"
+    saida = subprocess.run([sys.executable, "-c", codigo], cwd=PASTA_WORKERS, capture_output=True, text=True, check=True)
+    assert saida.stdout.split() == ["False", "False"]
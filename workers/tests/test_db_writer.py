@@ -0,0 +1,18 @@
+import pytest
+from db_writer import DatabaseWriter
+
+def test_pedido_com_parametro_invalido_nao_derruba_o_writer(db):
+    writer = DatabaseWriter(db.db_path, flush_interval=0.01).start()
+    try:
+        sql = "INSERT INTO integrations_config (service, unit_id) VALUES (?, ?)"
+        # int maior que 64 bits: OverflowError do sqlite3, não sqlite3.Error
+        with pytest.raises(OverflowError):
+            writer.executar("teste", [(sql, ("ruim", 2 ** 70), False)], timeout=5)
+
+        assert writer.executar("teste", [(sql, ("bom", "2"), False)], timeout=5) == [([], 1)]
+        assert writer._thread.is_alive()
+        linhas = db._conn().execute("SELECT service, unit_id FROM integrations_config").fetchall()
+        assert linhas == [("bom", "2")]
+        assert writer.metricas()["fontes"]["teste"]["erros"] == 1
+    finally:
+        writer.stop()
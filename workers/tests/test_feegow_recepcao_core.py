@@ -0,0 +1,52 @@
+import asyncio
+import requests
+from feegow_recepcao_core import FeegowRecepcaoSystem
+from cliente_http import timeout_http
+
+class BrokerFixo:
+    def cookie_core(self):
+        return "sessao=abc"
+
+class Resposta:
+    status_code = 200
+
+    def __init__(self, dados):
+        self._dados = dados
+
+    def json(self):
+        return self._dados
+
+class SessaoFalsa:
+    """Guarda o timeout de cada chamada; a unidade 3 estoura o timeout do requests"""
+
+    def __init__(self):
+        self.timeouts = {}
+
+    def request(self, metodo, url, timeout=None, **kwargs):
+        uid = int(url.rsplit("=", 1)[1])
+        self.timeouts[uid] = timeout
+        if uid == 3:
+            raise requests.ReadTimeout("read timed out")
+        return Resposta([{"id": uid, "UnidadeID": uid}])
+
+def sistema_falso():
+    sistema = FeegowRecepcaoSystem(broker=BrokerFixo())
+    sistema.session = SessaoFalsa()
+    return sistema
+
+def test_timeout_vai_na_chamada_http():
+    sistema = sistema_falso()
+    dados, msg = sistema.obter_dados_brutos(unidades=(2, 3))
+
+    assert [d["id"] for d in dados] == [2]
+    assert msg == "UID 3: timeout (10s)"
+    assert sistema.session.timeouts == {2: timeout_http(10), 3: timeout_http(10)}
+
+def test_versao_sincrona_dentro_de_loop():
+    sistema = sistema_falso()
+
+    async def dentro_do_loop():
+        return sistema.obter_dados_brutos(unidades=(2, 12))
+
+    dados, msg = asyncio.run(dentro_do_loop())
+    assert ([d["id"] for d in dados], msg) == ([2, 12], "OK")
@@ -0,0 +1,50 @@
+import asyncio
+import monitor_service
+import worker_clinia
+from agendador import PollScheduler
+from monitor_service import Job, Supervisor
+
+def test_ciclo_com_erro_entra_em_backoff(db, monkeypatch):
+    monkeypatch.setattr(monitor_service, "SUPERVISOR_BACKOFF_MIN", 0.01)
+    monkeypatch.setattr(monitor_service, "SUPERVISOR_MAX_FALHAS", 3)
+    supervisor = Supervisor([])
+    chamadas = []
+
+    def process_and_save():
+        chamadas.append(1)
+        if len(chamadas) == 3:
+            supervisor.encerrar()
+        raise RuntimeError("dashboard.clinia fora do ar")
+
+    monkeypatch.setattr(worker_clinia, "process_and_save", process_and_save)
+
+    def fabrica():
+        monitor = worker_clinia.MonitorClinia()
+        # Sempre aberta e sem intervalo mínimo: todo ciclo chama a Clinia
+        monitor.agendador = PollScheduler(['clinia'], horario="00:00-24:00", dias="0-6", intervalo_min=0)
+        return monitor.ciclo
+
+    job = Job("worker_clinia", fabrica)
+    backoffs = []
+    falhou = job.falhou
+    monkeypatch.setattr(job, "falhou", lambda erro: backoffs.append(falhou(erro)) or backoffs[-1])
+
+    async def executar():
+        supervisor._parar = asyncio.Event()
+        supervisor._semaforo = asyncio.Semaphore(1)
+        await supervisor._executar_job(job)
+
+    asyncio.run(executar())
+
+    m = job.metricas()
+    assert (m["ciclos"], m["falhas"], m["reinicios"]) == (0, 3, 1)
+    assert m["ultimo_erro"] == "RuntimeError: dashboard.clinia fora do ar"
+    # Backoff dobra a cada falha seguida; na 3ª o ciclo é descartado para o job ser recriado
+    assert backoffs == [0.01, 0.02, 0.04]
+    assert job.ciclo is None
+
+def test_clinia_ignora_horario_das_clinicas(db):
+    from datetime import datetime
+    agendador = worker_clinia.MonitorClinia().agendador
+    # Domingo de madrugada: fora do HORARIO/DIAS_FUNCIONAMENTO das clínicas, mas a Clinia é consultada
+    assert agendador.aberta('clinia', datetime(2026, 10, 18, 3, 0))
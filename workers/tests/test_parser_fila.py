@@ -0,0 +1,85 @@
+import html
+import hashlib
+from io import StringIO
+import pandas as pd
+import pytest
+from conftest import ler_fixture
+from parser_fila import ler_tabela, entradas_fila, fila_texto, CORRECOES_TEXTO, COLUNAS_FILA
+
+# O pandas 3 leva o rowspan da última linha do <tbody> para o <tfoot>; o 2 (o da imagem) não
+PANDAS_2 = pytest.mark.skipif(int(pd.__version__.split(".")[0]) >= 3, reason="rowspan entre seções como no pandas 2")
+TABELAS = ["fila_30.html", "fila_5.html", "fila_celulas_vazias.html", "fila_moji.html", "fila_vazia.html",
+           pytest.param("core_recepcao.html", marks=PANDAS_2), "extra.html", "poucas_colunas.html"]
+
+COLUNAS_API = ['HORA', 'CHEGADA', 'PACIENTE', 'IDADE', 'PROFISSIONAL', 'COMPROMISSO', 'TEMPO_ESPERA']
+
+def como_dataframe(conteudo):
+    tabela = ler_tabela(conteudo)
+    return pd.DataFrame(tabela.linhas or None, columns=tabela.colunas)
+
+@pytest.mark.parametrize("unescape", [True, False])
+@pytest.mark.parametrize("nome", TABELAS)
+def test_mesmo_resultado_do_read_html(nome, unescape):
+    conteudo = ler_fixture(nome)
+    if unescape:
+        conteudo = html.unescape(conteudo)
+    esperado = pd.read_html(StringIO(conteudo))[0]
+    obtido = como_dataframe(conteudo)
+
+    pd.testing.assert_frame_equal(obtido, esperado, check_column_type=False)
+    # O texto que ia para o banco e para o hash (célula vazia = "nan", não "None")
+    pd.testing.assert_frame_equal(obtido.astype(str), esperado.astype(str), check_column_type=False)
+
+def test_sem_tabela():
+    with pytest.raises(ValueError):
+        ler_tabela(ler_fixture("sem_tabela.html"))
+
+def test_hash_e_vazios_como_no_read_html():
+    conteudo = html.unescape(ler_fixture("fila_celulas_vazias.html"))
+    antigo = pd.read_html(StringIO(conteudo))[0].iloc[:, :len(COLUNAS_FILA)]
+    antigo.columns = COLUNAS_FILA
+
+    entradas = entradas_fila(conteudo, "Ouro Verde", "2026-01-02")
+    esperados = [hashlib.md5(f"Ouro Verde-{p}-{c}-2026-01-02".encode()).hexdigest()
+                 for p, c in zip(antigo['PACIENTE'].tolist(), antigo['CHEGADA'].tolist())]
+
+    assert [e.hash_id for e in entradas] == esperados
+    assert pd.isna(entradas[0].chegada) and pd.isna(entradas[1].paciente)
+    assert [(e.status, e.espera_min, e.prioridade_idoso, e.prioridade_cadeirante) for e in entradas] == [
+        ("Espera", 12, 1, 0), ("Em Atendimento", 0, 0, 0), ("Espera", 3, 0, 1)]
+
+def parse_fila_html_antigo(html_content):
+    """parse_fila_html do api_client antes do parser lxml: read_html e 18 replaces por coluna"""
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode('iso-8859-1', errors='replace')
+    df = pd.read_html(StringIO(html.unescape(html_content)))[0].iloc[:, :7]
+    df.columns = COLUNAS_API
+    for col in df.columns:
+        df[col] = df[col].astype(str)
+        for errado, correto in CORRECOES_TEXTO.items():
+            df[col] = df[col].str.replace(errado, correto, regex=False)
+        df[col] = df[col].str.replace(r'\s+', ' ', regex=True).str.strip()
+        if col == 'PACIENTE':
+            df[col] = df[col].str.replace('Primeira vez ', '', case=False)
+    # pandas 3: astype(str) mantém NaN; no pandas 2 (o da imagem) o vazio já era "nan"
+    return df.fillna("nan")
+
+@pytest.mark.parametrize("variante", ["str", "bytes", "latin1", "cp1252"])
+@pytest.mark.parametrize("nome", ["fila_moji.html", "fila_30.html", "fila_5.html", "fila_celulas_vazias.html"])
+def test_fila_texto_igual_ao_parse_antigo(nome, variante):
+    conteudo = ler_fixture(nome)
+    # Como a resposta do Feegow chega: UTF-8 lido como latin-1/cp1252 (mojibake) ou bytes
+    conteudo = {
+        "str": conteudo,
+        "bytes": conteudo.encode("utf-8"),
+        "latin1": conteudo.encode("utf-8").decode("iso-8859-1"),
+        "cp1252": conteudo.encode("utf-8").decode("cp1252", errors="replace"),
+    }[variante]
+
+    esperado = parse_fila_html_antigo(conteudo)
+    obtido = pd.DataFrame(fila_texto(conteudo), columns=COLUNAS_API)
+    pd.testing.assert_frame_equal(obtido, esperado, check_dtype=False)
+
+def test_fila_texto_corrige_mojibake():
+    [primeira, *_] = fila_texto(ler_fixture("fila_moji.html"))
+    assert "Ã" not in "".join(primeira)
@@ -0,0 +1,115 @@
+import os
+import re
+import json
+import random
+import datetime
+import pytest
+from conftest import PASTA_WORKERS
+from worker_recepcao import QUERY_FILA_DIA
+
+# Regressão dos índices: banco temporário com o schema das migrações, alguns dias de fila e
+# EXPLAIN QUERY PLAN nas queries reais. As do Next.js são lidas direto dos .ts (db.prepare(`...`)).
+
+RAIZ = os.path.dirname(PASTA_WORKERS)
+DIAS = 30
+LINHAS_POR_DIA = 300
+UNIDADES = [(2, "Ouro Verde"), (3, "Centro Cambui"), (12, "Campinas Shopping")]
+
+# Interpolações dos templates do kpi_engine.ts usadas nas queries da agenda (filtro de grupo ligado)
+VARIAVEIS_TS = {
+    "SQL_DATE_AGENDA": "date",
+    "groupClauseAgenda": "AND procedure_group_key = UPPER(TRIM('Consultas'))",
+}
+
+def sql_do_ts(caminho):
+    """SQL de cada db.prepare(`...`) do arquivo, na ordem em que aparecem"""
+    with open(os.path.join(RAIZ, caminho), encoding="utf-8") as f:
+        fonte = f.read()
+    return [re.sub(r"\$\{(\w+)\}", lambda m: VARIAVEIS_TS.get(m.group(1), m.group(0)), sql)
+            for sql in re.findall(r"\.prepare\(\s*`(.*?)`", fonte, re.S)]
+
+def popular(conn):
+    random.seed(42)
+    hoje = datetime.date.today()
+    rec, med = [], []
+    for d in range(DIAS):
+        dia = (hoje - datetime.timedelta(days=d)).isoformat()
+        for i in range(LINHAS_POR_DIA):
+            uid, nome = random.choice(UNIDADES)
+            ativo = d == 0 and i % 10 == 0
+            status = "Espera" if ativo else "Atendido_Inferido"
+            dt_atend = None if ativo else f"{dia} 10:30:00"
+            rec.append((d * LINHAS_POR_DIA + i, uid, f"A{i}", status, f"{dia} 10:00:00", dt_atend, "Normal", dia))
+            med.append((f"{dia}-{i}", nome, f"Paciente {i}", "40", "10:00", "Dr", "Consulta",
+                        f"{dia} 10:00:00", dt_atend, status, 0, dia))
+    conn.executemany("INSERT INTO recepcao_historico (id, unidade_id, senha, status, dt_chegada, dt_atendimento, tipo_senha, dia_referencia) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rec)
+    conn.executemany("INSERT INTO espera_medica_historico (hash_id, unidade_nome, paciente, idade, hora_agendada, profissional, especialidade, dt_chegada, dt_atendimento, status, espera_min, dia_referencia) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", med)
+    agenda = [
+        (i + 1, (hoje - datetime.timedelta(days=i % 365)).isoformat(), random.choice([1, 3, 6, 7]),
+         100.0, "Geral", "Dr", "Consultas", f"user{i % 20}", random.choice(UNIDADES)[1])
+        for i in range(DIAS * LINHAS_POR_DIA)
+    ]
+    conn.executemany("INSERT INTO feegow_appointments (appointment_id, date, status_id, value, specialty, professional_name, procedure_group, procedure_group_key, scheduled_by, unit_name) VALUES (?, ?, ?, ?, ?, ?, ?, UPPER(TRIM(?7)), ?, ?)", agenda)
+    conn.commit()
+    conn.execute("ANALYZE")
+
+def consultas():
+    """(nome, sql, params, passos_preparatorios, índice esperado no plano)"""
+    from database_manager import DatabaseManager as db
+    hoje = datetime.date.today().isoformat()
+    agora = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    uids = json.dumps([u for u, _ in UNIDADES])
+    nomes = json.dumps([n for _, n in UNIDADES])
+    inicio_mes = datetime.date.today().replace(day=1).isoformat()
+    medic_fila, medic_stats = sql_do_ts("src/app/api/queue/medic/route.ts")
+    prod_usuarios, prod_unidades = sql_do_ts("src/app/api/admin/produtividade/route.ts")
+    kpi_volume = next(sql for sql in sql_do_ts("src/lib/kpi_engine.ts") if "FROM feegow_appointments" in sql)
+
+    return [
+        ("finalizar_ausentes_recepcao", db.SQL_FINALIZAR_RECEPCAO, (agora, hoje, uids),
+         db._passos_presentes('_presentes_recepcao', 'INTEGER', 'INTEGER', [(2, 1)]), "idx_rec_unidade_dia_status"),
+        ("finalizar_ausentes_medicos", db.SQL_FINALIZAR_MEDICOS, (agora, hoje, nomes),
+         db._passos_presentes('_presentes_medicos', 'TEXT', 'TEXT', [("Ouro Verde", "x")]), "idx_med_dia_unidade_status"),
+        ("finalizar_recepcao_por_id", db.SQL_FINALIZAR_RECEPCAO_IDS, (agora, hoje, "[1, 2]"), [], "INTEGER PRIMARY KEY"),
+        ("finalizar_medicos_por_hash", db.SQL_FINALIZAR_MEDICOS_HASHES, (agora, hoje, '["a"]'), [],
+         "sqlite_autoindex_espera_medica_historico_1"),
+        ("aquecimento recepcao", "SELECT unidade_id, id, status, dt_atendimento FROM recepcao_historico WHERE dia_referencia = ? AND status = 'Espera' AND dt_atendimento IS NULL AND unidade_id IN (SELECT value FROM json_each(?))",
+         (hoje, uids), [], "idx_rec_unidade_dia_status"),
+        ("aquecimento medico", "SELECT unidade_nome, hash_id, status FROM espera_medica_historico WHERE dia_referencia = ? AND status IN ('Espera', 'Em Atendimento') AND unidade_nome IN (SELECT value FROM json_each(?))",
+         (hoje, nomes), [], "idx_med_dia_unidade_status"),
+        ("upsert recepcao (contagem)", "SELECT COUNT(*) FROM recepcao_historico WHERE id IN (SELECT value FROM json_each(?))",
+         ("[1, 2]",), [], "INTEGER PRIMARY KEY"),
+        ("upsert medico (contagem)", "SELECT COUNT(*) FROM espera_medica_historico WHERE hash_id IN (SELECT value FROM json_each(?))",
+         ('["a"]',), [], "sqlite_autoindex_espera_medica_historico_1"),
+        ("worker_recepcao.run", QUERY_FILA_DIA, (hoje,), [], "idx_rec_unidade_dia_status"),
+        ("/api/queue/medic fila", medic_fila, (hoje,), [], "idx_med_dia_unidade_status"),
+        ("/api/queue/medic stats", medic_stats, (hoje,), [], "idx_med_dia_unidade_status"),
+        ("produtividade por usuario", prod_usuarios, (inicio_mes, hoje), [], "idx_appt_date_user_status"),
+        ("confirmacao por unidade", prod_unidades, (inicio_mes, hoje), [], "idx_appt_date_unit"),
+        ("kpi agenda por grupo", kpi_volume, (inicio_mes, hoje), [], "idx_appt_date_status_group"),
+    ]
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    import database_manager
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(database_manager, "DB_PATH", str(tmp_path_factory.mktemp("planos") / "planos.db"))
+        conn = database_manager.DatabaseManager(writer=False)._conn()
+        popular(conn)
+        yield conn
+        database_manager.fechar_conexoes()
+
+def test_sem_indices_parciais(conn):
+    indices = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert not indices & {"idx_med_ativos", "idx_rec_ativos"}
+
+@pytest.mark.parametrize("nome, sql, params, preparo, indice", consultas(), ids=[c[0] for c in consultas()])
+def test_plano_usa_indice(conn, nome, sql, params, preparo, indice):
+    import database_manager
+    with conn:
+        database_manager.executar_passos(conn, preparo)
+        plano = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+    assert any(indice in detalhe for detalhe in plano), plano
+    tabelas = ("recepcao_historico", "espera_medica_historico", "feegow_appointments")
+    assert not [d for d in plano for t in tabelas if d.startswith(f"SCAN {t}") and "INDEX" not in d], plano
@@ -0,0 +1,62 @@
+import sqlite3
+import datetime
+from contextlib import closing
+import database_manager
+import retencao
+
+def _inserir_medico(conn, hash_id, dia):
+    conn.execute("INSERT INTO espera_medica_historico (hash_id, unidade_nome, paciente, status, dia_referencia) "
+                 "VALUES (?, 'Centro', 'Ana', 'Atendido_Inferido', ?)", (hash_id, dia))
+
+def test_conectar_leitura_enxerga_historico_arquivado(db):
+    hoje = datetime.date.today()
+    conn = db._conn()
+    with conn:
+        for i in range(3):
+            _inserir_medico(conn, f"antigo-{i}", (hoje - datetime.timedelta(days=40 + i)).isoformat())
+        _inserir_medico(conn, "hoje", hoje.isoformat())
+
+    resumo = retencao.executar_retencao(conn, db.db_path, hoje)
+    assert sum(resumo["movidas"]["espera_medica_historico"].values()) == 3
+
+    # Outra conexão (como a de um relatório): a tabela quente só tem hoje, a view tem tudo
+    leitura = retencao.conectar_leitura(db.db_path)
+    try:
+        assert leitura.execute("SELECT COUNT(*) FROM espera_medica_historico").fetchone()[0] == 1
+        assert leitura.execute("SELECT COUNT(*) FROM espera_medica_historico_completo").fetchone()[0] == 4
+        assert leitura.execute("SELECT COUNT(*) FROM recepcao_historico_completo").fetchone()[0] == 0
+    finally:
+        leitura.close()
+
+def test_conectar_leitura_sem_arquivo_cobre_so_a_tabela_quente(db, tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_ARQUIVO_PATH", str(tmp_path / "nao_existe.db"))
+    with db._conn() as conn:
+        _inserir_medico(conn, "hoje", datetime.date.today().isoformat())
+
+    leitura = retencao.conectar_leitura(db.db_path)
+    try:
+        assert leitura.execute("SELECT COUNT(*) FROM espera_medica_historico_completo").fetchone()[0] == 1
+    finally:
+        leitura.close()
+    assert not (tmp_path / "nao_existe.db").exists()
+
+def test_retencao_nao_faz_vacuum_completo(tmp_path, monkeypatch):
+    # Banco criado antes do auto_vacuum incremental: o ciclo só arquiva, o VACUUM é manual
+    antigo = str(tmp_path / "antigo.db")
+    with closing(sqlite3.connect(antigo)) as velho:
+        velho.execute("CREATE TABLE x (a)")
+        velho.commit()
+    monkeypatch.setattr(database_manager, "DB_PATH", antigo)
+    conn = database_manager.DatabaseManager(writer=False)._conn()
+    assert conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] == 0
+
+    retencao.executar_retencao(conn, antigo, datetime.date.today())
+    assert conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] == 0
+
+    database_manager.fechar_conexoes()
+    assert retencao.main(["retencao.py", "vacuum"]) == 0
+    with closing(sqlite3.connect(antigo)) as depois:
+        assert depois.execute("PRAGMA main.auto_vacuum").fetchone()[0] == 2
+
+def test_banco_novo_ja_nasce_incremental(db):
+    assert db._conn().execute("PRAGMA main.auto_vacuum").fetchone()[0] == 2
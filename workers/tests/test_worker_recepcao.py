@@ -0,0 +1,31 @@
+import datetime
+from worker_recepcao import QUERY_FILA_DIA
+
+def test_media_do_dia_usa_espera_real_gravada(db):
+    hoje = datetime.date.today().isoformat()
+    agora = datetime.datetime.now()
+    itens = [{'id': i, 'UnidadeID': 2, 'Senha': f'A{i}', 'Sta': 'Espera', 'NomeTipo': 'Normal',
+              'DataHoraChegada': (agora - datetime.timedelta(minutes=minutos)).strftime('%Y-%m-%d %H:%M:%S')}
+             for i, minutos in ((1, 25), (2, 12), (3, 3))]
+    db.salvar_dados_recepcao(itens)
+    # 1 e 2 saíram da fila (baixa grava espera_real_min); 3 continua esperando
+    db.finalizar_ausentes_recepcao(2, [3])
+
+    [(uid, total, fila, media)] = db._conn().execute(QUERY_FILA_DIA, (hoje,)).fetchall()
+    [(esperada,)] = db._conn().execute(
+        "SELECT AVG(espera_real_min) FROM recepcao_historico WHERE dia_referencia = ?", (hoje,)).fetchall()
+
+    assert (uid, total, fila) == (2, 3, 1)
+    assert media == esperada
+    assert 18 <= media <= 19
+
+def test_media_em_minutos_fracionarios(db):
+    # Como o pandas calculava: média das diferenças em float, sem truncar cada espera no minuto
+    hoje = datetime.date.today().isoformat()
+    itens = [{'id': i, 'UnidadeID': 2, 'Senha': f'A{i}', 'Sta': 'Atendido', 'NomeTipo': 'Normal',
+              'DataHoraChegada': f'{hoje} {chegada}', 'DataHoraAtendimento': f'{hoje} 10:01:30'}
+             for i, chegada in ((1, '10:00:00'), (2, '10:00:30'))]
+    db.salvar_dados_recepcao(itens)
+
+    [(_, _, _, media)] = db._conn().execute(QUERY_FILA_DIA, (hoje,)).fetchall()
+    assert media == (1.5 + 1.0) / 2
@@ -1,6 +1,7 @@
-import sqlite3
 import pandas as pd
 import os
+from contextlib import closing
+from retencao import conectar_leitura
 
 def encontrar_banco():
     atual = os.path.dirname(os.path.abspath(__file__))
@@ -21,7 +22,8 @@ def consultar_tudo():
     print(f"📂 Lendo banco: {db_path}")
     
     try:
-        with sqlite3.connect(db_path) as conn:
+        # Só leitura, com os dias já arquivados pela retenção (view *_completo)
+        with closing(conectar_leitura(db_path)) as conn:
             # Query padronizada com cálculo matemático de minutos
             query = """
             SELECT 
@@ -44,7 +46,7 @@ def consultar_tudo():
                     END AS INTEGER
                 ) as espera_min
                 
-            FROM espera_medica_historico
+            FROM espera_medica_historico_completo
             ORDER BY dt_chegada DESC
             """
             
@@ -1,6 +1,7 @@
-import sqlite3
 import pandas as pd
 import os
+from contextlib import closing
+from retencao import conectar_leitura
 
 def encontrar_banco():
     # Caminho onde este script está
@@ -30,7 +31,8 @@ def consultar_recepcao():
     print(f"📂 Lendo banco: {db_path}")
     
     try:
-        with sqlite3.connect(db_path) as conn:
+        # Só leitura, com os dias já arquivados pela retenção (view *_completo)
+        with closing(conectar_leitura(db_path)) as conn:
             # Query padronizada com cálculo matemático de minutos
             # Mapeia os IDs das unidades para nomes para facilitar a leitura
             query = """
@@ -57,7 +59,7 @@ def consultar_recepcao():
                     END AS INTEGER
                 ) as espera_min
                 
-            FROM recepcao_historico
+            FROM recepcao_historico_completo
             ORDER BY dt_chegada DESC
             """
             
@@ -1,11 +1,25 @@
-import requests
 import sqlite3
 import datetime
 import os
+import sys
 import time
-import json
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from database_manager import DatabaseManager
+    from fingerprint_fila import digest_json
+    from agendador import PollScheduler
+    from resiliencia import requisitar, Prazo
+    from limitador import TEMPO_REAL
+except ImportError:
+    from .database_manager import DatabaseManager
+    from .fingerprint_fila import digest_json
+    from .agendador import PollScheduler
+    from .resiliencia import requisitar, Prazo
+    from .limitador import TEMPO_REAL
+
 load_dotenv()
 
 # --- CONFIGURAÇÕES ---
@@ -17,6 +31,12 @@ API_URL_MONITOR = "https://dashboard.clinia.io/api/statistics/group/card" # Fila
 API_URL_REPORT = "https://dashboard.clinia.io/api/statistics/group/chart"  # Histórico/Dia
 API_URL_APPOINTMENTS = "https://dashboard.clinia.io/api/statistics/appointments"
 
+# Intervalo mínimo do polling adaptativo (antes era um sleep fixo de 30s)
+CLINIA_INTERVALO_MIN = float(os.getenv("CLINIA_INTERVALO_MIN", "30"))
+# A Clinia (atendimento digital) não segue o horário das clínicas: por padrão sempre consultada
+CLINIA_HORARIO = os.getenv("CLINIA_HORARIO", "00:00-24:00")
+CLINIA_DIAS = os.getenv("CLINIA_DIAS", "0-6")   # 0 = segunda ... 6 = domingo
+
 # HEADER BASE (Sem o Cookie fixo)
 HEADERS = {
     "accept": "application/json",
@@ -69,10 +89,11 @@ def get_params(mode="this-week"):
         
     return params
 
-def safe_request(url, params=None):
+def safe_request(url, params=None, prazo=None):
     try:
         # Usa o dicionário global HEADERS que já foi atualizado em process_and_save
-        response = requests.get(url, params=params, headers=HEADERS, timeout=20)
+        response = requisitar("GET", url, params=params, headers=HEADERS, timeout=20, prazo=prazo,
+                              prioridade=TEMPO_REAL)
         
         if response.status_code == 401 or response.status_code == 403:
             print(f" [401/403] Acesso Negado em {url}. O Cookie pode ter expirado.")
@@ -99,44 +120,19 @@ def process_and_save():
         else:
             print(" [AVISO] Nenhum cookie Clinia encontrado no banco. Configure no painel Admin.")
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Cria tabelas (Snapshot, Chat Stats, Appointments)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS clinia_group_snapshots (
-            group_id TEXT PRIMARY KEY,
-            group_name TEXT,
-            queue_size INTEGER DEFAULT 0,
-            avg_wait_seconds INTEGER DEFAULT 0,
-            updated_at DATETIME
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS clinia_chat_stats (
-            date TEXT PRIMARY KEY,
-            total_conversations INTEGER DEFAULT 0,
-            total_without_response INTEGER DEFAULT 0,
-            avg_wait_seconds INTEGER DEFAULT 0,
-            updated_at DATETIME
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS clinia_appointment_stats (
-            date TEXT PRIMARY KEY,
-            total_appointments INTEGER DEFAULT 0,
-            bot_appointments INTEGER DEFAULT 0,
-            crc_appointments INTEGER DEFAULT 0,
-            updated_at DATETIME
-        )
-    ''')
+    # As escritas do ciclo são acumuladas e gravadas de uma vez no final,
+    # assim o lock de escrita não fica preso durante as chamadas HTTP
+    db = DatabaseManager(fonte='worker_clinia')
+    passos = []
+    # Orçamento de tempo das chamadas deste ciclo (Clinia lenta não segura o worker)
+    prazo = Prazo()
 
     today_db_str = datetime.datetime.now().strftime('%Y-%m-%d')
     today_json_fmt = datetime.datetime.now().strftime('%d/%m')
 
     # 1. METADADOS (Nomes)
     # print(" Buscando nomes (/users-group)...")
-    groups_meta = safe_request(API_URL_METADATA)
+    groups_meta = safe_request(API_URL_METADATA, prazo=prazo)
     group_names_map = {}
     
     if groups_meta and isinstance(groups_meta, dict) and 'groups' in groups_meta:
@@ -150,10 +146,11 @@ def process_and_save():
     # 2. MONITOR TEMPO REAL (Fila Agora)
     # print(" Buscando Monitor (/card?search=current)...")
     monitor_params = get_params(mode="monitor_current")
-    monitor_data = safe_request(API_URL_MONITOR, params=monitor_params)
+    monitor_data = safe_request(API_URL_MONITOR, params=monitor_params, prazo=prazo)
+    fila_total = 0
 
     if monitor_data and 'groups' in monitor_data:
-        cursor.execute("DELETE FROM clinia_group_snapshots")
+        passos.append(("DELETE FROM clinia_group_snapshots", (), False))
         for stat in monitor_data['groups']:
             g_id = stat.get('group_id')
             # Usa o nome mapeado ou fallback
@@ -161,18 +158,19 @@ def process_and_save():
             
             queue = stat.get('number_of_without_responses', 0)
             wait_time = stat.get('avg_waiting_time') or 0
+            fila_total += int(queue)
             
             if g_id:
-                cursor.execute('''
+                passos.append(('''
                     INSERT INTO clinia_group_snapshots (group_id, group_name, queue_size, avg_wait_seconds, updated_at)
                     VALUES (?, ?, ?, ?, datetime('now'))
-                ''', (g_id, g_name, int(queue), int(wait_time)))
+                ''', (g_id, g_name, int(queue), int(wait_time)), False))
         print(" -> Monitor atualizado.")
 
     # 3. RELATÓRIO DIÁRIO (Totais acumulados)
     # print(" Buscando Relatório (/chart?type=this-week)...")
     report_params = get_params(mode="report_history")
-    report_data = safe_request(API_URL_REPORT, params=report_params)
+    report_data = safe_request(API_URL_REPORT, params=report_params, prazo=prazo)
 
     if report_data and 'groups' in report_data:
         total_conv = 0
@@ -200,7 +198,7 @@ def process_and_save():
         
         avg_wait_final = int(total_wait_sum / groups_count) if groups_count > 0 else 0
 
-        cursor.execute('''
+        passos.append(('''
             INSERT INTO clinia_chat_stats (date, total_conversations, total_without_response, avg_wait_seconds, updated_at)
             VALUES (?, ?, ?, ?, datetime('now'))
             ON CONFLICT(date) DO UPDATE SET
@@ -208,7 +206,7 @@ def process_and_save():
                 total_without_response = excluded.total_without_response,
                 avg_wait_seconds = excluded.avg_wait_seconds,
                 updated_at = excluded.updated_at
-        ''', (today_db_str, total_conv, total_no_resp, avg_wait_final))
+        ''', (today_db_str, total_conv, total_no_resp, avg_wait_final), False))
         print(f" -> Relatório do dia: {total_conv} conversas.")
 
     # 4. AGENDAMENTOS
@@ -218,7 +216,7 @@ def process_and_save():
         "startDate": monitor_params["startDate"],
         "endDate": monitor_params["endDate"]
     }
-    appt_data = safe_request(API_URL_APPOINTMENTS, params=appt_params)
+    appt_data = safe_request(API_URL_APPOINTMENTS, params=appt_params, prazo=prazo)
     
     if appt_data and 'current' in appt_data:
         curr = appt_data['current']
@@ -227,7 +225,7 @@ def process_and_save():
         crc_appts = total_appts - bot_appts 
         if crc_appts < 0: crc_appts = 0
 
-        cursor.execute('''
+        passos.append(('''
             INSERT INTO clinia_appointment_stats (date, total_appointments, bot_appointments, crc_appointments, updated_at)
             VALUES (?, ?, ?, ?, datetime('now'))
             ON CONFLICT(date) DO UPDATE SET
@@ -235,17 +233,45 @@ def process_and_save():
                 bot_appointments = excluded.bot_appointments,
                 crc_appointments = excluded.crc_appointments,
                 updated_at = excluded.updated_at
-        ''', (today_db_str, total_appts, bot_appts, crc_appts))
+        ''', (today_db_str, total_appts, bot_appts, crc_appts), False))
         print(" -> Agendamentos atualizados.")
 
-    conn.commit()
-    conn.close()
+    if passos:
+        db.executar_escrita(passos)
+
+    # Impressão digital do que foi lido e tamanho da fila: alimentam o agendador
+    return digest_json(passos), fila_total
+
+class MonitorClinia:
+    """Agendador do polling da Clinia e um ciclo por chamada (loop abaixo e supervisor monitor_service.py)"""
+
+    def __init__(self):
+        # Tabelas clinia_* são criadas pelas migrações do DatabaseManager (uma vez só)
+        DatabaseManager()
+        self.agendador = PollScheduler(['clinia'], horario=CLINIA_HORARIO, dias=CLINIA_DIAS,
+                                       horarios_unidades={}, intervalo_min=CLINIA_INTERVALO_MIN)
+        self.ultimo_digest = None
+
+    def ciclo(self):
+        """Roda process_and_save se o intervalo venceu; devolve quantos segundos dormir"""
+        if self.agendador.vencidas():
+            try:
+                digest, fila_total = process_and_save()
+                # Dados mudaram desde a última leitura = conversas em andamento: mantém o ritmo rápido
+                self.agendador.registrar('clinia', digest != self.ultimo_digest, fila_total)
+                self.ultimo_digest = digest
+            except Exception as e:
+                print(f"Erro fatal no loop: {e}")
+                self.agendador.registrar('clinia', False)
+                # Backoff fica com quem chamou (supervisor ou o loop abaixo)
+                raise
+        return self.agendador.espera()
 
 if __name__ == "__main__":
     print("--- Iniciando Worker Clinia (Loop Infinito) ---")
+    monitor = MonitorClinia()
     while True:
         try:
-            process_and_save()
-        except Exception as e:
-            print(f"Erro fatal no loop: {e}")
-        time.sleep(30)
\ No newline at end of file
+            time.sleep(monitor.ciclo())
+        except Exception:
+            time.sleep(monitor.agendador.espera())
\ No newline at end of file
@@ -1,7 +1,6 @@
 import sys
 import os
 import sqlite3
-import time
 import datetime
 import pandas as pd
 
@@ -10,41 +9,37 @@ sys.path.append(os.path.dirname(__file__))
 
 try:
     from feegow_client import fetch_financial_data
+    from database_manager import DatabaseManager
 except ImportError as e:
-    print(f"ERRO CRÍTICO: Não foi possível importar 'feegow_client'.\nDetalhe: {e}")
+    print(f"ERRO CRÍTICO: Não foi possível importar 'feegow_client'/'database_manager'.\nDetalhe: {e}")
     sys.exit(1)
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '../data/dados_clinica.db')
 
+SQL_UPSERT_APPOINTMENT = '''
+    INSERT INTO feegow_appointments (
+        appointment_id, date, status_id, value, 
+        specialty, professional_name, procedure_group, procedure_group_key,
+        scheduled_by, unit_name, updated_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, UPPER(TRIM(?7)), ?, ?, datetime('now'))
+    ON CONFLICT(appointment_id) DO UPDATE SET
+        status_id = excluded.status_id,
+        value = excluded.value,
+        procedure_group = excluded.procedure_group,
+        procedure_group_key = excluded.procedure_group_key,
+        scheduled_by = excluded.scheduled_by,
+        unit_name = excluded.unit_name,
+        updated_at = excluded.updated_at
+'''
+
 def get_db_connection():
     return sqlite3.connect(DB_PATH)
 
 def create_table_if_not_exists():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # CRIAÇÃO DA TABELA (Com novas colunas scheduled_by e unit_name)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS feegow_appointments (
-            appointment_id INTEGER PRIMARY KEY,
-            date TEXT,
-            status_id INTEGER,
-            value REAL,
-            specialty TEXT,
-            professional_name TEXT,
-            procedure_group TEXT,
-            scheduled_by TEXT,
-            unit_name TEXT,
-            updated_at TEXT
-        )
-    ''')
-    
-    # Índices para performance
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_date ON feegow_appointments(date)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user ON feegow_appointments(scheduled_by)')
-    
-    conn.commit()
-    conn.close()
+    # O schema (tabela, colunas novas e índices) é versionado no DatabaseManager:
+    # aqui custa só uma leitura de PRAGMA user_version quando já está atualizado.
+    return DatabaseManager(fonte='worker_feegow')
 
 def clean_currency(value_str):
     if pd.isna(value_str) or value_str == '':
@@ -89,23 +84,9 @@ def update_financial_data():
     df[col_status] = pd.to_numeric(df[col_status], errors='coerce').fillna(0).astype(int)
     df_to_save = df[df[col_status].isin(valid_statuses)].copy()
 
-    create_table_if_not_exists()
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    db = create_table_if_not_exists()
     
-    # --- MIGRAÇÃO AUTOMÁTICA DE COLUNAS (Caso o banco já exista) ---
-    try:
-        cursor.execute("ALTER TABLE feegow_appointments ADD COLUMN scheduled_by TEXT")
-        print("ℹ️ Coluna 'scheduled_by' adicionada com sucesso.")
-    except: pass
-    
-    try:
-        cursor.execute("ALTER TABLE feegow_appointments ADD COLUMN unit_name TEXT")
-        print("ℹ️ Coluna 'unit_name' adicionada com sucesso.")
-    except: pass
-    # ---------------------------------------------------------------
-
+    linhas = []
     saved = 0
     errors = 0
     
@@ -137,28 +118,15 @@ def update_financial_data():
             st_id = int(row.get(col_status))
 
             if app_id > 0:
-                cursor.execute('''
-                    INSERT INTO feegow_appointments (
-                        appointment_id, date, status_id, value, 
-                        specialty, professional_name, procedure_group, 
-                        scheduled_by, unit_name, updated_at
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
-                    ON CONFLICT(appointment_id) DO UPDATE SET
-                        status_id = excluded.status_id,
-                        value = excluded.value,
-                        procedure_group = excluded.procedure_group,
-                        scheduled_by = excluded.scheduled_by,
-                        unit_name = excluded.unit_name,
-                        updated_at = excluded.updated_at
-                ''', (app_id, iso_date, st_id, val, spec, prof, pg, user_sched, unit_name))
+                linhas.append((app_id, iso_date, st_id, val, spec, prof, pg, user_sched, unit_name))
                 saved += 1
             
         except Exception as e:
             errors += 1
 
-    conn.commit()
-    conn.close()
+    # Grava tudo numa única transação (ou no group commit do writer, se configurado)
+    if linhas:
+        db.executar_escrita([(SQL_UPSERT_APPOINTMENT, linhas, True)])
     print(f"✅ Sucesso: {saved} registros atualizados com Produtividade.")
 
 if __name__ == "__main__":
@@ -2,7 +2,6 @@ import sys
 import os
 import json
 import datetime
-import pandas as pd
 from contextlib import redirect_stdout
 from pathlib import Path
 from dotenv import load_dotenv
@@ -18,6 +17,21 @@ try:
 except ImportError:
     from .database_manager import DatabaseManager
 
+# Lê a tabela recepcao_historico que o monitor está alimentando.
+# A espera de quem foi atendido já vem gravada em espera_real_min (DatabaseManager), então a
+# agregação é feita direto no SQLite, sem pandas/to_datetime a cada request do painel.
+# Mesma coluna que o /api/queue/medic lê (src/app/api/queue/medic/route.ts).
+QUERY_FILA_DIA = """
+SELECT 
+    unidade_id,
+    COUNT(*) AS total_passaram,
+    SUM(status = 'Espera' AND dt_atendimento IS NULL) AS fila,
+    AVG(espera_real_min) AS media_min
+FROM recepcao_historico 
+WHERE dia_referencia = ? AND status != 'Cancelado'
+GROUP BY unidade_id
+"""
+
 def run():
     output = {
         "status": "error",
@@ -35,20 +49,9 @@ def run():
             db = DatabaseManager()
             
             # --- LEITURA EXCLUSIVA DO BANCO ---
-            # Lê a tabela recepcao_historico que o monitor está alimentando
-            query = """
-            SELECT 
-                unidade_id,
-                status,
-                dt_chegada,
-                dt_atendimento
-            FROM recepcao_historico 
-            WHERE dia_referencia = ? AND status != 'Cancelado'
-            """
             hoje = datetime.date.today().isoformat()
             
-            with list(db._init_db() or []) or sqlite3.connect(db.db_path) as conn:
-                 df = pd.read_sql_query(query, conn, params=(hoje,))
+            linhas = db._conn().execute(QUERY_FILA_DIA, (hoje,)).fetchall()
 
         # Montagem da Resposta
         output["status"] = "success"
@@ -64,43 +67,28 @@ def run():
         soma_ponderada = 0
         total_com_tempo = 0
 
-        # Se tiver dados no banco, preenche
-        if not df.empty:
-            # Converte colunas de data
-            df['dt_chegada'] = pd.to_datetime(df['dt_chegada'])
-            df['dt_atendimento'] = pd.to_datetime(df['dt_atendimento'])
-            agora = datetime.datetime.now()
-
-            for uid_int, grupo in df.groupby('unidade_id'):
-                uid = str(int(uid_int))
-                if uid not in detalhes: continue
-
-                # 1. Total Passaram (Todos do dia)
-                total_passaram = len(grupo)
-
-                # 2. Fila Atual (Status 'Espera' e sem data de atendimento)
-                fila_atual = len(grupo[(grupo['status'] == 'Espera') & (grupo['dt_atendimento'].isna())])
-
-                # 3. Tempo Médio (Apenas de quem JÁ FOI ATENDIDO - status fechado)
-                # Cálculo: (Atendimento - Chegada) em minutos
-                atendidos = grupo.dropna(subset=['dt_atendimento']).copy()
-                media = 0
-                if not atendidos.empty:
-                    atendidos['espera_min'] = (atendidos['dt_atendimento'] - atendidos['dt_chegada']).dt.total_seconds() / 60
-                    media = int(atendidos['espera_min'].mean())
-
-                # Atualiza JSON
-                detalhes[uid] = {
-                    "fila": fila_atual,
-                    "tempo_medio": media,
-                    "total_passaram": total_passaram
-                }
-
-                # Acumula Global
-                global_fila += fila_atual
-                if media > 0 and total_passaram > 0:
-                    soma_ponderada += (media * total_passaram)
-                    total_com_tempo += total_passaram
+        # Uma linha por unidade: total do dia, fila atual (Espera sem atendimento)
+        # e tempo médio de quem JÁ FOI ATENDIDO (AVG ignora quem não tem atendimento)
+        for uid_int, total_passaram, fila_atual, media_min in linhas:
+            if uid_int is None: continue
+            uid = str(int(uid_int))
+            if uid not in detalhes: continue
+
+            fila_atual = int(fila_atual or 0)
+            media = int(media_min) if media_min is not None else 0
+
+            # Atualiza JSON
+            detalhes[uid] = {
+                "fila": fila_atual,
+                "tempo_medio": media,
+                "total_passaram": total_passaram
+            }
+
+            # Acumula Global
+            global_fila += fila_atual
+            if media > 0 and total_passaram > 0:
+                soma_ponderada += (media * total_passaram)
+                total_com_tempo += total_passaram
 
         # Cálculo da Média Global Ponderada
         media_global = 0
@@ -122,5 +110,4 @@ def run():
     print(json.dumps(output))
 
 if __name__ == "__main__":
-    import sqlite3 # Import local para o caso de execução direta
     run()
\ No newline at end of file